@@ -1,71 +1,72 @@
 import os
 import cv2
-import queue
-import threading
-import sqlite3
-import numpy as np
+import time
 import tkinter as tk
 from tkinter import filedialog, ttk, messagebox
-from datetime import datetime
-from ultralytics import YOLO
-from deep_sort_realtime.deepsort_tracker import DeepSort
-from fast_plate_ocr import LicensePlateRecognizer
 from PIL import Image, ImageTk
-import time
+
+from recognition.registry import create_registry, VEHICLE, PLATE, OCR, TRACKER
+from recognition.pipeline import RecognitionPipeline
+from recognition.db_writer import LogWriter
+from recognition.plate_dedupe import PlateDedupe
+from recognition.motion import MotionGate
+from recognition.load_shedding import LoadShedder
+from recognition.queues import StageQueue, DROP_OLDEST
+from recognition.owner_index import OwnerIndex, owner_text
+from recognition.parking import ParkingSessions, GATE_BOTH
 
 # ---------------------------
 # Config
 # ---------------------------
-VEHICLE_MODEL_PATH = "yolov8n-vehicle.pt"
-PLATE_MODEL_PATH = "license_plate_detector.pt"
-OCR_MODEL_NAME = "cct-xs-v1-global-model"
+# "cascade": plate_model chỉ chạy trên crop xe đã tracked, "full": toàn frame,
+# "shared": toàn frame nhưng 2 model chung 1 tensor đã preprocess, "combined": 1 model gộp xe + biển số
+PLATE_MODE = "cascade"
+VEHICLE_IMGSZ = 480     # input size giảm cho vehicle_model trên toàn frame
+PLATE_IMGSZ = 320       # input size cho plate_model trên crop xe
+DETECTOR_BACKEND = "torch"    # "torch", "onnx" (ONNX Runtime CPU) hoặc "openvino"
+DETECTOR_INT8 = False
+DETECTOR_THREADS = 0          # 0 = để runtime tự chọn
+TRACKER_KIND = "deepsort"     # "deepsort" hoặc "iou" (Kalman + IoU, nhẹ hơn cho camera cổng cố định)
+MOTION_GATE = True      # cảnh tĩnh, không có xe: bỏ qua detector / tracker
+IDLE_FPS = 1.0          # tốc độ xử lý khi cảnh tĩnh
+ACTIVE_STRIDE = 1       # khi có xe: xử lý 1 trong bấy nhiêu frame
+LOAD_SHEDDING = True    # quá tải: tự giảm chất lượng từng bậc, in ra mỗi lần đổi bậc
 
 SAVED_CARS = "saved_cars"
 SAVED_PLATES = "saved_plates"
-SAVED_FACES = "saved_faces"
 DB_PATH = "plates.db"
-
-os.makedirs(SAVED_CARS, exist_ok=True)
-os.makedirs(SAVED_PLATES, exist_ok=True)
-os.makedirs(SAVED_FACES, exist_ok=True)
-
-# Load models
-vehicle_model = YOLO(VEHICLE_MODEL_PATH)
-plate_model = YOLO(PLATE_MODEL_PATH)
-ocr = LicensePlateRecognizer(OCR_MODEL_NAME)
-tracker = DeepSort(max_age=30, n_init=3, nn_budget=100)
-
-# Thread-safe queue
-result_queue = queue.Queue()
-
-# ---------------------------
-# Utils
-# ---------------------------
-def bbox_to_ints(xy):
-    try:
-        coords = xy[0] if hasattr(xy[0], "__getitem__") else xy
-        a = coords.cpu().numpy() if hasattr(coords, "cpu") else np.array(coords)
-        x1, y1, x2, y2 = map(int, a.tolist())
-        return x1, y1, x2, y2
-    except Exception:
-        a = np.array(xy)
-        if a.size >= 4:
-            x1, y1, x2, y2 = map(int, a.flatten()[:4])
-            return x1, y1, x2, y2
-        raise
-
-def centroid(box):
-    x1, y1, x2, y2 = box
-    return ((x1+x2)/2, (y1+y2)/2)
+JPEG_QUALITY = 90       # chất lượng ảnh bằng chứng saved_cars / saved_plates
+GATE_NAME = "gate-1"    # tên cổng ghi kèm khi chống trùng biển số
+PLATE_DEDUPE_WINDOW_S = 300   # không ghi lại cùng biển số trong 5 phút
+DISPLAY_SIZE = (800, 450)     # kích thước video hiển thị (pipeline resize sẵn)
+DISPLAY_FPS = 25              # tốc độ hiển thị tối đa, không phụ thuộc tốc độ xử lý
+LEFT_CAR_HOLD_MS = 3000       # xe rời khung hình: giữ dòng (màu đỏ) bấy nhiêu ms rồi xóa
+GATE_DIRECTION = GATE_BOTH    # "in" / "out" / "both" (1 cổng cho cả vào và ra)
+OVERSTAY_S = 12 * 3600        # xe trong bãi quá bấy nhiêu giây -> cảnh báo quá hạn
+
+# Model chỉ load khi cần (App load ở thread nền sau khi cửa sổ đã hiện), import module không tốn gì.
+# Thư mục saved_cars / saved_plates do EvidenceWriter tạo khi pipeline chạy
+models = create_registry(backend=DETECTOR_BACKEND, int8=DETECTOR_INT8, threads=DETECTOR_THREADS,
+                         vehicle_imgsz=VEHICLE_IMGSZ, plate_imgsz=PLATE_IMGSZ, tracker=TRACKER_KIND,
+                         combined=PLATE_MODE == "combined", tracker_stride=ACTIVE_STRIDE)
 
 # ---------------------------
 # GUI
 # ---------------------------
+def owner_cell(entry):
+    return owner_text(entry.get("owner")) or ''
+
+
 class App:
     def __init__(self, root):
         self.root = root
-        self.detect_db = sqlite3.connect(DB_PATH)
-        self.init_detected_logs_table()
+        # Thread riêng sở hữu plates.db, ghi batch cho plate_logs / detected_logs
+        self.log_writer = LogWriter(DB_PATH)
+        # Giữ qua các lần Dừng / chạy lại video
+        self.plate_dedupe = PlateDedupe(PLATE_DEDUPE_WINDOW_S)
+        # Phiên gửi xe (vào / ra) từ mọi track đã chốt biển số (on_gate, không qua PlateDedupe), ghi vào parking_sessions
+        self.parking = ParkingSessions({GATE_NAME: GATE_DIRECTION}, OVERSTAY_S, log_writer=self.log_writer)
+        self.parking.load(DB_PATH)
 
         self.paused = False
 
@@ -83,9 +84,12 @@ class App:
         self.db_entry.pack(side=tk.LEFT, padx=2, fill=tk.X, expand=True)
         self.btn_choose_db = tk.Button(db_frame, text="Chọn DB xe", command=self.choose_db)
         self.btn_choose_db.pack(side=tk.LEFT, padx=2)
+        self.occupancy_label = tk.Label(left_frame, anchor=tk.W)
+        self.occupancy_label.pack(fill=tk.X)
 
         # ---------------- Internal DB state ----------------
-        self.vehicle_db_conn = None
+        # Xe-Nguoi-DonVi nạp vào bộ nhớ, tự nạp lại khi file DB đổi
+        self.owner_index = None
 
         # Buttons
         btn_frame = tk.Frame(left_frame)
@@ -102,13 +106,15 @@ class App:
         self.btn_save.pack_forget()
 
         # Treeview
-        columns = ("car_id", "plate", "time")
+        columns = ("car_id", "plate", "owner", "time")
         self.tree = ttk.Treeview(left_frame, columns=columns, show="headings", height=40)
         self.tree.heading("car_id", text="Car ID")
         self.tree.heading("plate", text="Plate")
+        self.tree.heading("owner", text="Chủ xe")
         self.tree.heading("time", text="Time")
         self.tree.column("car_id", width=70)
         self.tree.column("plate", width=120)
+        self.tree.column("owner", width=160)
         self.tree.column("time", width=140)
         self.tree.pack(fill=tk.Y, expand=True, pady=6)
         self.tree.bind("<<TreeviewSelect>>", self.on_row_selected)
@@ -137,21 +143,63 @@ class App:
         preview_pane.add(self.preview_face, minsize=200)
 
         # ---------------- Internal state ----------------
-        self.video_thread = None
+        self.pipeline = None
+        self.video_photo = None  # PhotoImage dùng lại cho mọi frame (paste), chỉ tạo lại khi đổi kích thước
         self.running = False
         self.cap = None
         self.current_video_path = None
         self.latest_entries = []
-        self.car_states = {}
+        # Pipeline đẩy entries mỗi frame; GUI chỉ cần bản mới nhất (ghi đè, không dồn backlog)
+        self.entries_box = StageQueue(1, DROP_OLDEST)
+        self.rows = {}        # iid (car_id) -> (values, tag) đang hiển thị trên Treeview
+        self.row_entries = {}  # iid -> entry mới nhất của xe, cho on_row_selected
+        self.left_cars = {}   # iid -> thời điểm xe rời khung hình
+        self.remove_job = None
 
         # Poll queue
         self.root.after(200, self.process_queue)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        # Load model ở thread nền sau khi cửa sổ đã vẽ xong
+        self.btn_open.config(state=tk.DISABLED)
+        self.video_frame.config(text="Đang tải model...")
+        self.root.after(100, self.start_model_loading)
+
+    def start_model_loading(self):
+        models.load_async()
+        self.root.after(200, self.check_models)
+
+    def check_models(self):
+        if models.loading():
+            self.root.after(200, self.check_models)
+            return
+        if models.error:
+            self.video_frame.config(text="Không tải được model")
+            messagebox.showerror("Lỗi", f"Không tải được model:\n{models.error}")
+            return
+        timings = models.timings()
+        print(f"Startup: {models.startup_s():.2f}s " + ", ".join(
+            f"{name}={t['load_s']:.2f}s" + (f" (+{t['warmup_s']:.2f}s warm-up)" if t["warmup_s"] else "")
+            for name, t in timings.items()))
+        self.video_frame.config(text="Video")
+        if not self.running:
+            self.btn_open.config(state=tk.NORMAL)
+
+    def on_close(self):
+        # Dừng pipeline, chờ ghi nốt ảnh / DB rồi mới đóng
+        if self.pipeline:
+            self.pipeline.stop()
+            self.pipeline.join(timeout=5)
+        self.log_writer.close()
+        self.root.destroy()
 
     def toggle_pause(self):
         if not self.running:
             return
 
         self.paused = not self.paused
+        if self.pipeline:
+            self.pipeline.paused = self.paused
         self.btn_pause.config(text="Play" if self.paused else "Pause")
 
         if self.paused:
@@ -166,15 +214,16 @@ class App:
         if not file:
             return
         try:
-            if self.vehicle_db_conn:
-                self.vehicle_db_conn.close()
-            self.vehicle_db_conn = sqlite3.connect(file)
+            self.owner_index = OwnerIndex(file)
             self.db_entry.delete(0, tk.END)
             self.db_entry.insert(0, file)
-            messagebox.showinfo("Thông báo", f"Đã kết nối database: {file}")
+            messagebox.showinfo("Thông báo", f"Đã nạp database: {file} ({len(self.owner_index)} xe)")
         except Exception as e:
             messagebox.showerror("Lỗi", f"Không mở được DB:\n{e}")
-            self.vehicle_db_conn = None
+            self.owner_index = None
+        # Pipeline đang chạy dùng ngay bảng mới cho các biển số OCR tiếp theo
+        if self.pipeline:
+            self.pipeline.owner_index = self.owner_index
 
     def save_paused_data(self):
         if not self.paused:
@@ -186,64 +235,24 @@ class App:
             return
 
         try:
-            c = self.detect_db.cursor()
-
-            for item in self.latest_entries:
-                c.execute("""
-                          INSERT INTO detected_logs
-                              (car_id, plate, car_path, plate_path, face_path, timestamp)
-                          VALUES (?, ?, ?, ?, ?, ?)
-                          """, (
-                              item.get("car_id"),
-                              item.get("plate_text"),
-                              item.get("car_path"),
-                              item.get("plate_path"),
-                              item.get("face_path"),
-                              item.get("ts")
-                          ))
-
-            self.detect_db.commit()
+            self.log_writer.log_detected(
+                (item.get("car_id"), item.get("plate_text"), item.get("car_path"),
+                 item.get("plate_path"), item.get("face_path"), item.get("ts"))
+                for item in self.latest_entries
+            )
+            if not self.log_writer.flush():
+                raise RuntimeError("Ghi DB quá thời gian chờ")
             messagebox.showinfo("Thành công", "Đã lưu dữ liệu vào plates.db!")
 
         except Exception as e:
             messagebox.showerror("Lỗi", str(e))
 
-    def init_detected_logs_table(self):
-        try:
-            c = self.detect_db.cursor()
-            c.execute("""
-                      CREATE TABLE IF NOT EXISTS detected_logs
-                      (
-                          id
-                          INTEGER
-                          PRIMARY
-                          KEY
-                          AUTOINCREMENT,
-                          car_id
-                          INTEGER,
-                          plate
-                          TEXT,
-                          car_path
-                          TEXT,
-                          plate_path
-                          TEXT,
-                          face_path
-                          TEXT,
-                          timestamp
-                          TEXT
-                      )
-                      """)
-            self.detect_db.commit()
-        except Exception as e:
-            print("Lỗi tạo bảng detected_logs:", e)
-
     # ---------------- Cập nhật on_row_selected ----------------
     def on_row_selected(self, event=None):
         sel = self.tree.selection()
         if not sel: return
-        idx = self.tree.index(sel[0])
-        if idx < 0 or idx >= len(self.latest_entries): return
-        item = self.latest_entries[idx]
+        item = self.row_entries.get(sel[0])
+        if item is None: return
 
         # --- Hiển thị car, plate, face như trước ---
         # Car preview
@@ -279,35 +288,26 @@ class App:
             self.preview_face.config(image="", text="Không có ảnh mặt")
             self.preview_face.image = None
 
-        # --- Tra cứu DB Xe-Nguoi-DonVi nếu có ---
-        if self.vehicle_db_conn and item.get("plate_text"):
+        # --- Chủ xe: pipeline đã tra lúc OCR; DB chọn sau thì tra lại trên bảng trong bộ nhớ ---
+        owner = item.get("owner")
+        if owner is None and self.owner_index is not None and item.get("plate_text"):
+            owner = self.owner_index.lookup(item["plate_text"])
+        if owner:
             plate_text = item["plate_text"]
-            c = self.vehicle_db_conn.cursor()
-            try:
-                c.execute("""
-                          SELECT Nguoi.ten, DonVi.ten, Nguoi.anh_mat
-                          FROM Xe
-                                   JOIN Nguoi ON Xe.nguoi_id = Nguoi.id
-                                   JOIN DonVi ON Nguoi.don_vi_id = DonVi.id
-                          WHERE Xe.bien_so = ?
-                          """, (plate_text,))
-                result = c.fetchone()
-                if result:
-                    nguoi_ten, don_vi_ten, anh_mat = result
-                    # Hiển thị tên và đơn vị lên Treeview hoặc label
-                    messagebox.showinfo("Thông tin xe",
-                                        f"Biển số: {plate_text}\nNgười sở hữu: {nguoi_ten}\nĐơn vị: {don_vi_ten}")
-                    # Nếu có ảnh mặt, hiển thị lên preview_face
-                    if anh_mat and os.path.exists(anh_mat):
-                        im = Image.open(anh_mat)
-                        im.thumbnail((200, 200))
-                        tkim = ImageTk.PhotoImage(im)
-                        self.preview_face.config(image=tkim, text="")
-                        self.preview_face.image = tkim
-                else:
-                    print(f"Không tìm thấy thông tin cho biển số {plate_text}")
-            except Exception as e:
-                print("Lỗi tra cứu DB:", e)
+            note = "" if owner.plate == plate_text else f" (DB: {owner.plate}" + \
+                (f", lệch {owner.distance} ký tự)" if owner.distance else ")")
+            messagebox.showinfo("Thông tin xe",
+                                f"Biển số: {plate_text}{note}\nNgười sở hữu: {owner.name}\nĐơn vị: {owner.unit}")
+            # Nếu có ảnh mặt, hiển thị lên preview_face
+            if owner.face_path and os.path.exists(owner.face_path):
+                im = Image.open(owner.face_path)
+                im.thumbnail((200, 200))
+                tkim = ImageTk.PhotoImage(im)
+                self.preview_face.config(image=tkim, text="")
+                self.preview_face.image = tkim
+        elif self.owner_index is not None and item.get("plate_text"):
+            print(f"Không tìm thấy thông tin cho biển số {item['plate_text']}")
+
     # ---------------- Video controls ----------------
     def select_and_start(self):
         path = filedialog.askopenfilename(title="Chọn video (hoặc hủy để dùng camera)",
@@ -334,43 +334,88 @@ class App:
         self.running = True
         self.btn_open.config(state=tk.DISABLED)
         self.btn_stop.config(state=tk.NORMAL)
-        self.video_thread = threading.Thread(target=self.video_loop, daemon=True)
-        self.video_thread.start()
+        self.pipeline = RecognitionPipeline(
+            cap, models.get(VEHICLE), models.get(PLATE), models.get(OCR), models.get(TRACKER),
+            db_path=DB_PATH, saved_cars=SAVED_CARS, saved_plates=SAVED_PLATES,
+            on_entries=self.entries_box.put, on_gate=self.parking, log_writer=self.log_writer,
+            plate_dedupe=self.plate_dedupe, gate=GATE_NAME,
+            plate_mode=PLATE_MODE, vehicle_imgsz=VEHICLE_IMGSZ, plate_imgsz=PLATE_IMGSZ,
+            jpeg_quality=JPEG_QUALITY,
+            motion_gate=MotionGate.for_fps(cap.get(cv2.CAP_PROP_FPS), IDLE_FPS, active_stride=ACTIVE_STRIDE)
+            if MOTION_GATE else None,
+            load_shedder=LoadShedder() if LOAD_SHEDDING else None,
+            display_size=DISPLAY_SIZE, display_fps=DISPLAY_FPS, owner_index=self.owner_index
+        )
+        self.pipeline.paused = self.paused
+        self.pipeline.start()
+        self.root.after(1000 // DISPLAY_FPS, self.update_video, self.pipeline)
 
     def stop_video(self):
+        if self.pipeline:
+            self.pipeline.stop()
         self.running = False
         self.btn_open.config(state=tk.NORMAL)
         self.btn_stop.config(state=tk.DISABLED)
 
     # ---------------- Treeview update ----------------
     def process_queue(self):
-        if not result_queue.empty():
-            self.latest_entries = result_queue.get()
-            self.update_treeview(self.latest_entries)
+        entries = self.entries_box.get_latest()
+        if entries is not None:
+            self.latest_entries = entries
+            self.update_treeview(entries)
+        self.update_occupancy()
         self.root.after(200, self.process_queue)
 
+    def update_occupancy(self):
+        self.parking.check()
+        stats = self.parking.stats()
+        text = f"Trong bãi: {stats['occupancy']}   Quá hạn: {stats['overstayed']}   " \
+               f"Vào: {stats['entries']}   Ra: {stats['exits']}"
+        if self.occupancy_label.cget("text") != text:
+            self.occupancy_label.config(text=text)
+
     def update_treeview(self, entries):
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        current_ids = set([e['car_id'] for e in entries])
-        previous_ids = set(self.car_states.keys())
-        new_ids = current_ids - previous_ids
-        for e in entries:
-            tag = 'new_car' if e['car_id'] in new_ids else ''
-            self.tree.insert('', tk.END, values=(e['car_id'], e['plate_text'] or '', e['ts']), tags=(tag,))
-            self.car_states[e['car_id']] = 'present'
-        left_ids = previous_ids - current_ids
-        for car_id in left_ids:
-            self.car_states[car_id] = 'left'
-        self.root.after(3000, self.remove_left_cars)
+        # Chỉ insert / sửa / đổi màu các dòng thay đổi, dòng theo car_id
+        current = {str(e['car_id']): e for e in entries}
+        for iid, e in current.items():
+            row = self.rows.get(iid)
+            if row is None:
+                values, tag = (e['car_id'], e['plate_text'] or '', owner_cell(e), e['ts']), 'new_car'
+                self.tree.insert('', tk.END, iid=iid, values=values, tags=(tag,))
+            else:
+                values, tag = (e['car_id'], e['plate_text'] or '', owner_cell(e), e['ts']), ''
+                if (values, tag) != row:
+                    self.tree.item(iid, values=values, tags=(tag,))
+            self.rows[iid] = (values, tag)
+            self.row_entries[iid] = e
+            self.left_cars.pop(iid, None)
+
+        now = time.monotonic()
+        for iid, (values, tag) in self.rows.items():
+            if iid not in current and iid not in self.left_cars:
+                self.left_cars[iid] = now
+                self.rows[iid] = (values, 'left_car')
+                self.tree.item(iid, tags=('left_car',))
+        self.schedule_remove()
+
+    def schedule_remove(self):
+        # 1 timer duy nhất cho mọi xe đã rời, hẹn theo xe rời sớm nhất
+        if self.remove_job is not None or not self.left_cars:
+            return
+        wait = LEFT_CAR_HOLD_MS / 1000 - (time.monotonic() - min(self.left_cars.values()))
+        self.remove_job = self.root.after(max(0, int(wait * 1000)), self.remove_left_cars)
 
     def remove_left_cars(self):
-        for item_id in self.tree.get_children():
-            vals = self.tree.item(item_id, 'values')
-            car_id = int(vals[0])
-            if self.car_states.get(car_id) == 'left':
-                self.tree.delete(item_id)
-                del self.car_states[car_id]
+        self.remove_job = None
+        now = time.monotonic()
+        for iid, left_at in list(self.left_cars.items()):
+            if now - left_at >= LEFT_CAR_HOLD_MS / 1000:
+                del self.left_cars[iid]
+                del self.rows[iid]
+                self.row_entries.pop(iid, None)
+                if self.tree.exists(iid):
+                    self.tree.delete(iid)
+        self.schedule_remove()
 
     # ---------------- Row selection preview ----------------
     # def on_row_selected(self, event=None):
@@ -413,180 +458,26 @@ class App:
     #         self.preview_face.config(image="", text="Không có ảnh mặt")
     #         self.preview_face.image = None
 
-    # ---------------- Video processing ----------------
-    # ---------------- Video processing ----------------
-    def video_loop(self):
-        db = sqlite3.connect(DB_PATH)
-        cur = db.cursor()
-        cur.execute("""
-                    CREATE TABLE IF NOT EXISTS plate_logs
-                    (
-                        id
-                        INTEGER
-                        PRIMARY
-                        KEY
-                        AUTOINCREMENT,
-                        car_id
-                        INTEGER,
-                        plate
-                        TEXT
-                        UNIQUE,
-                        car_path
-                        TEXT,
-                        plate_path
-                        TEXT,
-                        face_path
-                        TEXT,
-                        timestamp
-                        TEXT
-                    )
-                    """)
-        db.commit()
-
-        cap = self.cap
+    # ---------------- Video display ----------------
+    def update_video(self, pipeline):
+        # Chạy trên Tk main loop, chỉ lấy frame mới nhất từ pipeline
+        if pipeline is not self.pipeline:
+            return
 
-        try:
-            while self.running:
-                if self.paused:
-                    # Chỉ sleep một chút, giữ frame hiện tại
-                    time.sleep(0.05)
-                    continue
-
-                ret, frame = cap.read()
-                if not ret: break
-
-                # ---- Vehicle detection ----
-                veh_results = vehicle_model(frame)[0]
-                detections = []
-                for box in veh_results.boxes:
-                    try:
-                        x1, y1, x2, y2 = bbox_to_ints(box.xyxy)
-                    except:
-                        x1, y1, x2, y2 = bbox_to_ints(box.xyxy[0])
-                    conf = float(box.conf[0]) if hasattr(box.conf, "__getitem__") else float(box.conf)
-                    if conf < 0.25: continue
-                    detections.append(([x1, y1, x2 - x1, y2 - y1], conf, None))
-
-                # ---- Tracking ----
-                tracks = tracker.update_tracks(detections, frame=frame)
-                tracked_cars = [(t.track_id, *map(int, t.to_ltrb())) for t in tracks if t.is_confirmed()]
-
-                # ---- Plate detection ----
-                plate_results = plate_model(frame)[0]
-                plate_bboxes = []
-                for box in plate_results.boxes:
-                    try:
-                        px1, py1, px2, py2 = bbox_to_ints(box.xyxy)
-                    except:
-                        px1, py1, px2, py2 = bbox_to_ints(box.xyxy[0])
-                    conf = float(box.conf[0]) if hasattr(box.conf, "__getitem__") else float(box.conf)
-                    if conf < 0.25: continue
-                    plate_bboxes.append((px1, py1, px2, py2))
-
-                # ---- Match plates to cars ----
-                matches = []
-                for pb in plate_bboxes:
-                    pcx, pcy = centroid(pb)
-                    for car_id, x1, y1, x2, y2 in tracked_cars:
-                        if x1 <= pcx <= x2 and y1 <= pcy <= y2:
-                            matches.append((car_id, pb))
-                            break
-
-                matched_car_ids = set([c for c, _ in matches])
-
-                # ---- Highlight cars without plates ----
-                overlay = frame.copy()
-                alpha = 0.3
-                for car_id, x1, y1, x2, y2 in tracked_cars:
-                    if car_id not in matched_car_ids:
-                        cv2.rectangle(overlay, (x1, y1), (x2, y2), (0, 0, 255), -1)
-                cv2.addWeighted(overlay, alpha, frame, 1 - alpha, 0, frame)
-
-                # ---- Draw boxes and IDs ----
-                for car_id, x1, y1, x2, y2 in tracked_cars:
-                    cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                    cv2.putText(frame, f"ID:{car_id}", (x1, max(12, y1 - 6)), cv2.FONT_HERSHEY_SIMPLEX, 0.6,
-                                (0, 255, 0), 2)
-                for px1, py1, px2, py2 in plate_bboxes:
-                    cv2.rectangle(frame, (px1, py1), (px2, py2), (255, 0, 0), 2)
-                    cv2.putText(frame, "Plate", (px1, max(12, py1 - 6)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 2)
-
-                # ---- Crop, OCR, save ----
-                frame_entries = []
-                for car_id, (px1, py1, px2, py2) in matches:
-                    vb = next((v for v in tracked_cars if v[0] == car_id), None)
-                    if vb is None: continue
-                    _, vx1, vy1, vx2, vy2 = vb
-                    car_crop = frame[vy1:vy2, vx1:vx2].copy()
-                    plate_crop = frame[py1:py2, px1:px2].copy() if px2 > px1 and py2 > py1 else None
-
-                    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    car_path = os.path.join(SAVED_CARS, f"car_{car_id}_{ts}.jpg")
-                    cv2.imwrite(car_path, car_crop)
-
-                    plate_path = None
-                    plate_text = None
-                    if plate_crop is not None and plate_crop.size > 0:
-                        plate_path = os.path.join(SAVED_PLATES, f"plate_{car_id}_{ts}.jpg")
-                        cv2.imwrite(plate_path, plate_crop)
-                        try:
-                            plate_text_raw = ocr.run(cv2.cvtColor(plate_crop, cv2.COLOR_BGR2RGB))
-                            plate_text = "".join(plate_text_raw) if isinstance(plate_text_raw, list) else plate_text_raw
-                        except:
-                            plate_text = None
-
-                    # Face detection placeholder
-                    face_path = None
-
-                    # Save DB
-                    try:
-                        if plate_text:
-                            cur.execute("SELECT plate FROM plate_logs WHERE plate=?", (plate_text,))
-                            if not cur.fetchone():
-                                cur.execute("""INSERT INTO plate_logs
-                                                   (car_id, plate, car_path, plate_path, face_path, timestamp)
-                                               VALUES (?, ?, ?, ?, ?, ?)""",
-                                            (car_id, plate_text, car_path, plate_path, face_path, ts))
-                                db.commit()
-                    except:
-                        pass
-
-                    if plate_text:
-                        cv2.putText(frame, str(plate_text), (px1, max(12, py1 - 20)), cv2.FONT_HERSHEY_SIMPLEX, 0.8,
-                                    (0, 255, 255), 2)
-
-                    frame_entries.append({
-                        "car_id": car_id,
-                        "plate_text": plate_text,
-                        "car_path": car_path,
-                        "plate_path": plate_path,
-                        "face_path": face_path,
-                        "ts": ts
-                    })
-
-                result_queue.put(frame_entries)
-
-                # ---------------- Tkinter display ----------------
-                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                img = Image.fromarray(rgb_frame)
-                img = img.resize((800, 450))  # Resize nếu muốn
-                imgtk = ImageTk.PhotoImage(image=img)
-                self.video_frame.config(image=imgtk)  # Dùng label car làm video
-                self.video_frame.image = imgtk
-
-                # Delay tương đương cv2.waitKey
-                self.root.update_idletasks()
-                self.root.update()
-
-        finally:
-            try:
-                db.close()
-            except:
-                pass
-            try:
-                cap.release()
-            except:
-                pass
+        # Frame đã được pipeline vẽ, resize về DISPLAY_SIZE và chuyển RGB
+        frame = pipeline.display_queue.get_latest()
+        if frame is not None:
+            img = Image.fromarray(frame)
+            if self.video_photo is None or (self.video_photo.width(), self.video_photo.height()) != img.size:
+                self.video_photo = ImageTk.PhotoImage(image=img)
+                self.video_frame.config(image=self.video_photo)  # Dùng label car làm video
+                self.video_frame.image = self.video_photo
+            else:
+                self.video_photo.paste(img)
+
+        if pipeline.is_alive():
+            self.root.after(1000 // DISPLAY_FPS, self.update_video, pipeline)
+        else:
             self.running = False
             self.btn_open.config(state=tk.NORMAL)
             self.btn_stop.config(state=tk.DISABLED)
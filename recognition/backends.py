@@ -0,0 +1,332 @@
+import os
+import time
+
+import cv2
+import numpy as np
+
+# ---------------------------
+# Config
+# ---------------------------
+BACKEND_TORCH = "torch"         # ultralytics + PyTorch (file .pt)
+BACKEND_ONNX = "onnx"           # ONNX Runtime CPU
+BACKEND_OPENVINO = "openvino"   # OpenVINO CPU, đọc trực tiếp file .onnx
+BACKENDS = (BACKEND_TORCH, BACKEND_ONNX, BACKEND_OPENVINO)
+
+DEFAULT_IMGSZ = 640
+NMS_IOU = 0.45
+MIN_CONF = 0.05       # ngưỡng thấp trước NMS, ngưỡng thật lọc sau ở plate_recog
+LETTERBOX_COLOR = (114, 114, 114)
+
+
+# ---------------------------
+# Pre / post processing (giống ultralytics cho YOLOv8 detect)
+# ---------------------------
+def letterbox(img, size, color=LETTERBOX_COLOR):
+    """
+    Resize giữ tỉ lệ rồi pad thành size x size. Trả về (ảnh, scale, (pad_x, pad_y))
+    """
+    h, w = img.shape[:2]
+    r = min(size / h, size / w)
+    nw, nh = int(round(w * r)), int(round(h * r))
+    if (nw, nh) != (w, h):
+        img = cv2.resize(img, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    px, py = (size - nw) / 2, (size - nh) / 2
+    top, bottom = int(round(py - 0.1)), int(round(py + 0.1))
+    left, right = int(round(px - 0.1)), int(round(px + 0.1))
+    img = cv2.copyMakeBorder(img, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
+    return img, r, (left, top)
+
+
+def preprocess(images, size):
+    """
+    List ảnh BGR -> tensor NCHW float32 RGB [0, 1] và thông tin để map box về ảnh gốc
+    """
+    batch = np.empty((len(images), 3, size, size), dtype=np.float32)
+    metas = []
+    for i, img in enumerate(images):
+        lb, r, pad = letterbox(img, size)
+        batch[i] = lb[:, :, ::-1].transpose(2, 0, 1)
+        metas.append((r, pad, img.shape[:2]))
+    batch *= 1.0 / 255.0
+    return batch, metas
+
+
+def unletterbox(xyxy, meta):
+    """
+    Box trên ảnh đã letterbox -> tọa độ ảnh gốc (meta lấy từ preprocess)
+    """
+    r, (left, top), (h, w) = meta
+    xyxy = (np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+            - np.array([left, top, left, top], dtype=np.float32)) / r
+    xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, w)
+    xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, h)
+    return xyxy
+
+
+def postprocess(output, metas, min_conf=MIN_CONF, iou=NMS_IOU):
+    """
+    Output YOLOv8 (B, 4 + nc, A) -> list DetectionResult, box đã map về tọa độ ảnh gốc
+    """
+    results = []
+    for pred, (r, (left, top), (h, w)) in zip(output, metas):
+        pred = pred.T                      # (A, 4 + nc)
+        scores = pred[:, 4:]
+        cls = scores.argmax(axis=1)
+        conf = scores[np.arange(len(scores)), cls]
+        keep = conf >= min_conf
+        pred, conf, cls = pred[keep], conf[keep], cls[keep]
+        if not len(pred):
+            results.append(DetectionResult(np.zeros((0, 4), np.float32), conf, cls))
+            continue
+
+        cx, cy, bw, bh = pred[:, 0], pred[:, 1], pred[:, 2], pred[:, 3]
+        xyxy = unletterbox(np.stack([cx - bw / 2, cy - bh / 2, cx + bw / 2, cy + bh / 2], axis=1),
+                           (r, (left, top), (h, w)))
+
+        xywh = np.concatenate([xyxy[:, :2], xyxy[:, 2:] - xyxy[:, :2]], axis=1)
+        idx = cv2.dnn.NMSBoxes(xywh.tolist(), conf.tolist(), min_conf, iou)
+        idx = np.array(idx, dtype=np.int64).reshape(-1)
+        results.append(DetectionResult(xyxy[idx], conf[idx], cls[idx]))
+    return results
+
+
+class DetectionBoxes:
+    # Cùng interface với ultralytics Boxes mà plate_recog dùng: xyxy, conf, cls
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy = xyxy.astype(np.float32)
+        self.conf = conf.astype(np.float32)
+        self.cls = cls.astype(np.int64)
+
+    def __len__(self):
+        return len(self.xyxy)
+
+
+class DetectionResult:
+    def __init__(self, xyxy, conf, cls):
+        self.boxes = DetectionBoxes(xyxy, conf, cls)
+
+
+# ---------------------------
+# Runtime
+# ---------------------------
+class OnnxRuntimeSession:
+    def __init__(self, path, threads=0):
+        import onnxruntime as ort
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            opts.intra_op_num_threads = threads
+            opts.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(path, opts, providers=["CPUExecutionProvider"])
+        inp = self.session.get_inputs()[0]
+        self.input_name = inp.name
+        self.input_shape = inp.shape
+
+    def run(self, batch):
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+class OpenVinoSession:
+    def __init__(self, path, threads=0):
+        import openvino as ov
+
+        core = ov.Core()
+        config = {"PERFORMANCE_HINT": "LATENCY"}
+        if threads:
+            config["INFERENCE_NUM_THREADS"] = threads
+        model = core.read_model(path)
+        self.input_shape = [d.get_length() if d.is_static else None for d in model.inputs[0].partial_shape]
+        self.compiled = core.compile_model(model, "CPU", config)
+        self.output = self.compiled.outputs[0]
+
+    def run(self, batch):
+        return self.compiled([batch])[self.output]
+
+
+class YoloOnnxDetector:
+    """
+    Detector YOLOv8 chạy file .onnx trên CPU (ONNX Runtime hoặc OpenVINO), gọi giống model ultralytics:
+    detector(frame hoặc list frame, imgsz=...) -> list kết quả có .boxes.xyxy / .boxes.conf
+    """
+
+    def __init__(self, path, backend=BACKEND_ONNX, imgsz=DEFAULT_IMGSZ, threads=0):
+        self.path = path
+        self.backend = backend
+        self.session = OpenVinoSession(path, threads) if backend == BACKEND_OPENVINO \
+            else OnnxRuntimeSession(path, threads)
+        # Model export với input cố định thì luôn dùng kích thước đó
+        shape = self.session.input_shape
+        self.fixed_size = shape[2] if len(shape) == 4 and isinstance(shape[2], int) else None
+        self.fixed_batch = shape[0] if len(shape) == 4 and isinstance(shape[0], int) else None
+        self.imgsz = self.fixed_size or imgsz
+
+    def __call__(self, source, imgsz=None, verbose=False):
+        images = source if isinstance(source, (list, tuple)) else [source]
+        size = self.fixed_size or imgsz or self.imgsz
+        if not images:
+            return []
+        batch, metas = preprocess(images, size)
+        return self.infer(batch, metas)
+
+    def infer(self, batch, metas):
+        if self.fixed_batch and len(batch) != self.fixed_batch:
+            # Model batch cố định: chạy từng ảnh
+            output = np.concatenate([self.session.run(batch[i:i + 1]) for i in range(len(batch))])
+        else:
+            output = self.session.run(batch)
+        return postprocess(output, metas)
+
+
+# ---------------------------
+# Nhiều model cùng chạy trên 1 frame: letterbox / normalize 1 lần
+# ---------------------------
+def is_ultralytics(model):
+    try:
+        from ultralytics.engine.model import Model
+    except ImportError:
+        return False
+    return isinstance(model, Model)
+
+
+def run_shared(models, frame, imgsz=None):
+    """
+    Chạy các model full-frame trên cùng 1 tensor đã preprocess (thay vì mỗi model tự letterbox /
+    normalize lại frame). Trả về 1 kết quả cho mỗi model, box theo tọa độ frame gốc.
+    Model ONNX có input cố định khác nhau thì không chung tensor được: chạy riêng từng model.
+    """
+    sizes = {m.fixed_size for m in models if getattr(m, "fixed_size", None)}
+    if len(sizes) > 1:
+        return [m(frame, imgsz=imgsz, verbose=False)[0] for m in models]
+    size = sizes.pop() if sizes else imgsz or DEFAULT_IMGSZ
+    size = (size + 31) // 32 * 32   # ultralytics cần cạnh chia hết cho stride 32
+
+    batch = metas = tensor = None
+    results = []
+    for m in models:
+        onnx, ultralytics = hasattr(m, "infer"), is_ultralytics(m)
+        if (onnx or ultralytics) and batch is None:
+            batch, metas = preprocess([frame], size)
+        if onnx:
+            results.append(m.infer(batch, metas)[0])
+        elif ultralytics:
+            # ultralytics nhận thẳng tensor BCHW RGB [0, 1], box trả về theo tọa độ tensor
+            if tensor is None:
+                import torch
+                tensor = torch.from_numpy(batch)
+            boxes = m(tensor, verbose=False)[0].boxes
+            results.append(DetectionResult(unletterbox(boxes.xyxy.cpu().numpy(), metas[0]),
+                                           boxes.conf.cpu().numpy(), boxes.cls.cpu().numpy()))
+        else:
+            results.append(m(frame, imgsz=size, verbose=False)[0])
+    return results
+
+
+# ---------------------------
+# Export / quantize
+# ---------------------------
+def onnx_path_for(pt_path, int8=False):
+    base = os.path.splitext(pt_path)[0]
+    return f"{base}.int8.onnx" if int8 else f"{base}.onnx"
+
+
+class FrameCalibrationReader:
+    # Dữ liệu calibration cho quantize_static: các frame mẫu đã preprocess
+    def __init__(self, input_name, frames, size):
+        self.items = iter([{input_name: preprocess([f], size)[0]} for f in frames])
+
+    def get_next(self):
+        return next(self.items, None)
+
+
+def export_onnx(pt_path, imgsz=DEFAULT_IMGSZ, int8=False, calibration_frames=None):
+    """
+    Export .pt -> .onnx (input cố định imgsz). int8=True: quantize thêm bản .int8.onnx,
+    static (QDQ) nếu có frame calibration, nếu không thì dynamic. Trả về đường dẫn file dùng được.
+    """
+    from ultralytics import YOLO
+
+    exported = YOLO(pt_path).export(format="onnx", imgsz=imgsz, dynamic=False, simplify=True)
+    fp32_path = onnx_path_for(pt_path)
+    if os.path.abspath(exported) != os.path.abspath(fp32_path):
+        os.replace(exported, fp32_path)
+    if not int8:
+        return fp32_path
+
+    from onnxruntime import quantization as q
+
+    int8_path = onnx_path_for(pt_path, int8=True)
+    if calibration_frames:
+        import onnxruntime as ort
+        input_name = ort.InferenceSession(fp32_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+        q.quantize_static(fp32_path, int8_path, FrameCalibrationReader(input_name, calibration_frames, imgsz),
+                          quant_format=q.QuantFormat.QDQ, activation_type=q.QuantType.QUInt8,
+                          weight_type=q.QuantType.QInt8, per_channel=True)
+    else:
+        q.quantize_dynamic(fp32_path, int8_path, weight_type=q.QuantType.QUInt8)
+    return int8_path
+
+
+def load_detector(pt_path, backend=BACKEND_TORCH, imgsz=DEFAULT_IMGSZ, threads=0, int8=False):
+    """
+    backend torch: YOLO(.pt). onnx / openvino: dùng file .onnx cạnh file .pt (tự export nếu chưa có)
+    """
+    if backend == BACKEND_TORCH:
+        from ultralytics import YOLO
+        return YOLO(pt_path)
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend không hỗ trợ: {backend}")
+    path = onnx_path_for(pt_path, int8)
+    if not os.path.exists(path):
+        path = export_onnx(pt_path, imgsz=imgsz, int8=int8)
+    return YoloOnnxDetector(path, backend, imgsz, threads)
+
+
+# ---------------------------
+# Parity: so box của backend với PyTorch trên frame mẫu
+# ---------------------------
+def parity_check(reference, candidate, frames, imgsz=None, conf=0.25, iou_match=0.5):
+    """
+    So kết quả `candidate` với `reference` (thường là PyTorch) trên từng frame.
+    Trả về dict: recall / precision theo box, IoU và chênh lệch conf trung bình, thời gian mỗi frame.
+    """
+    from recognition.plate_recog import result_arrays, box_iou, run_model
+
+    matched = ref_total = cand_total = 0
+    ious, conf_diffs = [], []
+    ref_ms, cand_ms = [], []
+    for frame in frames:
+        t0 = time.perf_counter()
+        ref_xyxy, ref_conf = result_arrays(run_model(reference, frame, imgsz)[0], conf)
+        t1 = time.perf_counter()
+        cand_xyxy, cand_conf = result_arrays(run_model(candidate, frame, imgsz)[0], conf)
+        t2 = time.perf_counter()
+        ref_ms.append((t1 - t0) * 1000)
+        cand_ms.append((t2 - t1) * 1000)
+
+        ref_total += len(ref_xyxy)
+        cand_total += len(cand_xyxy)
+        if not len(ref_xyxy) or not len(cand_xyxy):
+            continue
+        # Ghép tham lam theo IoU lớn nhất
+        m = box_iou(ref_xyxy, cand_xyxy)
+        while m.size and m.max() >= iou_match:
+            i, j = np.unravel_index(m.argmax(), m.shape)
+            matched += 1
+            ious.append(float(m[i, j]))
+            conf_diffs.append(abs(float(ref_conf[i]) - float(cand_conf[j])))
+            m[i, :] = -1
+            m[:, j] = -1
+
+    return {
+        "frames": len(frames),
+        "reference_boxes": ref_total,
+        "candidate_boxes": cand_total,
+        "matched": matched,
+        "recall": round(matched / ref_total, 4) if ref_total else None,
+        "precision": round(matched / cand_total, 4) if cand_total else None,
+        "mean_iou": round(float(np.mean(ious)), 4) if ious else None,
+        "mean_conf_diff": round(float(np.mean(conf_diffs)), 4) if conf_diffs else None,
+        "reference_ms": round(float(np.median(ref_ms)), 2) if ref_ms else None,
+        "candidate_ms": round(float(np.median(cand_ms)), 2) if cand_ms else None,
+    }
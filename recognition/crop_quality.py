@@ -0,0 +1,127 @@
+import math
+import threading
+import cv2
+
+from recognition.ocr_cache import OCR_MAX_READS
+
+# ---------------------------
+# Config
+# ---------------------------
+TARGET_PLATE_AREA = 120 * 40   # crop lớn hơn mức này coi như đủ pixel cho OCR
+SHARPNESS_REF = 300.0          # variance Laplacian coi như "nét"
+PLATE_ASPECTS = (4.5, 1.4)     # biển 1 dòng / biển 2 dòng (rộng / cao)
+
+QUALITY_WEIGHTS = {"size": 0.35, "sharpness": 0.35, "aspect": 0.15, "center": 0.15}
+
+CROP_BUFFER_SIZE = 5   # số crop ứng viên giữ lại cho mỗi track
+CROP_WINDOW = 5        # mỗi bấy nhiêu frame thấy biển số thì gửi crop tốt nhất đi OCR
+# Tối đa số crop / track được OCR: đủ cho PlateVoteCache chốt bằng OCR_MAX_READS lần đọc;
+# thường chốt sớm hơn khi OCR_MIN_VOTES lần đọc khớp nhau (sau đó không gửi OCR nữa)
+CROP_MAX_OCR = OCR_MAX_READS
+CROP_MAX_SAVES = 2     # tối đa số lần lưu ảnh bằng chứng / track
+
+
+def plate_quality(plate_crop, plate_box, frame_shape):
+    """
+    Điểm chất lượng crop biển số trong [0, 1]: kích thước, độ nét, tỉ lệ khung, vị trí so với tâm frame
+    """
+    h, w = plate_crop.shape[:2]
+    if w == 0 or h == 0:
+        return 0.0
+
+    size = min(1.0, (w * h) / TARGET_PLATE_AREA)
+
+    gray = cv2.cvtColor(plate_crop, cv2.COLOR_BGR2GRAY) if plate_crop.ndim == 3 else plate_crop
+    sharpness = min(1.0, cv2.Laplacian(gray, cv2.CV_64F).var() / SHARPNESS_REF)
+
+    ratio = w / h
+    aspect = max(min(ratio, a) / max(ratio, a) for a in PLATE_ASPECTS)
+
+    fh, fw = frame_shape[:2]
+    x1, y1, x2, y2 = plate_box
+    dx = (x1 + x2) / 2 - fw / 2
+    dy = (y1 + y2) / 2 - fh / 2
+    center = 1.0 - min(1.0, math.hypot(dx, dy) / math.hypot(fw / 2, fh / 2))
+
+    weights = QUALITY_WEIGHTS
+    return (weights["size"] * size + weights["sharpness"] * sharpness
+            + weights["aspect"] * aspect + weights["center"] * center)
+
+
+class TrackCrops:
+    def __init__(self):
+        self.candidates = []   # sắp giảm dần theo score
+        self.seen = 0
+        self.emitted = 0
+        self.saves = 0
+        self.best_saved = -1.0
+
+
+class BestCropSelector:
+    """
+    Mỗi track giữ 1 buffer nhỏ các crop biển số tốt nhất. Cứ mỗi `window` lần thấy biển số (kể cả crop
+    không lọt vào buffer), crop tốt nhất trong buffer được gửi đi OCR (tối đa `max_ocr` lần / track). Ảnh bằng chứng
+    chỉ lưu khi crop gửi đi tốt hơn crop đã lưu trước đó (tối đa `max_saves` lần / track).
+    """
+
+    def __init__(self, buffer_size=CROP_BUFFER_SIZE, window=CROP_WINDOW,
+                 max_ocr=CROP_MAX_OCR, max_saves=CROP_MAX_SAVES):
+        self.buffer_size = buffer_size
+        self.window = window
+        self.max_ocr = max_ocr
+        self.max_saves = max_saves
+        self.tracks = {}
+        self.lock = threading.Lock()
+
+    def wants(self, track_id, score):
+        """
+        Gọi 1 lần cho mỗi lần thấy biển số, trước khi copy crop: đếm lần thấy, trả về True nếu cần
+        gọi add() (crop lọt vào buffer, hoặc đủ `window` lần thấy -> gửi crop tốt nhất đi OCR)
+        """
+        with self.lock:
+            tc = self.tracks.setdefault(track_id, TrackCrops())
+            if tc.emitted >= self.max_ocr:
+                return False
+            tc.seen += 1
+            return tc.seen >= self.window or self.fits(tc, score)
+
+    def add(self, track_id, candidate):
+        """
+        candidate: dict có "score", sau khi wants() trả về True. Trả về candidate cần OCR ngay (hoặc None)
+        """
+        with self.lock:
+            tc = self.tracks.setdefault(track_id, TrackCrops())
+            if tc.emitted >= self.max_ocr:
+                return None
+            if self.fits(tc, candidate["score"]):
+                tc.candidates.append(candidate)
+                tc.candidates.sort(key=lambda c: c["score"], reverse=True)
+                del tc.candidates[self.buffer_size:]
+            if tc.seen < self.window or not tc.candidates:
+                return None
+            tc.seen = 0
+            return self.pop_best(tc)
+
+    def fits(self, tc, score):
+        return len(tc.candidates) < self.buffer_size or score > tc.candidates[-1]["score"]
+
+    def expire(self, live_ids):
+        """
+        Xóa các track không còn sống. Trả về crop tốt nhất còn lại của các track chưa từng được OCR.
+        """
+        with self.lock:
+            leftovers = []
+            for tid in [t for t in self.tracks if t not in live_ids]:
+                tc = self.tracks.pop(tid)
+                if tc.emitted == 0 and tc.candidates:
+                    leftovers.append(self.pop_best(tc))
+            return leftovers
+
+    def pop_best(self, tc):
+        best = tc.candidates.pop(0)
+        tc.emitted += 1
+        best["save"] = tc.saves < self.max_saves and best["score"] > tc.best_saved
+        if best["save"]:
+            tc.saves += 1
+            tc.best_saved = best["score"]
+        return best
@@ -0,0 +1,267 @@
+import sqlite3
+import threading
+import time
+
+from recognition.queues import StageQueue, STOP, BLOCK
+from recognition.metrics import NULL_METRICS, STAGE_DB
+
+# ---------------------------
+# Config
+# ---------------------------
+DB_BATCH_SIZE = 50      # flush khi gom đủ bấy nhiêu dòng
+DB_FLUSH_MS = 500       # hoặc sau bấy nhiêu ms kể từ dòng đầu tiên chưa ghi
+DB_QUEUE_SIZE = 1024
+# Lỗi tạm thời (DB đang bị process khác khóa): thử lại ngay bấy nhiêu lần, chờ tăng dần từ DB_RETRY_MS;
+# vẫn lỗi thì giữ các dòng cho lần flush sau, tối đa DB_MAX_PENDING dòng
+DB_RETRIES = 3
+DB_RETRY_MS = 50
+DB_MAX_PENDING = 10 * DB_QUEUE_SIZE
+
+PLATE_LOGS = "plate_logs"
+DETECTED_LOGS = "detected_logs"
+PARKING_SESSIONS = "parking_sessions"
+SESSION_OPEN = "session_open"
+SESSION_CLOSE = "session_close"
+
+CREATE_TABLES = {
+    PLATE_LOGS: """
+        CREATE TABLE IF NOT EXISTS plate_logs
+        (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            car_id INTEGER,
+            plate TEXT,
+            car_path TEXT,
+            plate_path TEXT,
+            face_path TEXT,
+            timestamp TEXT,
+            owner TEXT
+        )
+    """,
+    DETECTED_LOGS: """
+        CREATE TABLE IF NOT EXISTS detected_logs
+        (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            car_id INTEGER,
+            plate TEXT,
+            car_path TEXT,
+            plate_path TEXT,
+            face_path TEXT,
+            timestamp TEXT
+        )
+    """,
+    PARKING_SESSIONS: """
+        CREATE TABLE IF NOT EXISTS parking_sessions
+        (
+            id INTEGER PRIMARY KEY,
+            plate TEXT,
+            entry_gate TEXT,
+            entry_ts TEXT,
+            exit_gate TEXT,
+            exit_ts TEXT,
+            dwell_s INTEGER,
+            status TEXT,
+            owner TEXT
+        )
+    """,
+}
+
+CREATE_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_plate_logs_plate ON plate_logs (plate, timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_parking_sessions_status ON parking_sessions (status, entry_ts)",
+]
+
+INSERT_SQL = {
+    # Chống ghi trùng do PlateDedupe trong bộ nhớ đảm nhận. face_path: ảnh chụp được (bằng chứng);
+    # owner: chủ xe tra từ DB Xe-Nguoi-DonVi (OwnerIndex), không phải bằng chứng
+    # Row: (car_id, plate, car_path, plate_path, face_path, timestamp, owner)
+    PLATE_LOGS: """INSERT INTO plate_logs
+                       (car_id, plate, car_path, plate_path, face_path, timestamp, owner)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
+    # Row: (car_id, plate, car_path, plate_path, face_path, timestamp)
+    DETECTED_LOGS: """INSERT INTO detected_logs
+                          (car_id, plate, car_path, plate_path, face_path, timestamp)
+                      VALUES (?, ?, ?, ?, ?, ?)""",
+    # Phiên gửi xe (ParkingSessions): id do ParkingSessions cấp. Trong 1 batch mọi INSERT chạy trước
+    # mọi UPDATE nên phiên vào và ra trong cùng batch vẫn đúng.
+    # Row: (id, plate, entry_gate, entry_ts, exit_gate, exit_ts, dwell_s, status, owner)
+    SESSION_OPEN: """INSERT INTO parking_sessions
+                         (id, plate, entry_gate, entry_ts, exit_gate, exit_ts, dwell_s, status, owner)
+                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+    # Row: (exit_gate, exit_ts, dwell_s, status, id)
+    SESSION_CLOSE: """UPDATE parking_sessions
+                      SET exit_gate = ?, exit_ts = ?, dwell_s = ?, status = ?
+                      WHERE id = ?""",
+}
+
+
+def is_transient(error):
+    # SQLITE_BUSY / SQLITE_LOCKED: "database is locked", "database table is locked", "database is busy"
+    return isinstance(error, sqlite3.OperationalError) and any(
+        word in str(error).lower() for word in ("locked", "busy"))
+
+
+def migrate_plate_logs(conn):
+    """
+    DB cũ có plate UNIQUE (mỗi biển số chỉ ghi 1 lần trọn đời) -> tạo lại bảng không UNIQUE
+    """
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='plate_logs'").fetchone()
+    if not row or "UNIQUE" not in row[0].upper():
+        return
+    with conn:
+        conn.execute("ALTER TABLE plate_logs RENAME TO plate_logs_old")
+        conn.execute(CREATE_TABLES[PLATE_LOGS])
+        conn.execute("""INSERT INTO plate_logs (id, car_id, plate, car_path, plate_path, face_path, timestamp)
+                        SELECT id, car_id, plate, car_path, plate_path, face_path, timestamp FROM plate_logs_old""")
+        conn.execute("DROP TABLE plate_logs_old")
+
+
+def add_owner_column(conn):
+    # DB tạo trước khi có cột owner
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(plate_logs)")]
+    if "owner" not in columns:
+        conn.execute("ALTER TABLE plate_logs ADD COLUMN owner TEXT")
+
+
+class LogWriter:
+    """
+    Thread duy nhất sở hữu connection plates.db (WAL, synchronous=NORMAL). Nhận dòng log
+    qua queue, ghi bằng executemany trong 1 transaction mỗi `batch_size` dòng hoặc `flush_ms` ms.
+    DB bị khóa tạm thời thì thử lại (backoff) rồi giữ batch cho lần sau; chỉ bỏ dòng khi lỗi không tạm thời.
+    """
+
+    def __init__(self, db_path="plates.db", batch_size=DB_BATCH_SIZE, flush_ms=DB_FLUSH_MS,
+                 queue_size=DB_QUEUE_SIZE, metrics=None, retries=DB_RETRIES, retry_ms=DB_RETRY_MS,
+                 max_pending=DB_MAX_PENDING):
+        self.db_path = db_path
+        self.metrics = metrics if metrics is not None else NULL_METRICS
+        self.batch_size = batch_size
+        self.flush_s = flush_ms / 1000.0
+        self.retries = retries
+        self.retry_s = retry_ms / 1000.0
+        self.max_pending = max_pending
+        self.queue = StageQueue(queue_size, BLOCK)
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.flushes = 0
+        self.ready = threading.Event()
+        self.thread = threading.Thread(target=self.write_loop, name="log-writer", daemon=True)
+        self.thread.start()
+        self.ready.wait()
+
+    # ---------------- API ----------------
+    def log_plate(self, row):
+        self.queue.put((PLATE_LOGS, [row]))
+
+    def log_detected(self, rows):
+        self.queue.put((DETECTED_LOGS, list(rows)))
+
+    def log_session_open(self, row):
+        self.queue.put((SESSION_OPEN, [row]))
+
+    def log_session_close(self, row):
+        self.queue.put((SESSION_CLOSE, [row]))
+
+    def flush(self, timeout=5.0):
+        """
+        Ghi ngay mọi dòng đang chờ, đợi tới khi commit xong
+        """
+        if not self.thread.is_alive():
+            return False
+        done = threading.Event()
+        self.queue.put(("flush", done))
+        return done.wait(timeout)
+
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put_stop()
+            self.thread.join()
+
+    # ---------------- Writer thread ----------------
+    def write_loop(self):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            migrate_plate_logs(conn)
+            for sql in list(CREATE_TABLES.values()) + CREATE_INDEXES:
+                conn.execute(sql)
+            add_owner_column(conn)
+            conn.commit()
+        except Exception as e:
+            print("Lỗi khởi tạo plates.db:", e)
+        self.ready.set()
+
+        pending = {table: [] for table in INSERT_SQL}
+        count = 0
+        first_at = None
+        try:
+            while True:
+                if count:
+                    timeout = max(0.0, self.flush_s - (time.monotonic() - first_at))
+                else:
+                    timeout = 0.5
+                item = self.queue.get(timeout=timeout)
+                if item is STOP: break
+
+                if item is not None:
+                    table, rows = item
+                    if table == "flush":
+                        count = self.write_batch(conn, pending, count)
+                        if count:
+                            first_at = time.monotonic()
+                        rows.set()
+                        continue
+                    if rows:
+                        if not count:
+                            first_at = time.monotonic()
+                        pending[table].extend(rows)
+                        count += len(rows)
+
+                if count and (count >= self.batch_size or time.monotonic() - first_at >= self.flush_s):
+                    count = self.write_batch(conn, pending, count)
+                    if count:
+                        # DB vẫn bị khóa: giữ các dòng, thử lại sau flush_ms
+                        first_at = time.monotonic()
+        finally:
+            # Flush cuối cùng trước khi đóng
+            count = self.write_batch(conn, pending, count)
+            if count:
+                self.discard(pending, count, "DB vẫn bị khóa lúc đóng")
+            conn.close()
+
+    def write_batch(self, conn, pending, count):
+        """
+        Ghi mọi dòng đang chờ trong 1 transaction. Trả về số dòng còn giữ lại (0 nếu đã ghi hoặc đã bỏ)
+        """
+        if not count:
+            return 0
+        for attempt in range(self.retries + 1):
+            try:
+                with self.metrics.timed(STAGE_DB), conn:
+                    for table, rows in pending.items():
+                        if rows:
+                            conn.executemany(INSERT_SQL[table], rows)
+            except Exception as e:
+                # Transaction đã rollback: ghi lại cả batch không bị trùng
+                if not is_transient(e):
+                    self.discard(pending, count, e)
+                    return 0
+                if attempt < self.retries:
+                    time.sleep(self.retry_s * 2 ** attempt)
+                    continue
+                print("DB đang bị khóa, giữ lại", count, "dòng:", e)
+                if count >= self.max_pending:
+                    self.discard(pending, count, e)
+                    return 0
+                return count
+            self.rows_written += count
+            self.flushes += 1
+            for rows in pending.values():
+                rows.clear()
+            return 0
+
+    def discard(self, pending, count, error):
+        print("Lỗi ghi log vào DB, bỏ", count, "dòng:", error)
+        self.rows_dropped += count
+        for rows in pending.values():
+            rows.clear()
@@ -0,0 +1,214 @@
+import math
+import multiprocessing as mp
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+# ---------------------------
+# Config
+# ---------------------------
+RING_SLOTS = 4                  # số frame slot trong shared memory mỗi camera
+RING_MAX_SHAPE = (1080, 1920, 3)  # frame lớn hơn được thu nhỏ cho vừa 1 slot
+OPEN_TIMEOUT = 20.0             # chờ process capture mở nguồn video (giây)
+POLL_TIMEOUT = 0.5
+
+STATUS_PENDING, STATUS_OPEN, STATUS_FAILED = 0, 1, -1
+
+
+def open_video(source):
+    # Camera index ("0" / 0), URL / file video, hoặc hàm (picklable) trả về object có read() / release()
+    if callable(source):
+        return source()
+    if isinstance(source, int) or str(source).isdigit():
+        return cv2.VideoCapture(int(source))
+    return cv2.VideoCapture(source)
+
+
+def slot_view(buf, slot, slot_bytes, shape):
+    return np.ndarray(shape, dtype=np.uint8, buffer=buf, offset=slot * slot_bytes)
+
+
+def fit_shape(shape, slot_bytes):
+    # Giữ tỉ lệ khung hình, thu nhỏ cho vừa slot
+    h, w = shape[:2]
+    c = shape[2] if len(shape) > 2 else 1
+    if h * w * c <= slot_bytes:
+        return shape
+    scale = math.sqrt(slot_bytes / (h * w * c))
+    size = (max(1, int(h * scale)), max(1, int(w * scale)))
+    return size + shape[2:]
+
+
+def capture_worker(source, shm_name, slots, slot_bytes, free, ready, stop_event, status, fps, counters, drop):
+    """
+    Chạy trong process riêng: decode frame thẳng vào slot trống của ring rồi chỉ gửi
+    (slot, shape, frame_id) qua queue. drop=True (live): hết slot trống thì lấy lại slot cũ nhất
+    chưa được đọc (bỏ frame cũ, giữ frame mới nhất); drop=False (file): chờ slot được trả lại.
+    counters: [frames_read, dropped, copies]
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    cap = None
+    try:
+        cap = open_video(source)
+        if hasattr(cap, "isOpened") and not cap.isOpened():
+            status.value = STATUS_FAILED
+            return
+        if hasattr(cap, "get"):
+            fps.value = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        status.value = STATUS_OPEN
+
+        zero_copy = isinstance(cap, cv2.VideoCapture)
+        shape = None
+        frame_id = 0
+        while not stop_event.is_set():
+            try:
+                slot = free.get_nowait()
+            except queue.Empty:
+                slot = None
+                if drop:
+                    try:
+                        slot = ready.get_nowait()[0]
+                        counters[1] += 1
+                    except queue.Empty:
+                        pass
+                if slot is None:
+                    try:
+                        slot = free.get(timeout=POLL_TIMEOUT)
+                    except queue.Empty:
+                        continue
+
+            # Đã biết kích thước frame: VideoCapture decode thẳng vào slot, không copy
+            view = slot_view(shm.buf, slot, slot_bytes, shape) if shape else None
+            ret, frame = cap.read(view) if zero_copy and view is not None else cap.read()
+            if not ret or frame is None:
+                free.put(slot)
+                break
+            if view is None or frame.shape != view.shape or frame.ctypes.data != view.ctypes.data:
+                target = fit_shape(frame.shape, slot_bytes)
+                view = slot_view(shm.buf, slot, slot_bytes, target)
+                if target != frame.shape:
+                    cv2.resize(frame, (target[1], target[0]), dst=view, interpolation=cv2.INTER_AREA)
+                else:
+                    np.copyto(view, frame)
+                    counters[2] += 1
+                shape = target
+            del view, frame
+
+            frame_id += 1
+            counters[0] = frame_id
+            # perf_counter dùng CLOCK_MONOTONIC: so được giữa các process trên cùng máy (Linux)
+            ready.put((slot, shape, frame_id, time.perf_counter()))
+    finally:
+        try:
+            if cap is not None:
+                cap.release()
+        except:
+            pass
+        if status.value == STATUS_PENDING:
+            status.value = STATUS_FAILED
+        ready.put(None)
+        try:
+            shm.close()
+        except BufferError:
+            pass
+
+
+class RingCapture:
+    """
+    Thay cho cv2.VideoCapture (read / isOpened / get / release) nhưng decode chạy trên process riêng,
+    ghi vào ring frame trong multiprocessing.shared_memory. read() trả về view vào slot, không copy,
+    không pickle ảnh; pipeline gọi recycle(frame) khi xử lý xong để trả slot cho process capture.
+    Nhiều camera -> nhiều process decode song song, không bị GIL giới hạn.
+    """
+
+    def __init__(self, source, slots=RING_SLOTS, max_shape=RING_MAX_SHAPE, drop=True):
+        ctx = mp.get_context("spawn")
+        self.slots = slots
+        self.slot_bytes = int(np.prod(max_shape))
+        self.shm = shared_memory.SharedMemory(create=True, size=slots * self.slot_bytes)
+        self.base = np.frombuffer(self.shm.buf, dtype=np.uint8).ctypes.data
+        self.free = ctx.Queue()
+        self.ready = ctx.Queue()
+        for slot in range(slots):
+            self.free.put(slot)
+        self.stop_event = ctx.Event()
+        self.status = ctx.Value("i", STATUS_PENDING)
+        self.fps = ctx.Value("d", 0.0)
+        self.counters = ctx.Array("q", 3)
+        self.held = set()
+        self.lock = threading.Lock()
+        self.eof = False
+        self.released = False
+        self.process = ctx.Process(
+            target=capture_worker, name="ring-capture", daemon=True,
+            args=(source, self.shm.name, slots, self.slot_bytes, self.free, self.ready, self.stop_event,
+                  self.status, self.fps, self.counters, drop))
+        self.process.start()
+
+    def isOpened(self):
+        deadline = time.monotonic() + OPEN_TIMEOUT
+        while self.status.value == STATUS_PENDING and self.process.is_alive() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return self.status.value == STATUS_OPEN
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            self.isOpened()
+            return self.fps.value
+        return 0.0
+
+    def read(self):
+        while not self.eof:
+            try:
+                item = self.ready.get(timeout=POLL_TIMEOUT)
+            except queue.Empty:
+                if not self.process.is_alive() and self.ready.empty():
+                    self.eof = True
+                continue
+            if item is None:
+                self.eof = True
+                break
+            slot, shape, _, _ = item
+            with self.lock:
+                self.held.add(slot)
+            return True, slot_view(self.shm.buf, slot, self.slot_bytes, shape)
+        return False, None
+
+    def slot_of(self, frame):
+        offset = frame.ctypes.data - self.base
+        if offset < 0 or offset >= self.slots * self.slot_bytes:
+            return None
+        return offset // self.slot_bytes
+
+    def recycle(self, frame):
+        # Trả slot của frame (view do read() trả về) cho process capture; frame khác thì bỏ qua
+        slot = self.slot_of(frame)
+        with self.lock:
+            if slot is None or slot not in self.held:
+                return
+            self.held.discard(slot)
+        self.free.put(slot)
+
+    def stats(self):
+        decoded, dropped, copies = self.counters[:]
+        return {"ring_decoded": decoded, "ring_dropped": dropped, "ring_copies": copies,
+                "ring_held": len(self.held)}
+
+    def release(self):
+        if self.released:
+            return
+        self.released = True
+        self.stop_event.set()
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.shm.unlink()
+        try:
+            self.shm.close()
+        except BufferError:
+            # Frame đang được detect giữ vẫn đọc được: mmap tự đóng khi không còn view nào
+            pass
@@ -0,0 +1,139 @@
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import cv2
+
+from recognition.queues import StageQueue, STOP, DROP_NEWEST
+from recognition.metrics import NULL_METRICS, STAGE_IMWRITE
+
+# ---------------------------
+# Config
+# ---------------------------
+JPEG_QUALITY = 90
+WRITER_WORKERS = 2
+WRITER_QUEUE_SIZE = 64
+
+# Các loại ảnh bằng chứng cho mỗi track
+KIND_FIRST = "first"   # lần đầu thấy xe
+KIND_BEST = "best"     # crop biển số tốt nhất (ghi đè khi có crop tốt hơn)
+KIND_EXIT = "exit"     # lần cuối thấy xe trước khi rời khung hình
+
+MAX_WRITES_PER_TRACK = 4   # first + best (tối đa 2 lần) + exit
+MAX_TRACKS = 1024          # số track nhớ trạng thái dedupe (LRU)
+
+
+class TrackFiles:
+    def __init__(self, stamp):
+        self.stamp = stamp
+        self.kinds = {}    # kind -> (car_path, plate_path)
+        self.writes = 0
+
+
+class EvidenceWriter:
+    """
+    Ghi ảnh bằng chứng (xe / biển số) trên pool thread riêng qua queue có giới hạn.
+    Mỗi track ghi tối đa `max_per_track` ảnh, tên file cố định theo (track, kind) nên
+    ảnh "best" được ghi đè tại chỗ và đường dẫn trả về vẫn đúng cho DB.
+    """
+
+    def __init__(self, saved_cars="saved_cars", saved_plates="saved_plates", workers=WRITER_WORKERS,
+                 queue_size=WRITER_QUEUE_SIZE, jpeg_quality=JPEG_QUALITY, max_per_track=MAX_WRITES_PER_TRACK,
+                 on_written=None, metrics=None):
+        self.saved_cars = saved_cars
+        self.saved_plates = saved_plates
+        self.jpeg_quality = jpeg_quality
+        self.max_per_track = max_per_track
+        self.on_written = on_written
+        self.metrics = metrics if metrics is not None else NULL_METRICS
+
+        os.makedirs(saved_cars, exist_ok=True)
+        os.makedirs(saved_plates, exist_ok=True)
+
+        self.queue = StageQueue(queue_size, DROP_NEWEST)
+        self.tracks = OrderedDict()
+        self.lock = threading.Lock()
+        self.written = 0
+        self.failed = 0
+
+        self.threads = [threading.Thread(target=self.write_loop, name=f"evidence-writer-{i}", daemon=True)
+                        for i in range(workers)]
+        for t in self.threads:
+            t.start()
+
+    def has(self, track_id, kind):
+        # Kiểm tra trước khi copy crop
+        with self.lock:
+            tf = self.tracks.get(track_id)
+            if tf is None:
+                return False
+            if kind != KIND_BEST and kind in tf.kinds:
+                return True
+            return tf.writes >= self.max_per_track
+
+    def paths(self, track_id, kind=None):
+        """
+        Đường dẫn đã đặt cho track: kind cụ thể, hoặc (ưu tiên) best -> first -> exit
+        """
+        with self.lock:
+            tf = self.tracks.get(track_id)
+            if tf is None:
+                return None, None
+            for k in ([kind] if kind else [KIND_BEST, KIND_FIRST, KIND_EXIT]):
+                if k in tf.kinds:
+                    return tf.kinds[k]
+            return None, None
+
+    def submit(self, track_id, kind, car_crop, plate_crop=None):
+        """
+        Đưa ảnh vào queue ghi. Trả về (car_path, plate_path), hoặc (None, None) nếu bị bỏ
+        (đã ghi loại này, vượt giới hạn / track, hoặc queue đầy).
+        """
+        with self.lock:
+            tf = self.tracks.get(track_id)
+            if tf is None:
+                tf = self.tracks[track_id] = TrackFiles(datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3])
+                if len(self.tracks) > MAX_TRACKS:
+                    self.tracks.popitem(last=False)
+            else:
+                self.tracks.move_to_end(track_id)
+            if (kind != KIND_BEST and kind in tf.kinds) or tf.writes >= self.max_per_track:
+                return None, None
+
+            car_path = os.path.join(self.saved_cars, f"car_{track_id}_{tf.stamp}_{kind}.jpg")
+            plate_path = None
+            if plate_crop is not None and plate_crop.size > 0:
+                plate_path = os.path.join(self.saved_plates, f"plate_{track_id}_{tf.stamp}_{kind}.jpg")
+
+            if not self.queue.put((track_id, kind, car_path, car_crop, plate_path, plate_crop)):
+                return None, None
+            tf.writes += 1
+            tf.kinds[kind] = (car_path, plate_path)
+            return car_path, plate_path
+
+    def close(self):
+        # Ghi nốt queue rồi dừng các worker
+        for _ in self.threads:
+            self.queue.put_stop()
+        for t in self.threads:
+            t.join()
+
+    def write_loop(self):
+        params = [cv2.IMWRITE_JPEG_QUALITY, int(self.jpeg_quality)]
+        while True:
+            job = self.queue.get(timeout=0.5)
+            if job is None: continue
+            if job is STOP: break
+            track_id, kind, car_path, car_crop, plate_path, plate_crop = job
+            with self.metrics.timed(STAGE_IMWRITE):
+                ok = cv2.imwrite(car_path, car_crop, params)
+                if plate_path:
+                    ok = cv2.imwrite(plate_path, plate_crop, params) and ok
+            with self.lock:
+                if ok:
+                    self.written += 1
+                else:
+                    self.failed += 1
+            if self.on_written:
+                self.on_written(track_id, kind, car_path if ok else None, plate_path if ok else None)
@@ -0,0 +1,119 @@
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from recognition.plate_recog import load_haar_cascade
+
+# ---------------------------
+# Config
+# ---------------------------
+SHED_HIGH_MS = 250.0      # độ trễ frame (EWMA) trên mức này -> giảm chất lượng 1 bậc
+SHED_LOW_MS = 120.0       # dưới mức này (và queue gần rỗng) đủ lâu -> tăng lại 1 bậc
+SHED_QUEUE_HIGH = 0.75    # queue đầy hơn tỉ lệ này coi như quá tải
+SHED_QUEUE_LOW = 0.25
+SHED_EWMA_ALPHA = 0.2
+SHED_COOLDOWN = 15        # số frame tối thiểu giữa 2 lần giảm bậc
+SHED_RECOVER = 90         # số frame liên tục nhẹ tải trước khi tăng bậc
+
+# imgsz_scale: nhân input size của detector; skip_read: không tìm biển số trên track đã chốt;
+# ocr_window_scale: nhân CROP_WINDOW (gửi OCR thưa hơn); haar: thay plate_model bằng Haar cascade
+QualityLevel = namedtuple("QualityLevel", "name imgsz_scale skip_read ocr_window_scale haar")
+
+QUALITY_LEVELS = (
+    QualityLevel("full", 1.0, False, 1, False),
+    QualityLevel("small_input", 0.75, False, 1, False),
+    QualityLevel("skip_read_tracks", 0.75, True, 1, False),
+    QualityLevel("low_ocr_rate", 0.75, True, 2, False),
+    QualityLevel("haar_plates", 0.5, True, 2, True),
+)
+
+
+def available_levels(levels=QUALITY_LEVELS, load_cascade=load_haar_cascade):
+    """
+    Bỏ các bậc haar khi không load được Haar cascade (vd. OpenCV 5 không có CascadeClassifier): bậc đó
+    sẽ vẫn chạy plate_model, history ghi một lần giảm tải không có thật
+    """
+    if not any(level.haar for level in levels):
+        return levels
+    try:
+        load_cascade()
+    except (RuntimeError, FileNotFoundError) as e:
+        print("Không dùng được Haar cascade, bỏ bậc haar khỏi load shedding:", e)
+        return tuple(level for level in levels if not level.haar)
+    return levels
+
+
+def scaled_imgsz(imgsz, scale, default=640):
+    # Giữ bội số của 32 (stride YOLO)
+    if scale == 1.0:
+        return imgsz
+    return max(32, int((imgsz or default) * scale) // 32 * 32)
+
+
+class LoadShedder:
+    """
+    Theo dõi độ trễ end-to-end của frame (EWMA) và độ đầy các queue, giảm dần chất lượng theo
+    QUALITY_LEVELS khi quá tải và tăng lại khi tải giảm. Mọi lần đổi bậc được ghi vào `history`
+    (và in ra / gọi on_change) để kiểm tra lại sau. levels=None: QUALITY_LEVELS qua available_levels().
+    """
+
+    def __init__(self, levels=None, high_ms=SHED_HIGH_MS, low_ms=SHED_LOW_MS,
+                 queue_high=SHED_QUEUE_HIGH, queue_low=SHED_QUEUE_LOW, alpha=SHED_EWMA_ALPHA,
+                 cooldown=SHED_COOLDOWN, recover=SHED_RECOVER, on_change=None, verbose=True):
+        self.levels = available_levels() if levels is None else levels
+        self.high_ms = high_ms
+        self.low_ms = low_ms
+        self.queue_high = queue_high
+        self.queue_low = queue_low
+        self.alpha = alpha
+        self.cooldown = cooldown
+        self.recover = recover
+        self.on_change = on_change
+        self.verbose = verbose
+        self.index = 0
+        self.latency_ms = None
+        self.since_change = 0
+        self.calm_frames = 0
+        self.history = []
+
+    @property
+    def level(self):
+        return self.levels[self.index]
+
+    def update(self, latency_s, queue_fill=0.0):
+        """
+        Gọi sau mỗi frame đã xử lý. queue_fill: độ đầy lớn nhất của các queue (0..1).
+        Trả về QualityLevel mới nếu vừa đổi bậc, không thì None
+        """
+        ms = latency_s * 1000.0
+        self.latency_ms = ms if self.latency_ms is None else self.alpha * ms + (1 - self.alpha) * self.latency_ms
+        self.since_change += 1
+
+        overloaded = self.latency_ms > self.high_ms or queue_fill >= self.queue_high
+        calm = self.latency_ms < self.low_ms and queue_fill <= self.queue_low
+        self.calm_frames = self.calm_frames + 1 if calm else 0
+
+        if overloaded and self.index < len(self.levels) - 1 and self.since_change >= self.cooldown:
+            return self.change(self.index + 1, queue_fill)
+        if self.calm_frames >= self.recover and self.index > 0:
+            return self.change(self.index - 1, queue_fill)
+        return None
+
+    def change(self, index, queue_fill):
+        old = self.level
+        self.index = index
+        self.since_change = 0
+        self.calm_frames = 0
+        event = {
+            "time": datetime.now().isoformat(timespec="milliseconds"),
+            "monotonic": round(time.monotonic(), 3),
+            "from": old.name, "to": self.level.name, "level": index,
+            "latency_ms": round(self.latency_ms, 1), "queue_fill": round(queue_fill, 2),
+        }
+        self.history.append(event)
+        if self.verbose:
+            print(f"[load-shedding] {event['from']} -> {event['to']} "
+                  f"(latency {event['latency_ms']} ms, queue {event['queue_fill']})", flush=True)
+        if self.on_change:
+            self.on_change(event)
+        return self.level
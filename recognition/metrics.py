@@ -0,0 +1,144 @@
+import sys
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# ---------------------------
+# Config
+# ---------------------------
+MAX_SAMPLES = 100000   # số mẫu tối đa giữ cho mỗi stage
+
+# Tên stage dùng trong pipeline / benchmark
+STAGE_DECODE = "decode"
+STAGE_MOTION = "motion_gate"
+STAGE_VEHICLE = "vehicle_yolo"
+STAGE_TRACK = "tracker"
+STAGE_PLATE = "plate_yolo"
+STAGE_OCR = "ocr"                         # thời gian recognizer cho 1 lần gọi (1 batch crop)
+STAGE_OCR_ROUNDTRIP = "ocr_roundtrip"     # từ lúc gửi batch tới lúc có kết quả (gồm chờ worker)
+STAGE_IMWRITE = "imwrite"
+STAGE_DB = "db"
+STAGE_FRAME = "frame_total"   # từ lúc đọc frame tới khi detect stage xử lý xong
+
+# Kích thước (không phải thời gian) ghi theo từng lần xử lý
+SIZE_OCR_BATCH = "ocr_batch"
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * p / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+class StageMetrics:
+    """
+    Ghi độ trễ (giây) theo stage, gọi được từ nhiều thread (deque.append an toàn với GIL)
+    """
+
+    def __init__(self, max_samples=MAX_SAMPLES):
+        self.max_samples = max_samples
+        self.samples = {}
+        self.sizes = {}
+
+    def record(self, stage, seconds):
+        samples = self.samples.get(stage)
+        if samples is None:
+            samples = self.samples.setdefault(stage, deque(maxlen=self.max_samples))
+        samples.append(seconds)
+
+    def record_size(self, name, value):
+        sizes = self.sizes.get(name)
+        if sizes is None:
+            sizes = self.sizes.setdefault(name, deque(maxlen=self.max_samples))
+        sizes.append(value)
+
+    @contextmanager
+    def timed(self, stage):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - t0)
+
+    def summary(self):
+        """
+        {stage: {count, mean_ms, p50_ms, p90_ms, p99_ms, max_ms, total_s}}
+        """
+        result = {}
+        for stage, samples in sorted(self.samples.items()):
+            values = sorted(samples)
+            if not values:
+                continue
+            result[stage] = {
+                "count": len(values),
+                "mean_ms": round(1000 * sum(values) / len(values), 3),
+                "p50_ms": round(1000 * percentile(values, 50), 3),
+                "p90_ms": round(1000 * percentile(values, 90), 3),
+                "p99_ms": round(1000 * percentile(values, 99), 3),
+                "max_ms": round(1000 * values[-1], 3),
+                "total_s": round(sum(values), 4),
+            }
+        return result
+
+    def size_summary(self):
+        """
+        {name: {count, mean, p50, p90, max, total}}
+        """
+        result = {}
+        for name, sizes in sorted(self.sizes.items()):
+            values = sorted(sizes)
+            if not values:
+                continue
+            result[name] = {
+                "count": len(values),
+                "mean": round(sum(values) / len(values), 2),
+                "p50": percentile(values, 50),
+                "p90": percentile(values, 90),
+                "max": values[-1],
+                "total": sum(values),
+            }
+        return result
+
+
+class NullMetrics:
+    # Mặc định khi không đo: không tốn gì
+    def record(self, stage, seconds):
+        pass
+
+    def record_size(self, name, value):
+        pass
+
+    @contextmanager
+    def timed(self, stage):
+        yield
+
+    def summary(self):
+        return {}
+
+    def size_summary(self):
+        return {}
+
+
+NULL_METRICS = NullMetrics()
+
+
+def peak_rss_mb():
+    """
+    Peak RSS của process (MB), None nếu không đo được trên hệ điều hành này
+    """
+    try:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux trả về KB, macOS trả về byte
+        return round(rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024, 1)
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return round(getattr(info, "peak_wset", info.rss) / (1024 * 1024), 1)
+    except ImportError:
+        return None
@@ -0,0 +1,93 @@
+import cv2
+
+from recognition.backends import BACKEND_TORCH, DEFAULT_IMGSZ, load_detector
+from recognition.trackers import TRACKER_DEEPSORT, TRACKER_IOU, IouTracker
+from recognition.motion import MotionGate, scaled_max_age
+
+# ---------------------------
+# Config
+# ---------------------------
+VEHICLE_MODEL_PATH = "yolov8n-vehicle.pt"
+PLATE_MODEL_PATH = "license_plate_detector.pt"
+# Model gộp xe + biển số cho plate_mode "combined" (class id: xem plate_recog.COMBINED_*_CLASSES)
+COMBINED_MODEL_PATH = "vehicle_plate.pt"
+OCR_MODEL_NAME = "cct-xs-v1-global-model"
+
+# Backend cho 2 model YOLO: "torch" (.pt), "onnx" (ONNX Runtime CPU) hoặc "openvino"
+DETECTOR_BACKEND = BACKEND_TORCH
+DETECTOR_INT8 = False
+DETECTOR_THREADS = 0      # 0 = để runtime tự chọn
+
+# "deepsort" (có appearance embedding) hoặc "iou" (chỉ Kalman + IoU, nhẹ hơn nhiều trên CPU)
+TRACKER_KIND = TRACKER_DEEPSORT
+TRACKER_MAX_AGE = 30
+TRACKER_N_INIT = 3
+TRACKER_NN_BUDGET = 100
+
+
+def load_vehicle_model(path=VEHICLE_MODEL_PATH, backend=DETECTOR_BACKEND, int8=DETECTOR_INT8,
+                       threads=DETECTOR_THREADS, imgsz=DEFAULT_IMGSZ):
+    return load_detector(path, backend, imgsz, threads, int8)
+
+
+def load_plate_model(path=PLATE_MODEL_PATH, backend=DETECTOR_BACKEND, int8=DETECTOR_INT8,
+                     threads=DETECTOR_THREADS, imgsz=DEFAULT_IMGSZ):
+    return load_detector(path, backend, imgsz, threads, int8)
+
+
+def load_combined_model(path=COMBINED_MODEL_PATH, backend=DETECTOR_BACKEND, int8=DETECTOR_INT8,
+                        threads=DETECTOR_THREADS, imgsz=DEFAULT_IMGSZ):
+    return load_detector(path, backend, imgsz, threads, int8)
+
+
+def load_ocr(model_name=OCR_MODEL_NAME):
+    from fast_plate_ocr import LicensePlateRecognizer
+
+    return LicensePlateRecognizer(model_name)
+
+
+def load_models(vehicle_model_path=VEHICLE_MODEL_PATH, plate_model_path=PLATE_MODEL_PATH,
+                ocr_model_name=OCR_MODEL_NAME, backend=DETECTOR_BACKEND, int8=DETECTOR_INT8,
+                threads=DETECTOR_THREADS, vehicle_imgsz=DEFAULT_IMGSZ, plate_imgsz=DEFAULT_IMGSZ):
+    """
+    Trả về (vehicle_model, plate_model, ocr). Với backend onnx / openvino, imgsz là input size
+    lúc export (chỉ dùng khi chưa có file .onnx). Cần load dần / chạy nền: xem recognition.registry
+    """
+    vehicle_model = load_vehicle_model(vehicle_model_path, backend, int8, threads, vehicle_imgsz)
+    plate_model = load_plate_model(plate_model_path, backend, int8, threads, plate_imgsz)
+    ocr = load_ocr(ocr_model_name)
+    return vehicle_model, plate_model, ocr
+
+
+def create_tracker(kind=TRACKER_KIND, max_age=TRACKER_MAX_AGE, n_init=TRACKER_N_INIT, nn_budget=TRACKER_NN_BUDGET,
+                   frame_stride=1):
+    """
+    Tracker có update_tracks(detections, frame=...) trả về các track có track_id / to_ltrb() / is_confirmed().
+    frame_stride: chỉ update 1 trong frame_stride frame (MotionGate active_stride) -> max_age tính lại
+    theo số lần update để track sống cùng một khoảng thời gian
+    """
+    max_age = scaled_max_age(max_age, frame_stride)
+    if kind == TRACKER_IOU:
+        return IouTracker(max_age=max_age, n_init=n_init)
+    if kind != TRACKER_DEEPSORT:
+        raise ValueError(f"Tracker không hỗ trợ: {kind}")
+    from deep_sort_realtime.deepsort_tracker import DeepSort
+
+    return DeepSort(max_age=max_age, n_init=n_init, nn_budget=nn_budget)
+
+
+def stride(args):
+    """
+    args của run_headless / run_benchmark (motion_gate, active_stride): frame_stride cho create_tracker
+    """
+    return args.active_stride if args.motion_gate else 1
+
+
+def motion_gate(args, cap):
+    """
+    MotionGate theo fps của cap (args.motion_gate, idle_fps, active_stride), None nếu không bật
+    """
+    if not args.motion_gate:
+        return None
+    fps = cap.get(cv2.CAP_PROP_FPS) if hasattr(cap, "get") else 0
+    return MotionGate.for_fps(fps, args.idle_fps, active_stride=args.active_stride)
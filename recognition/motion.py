@@ -0,0 +1,84 @@
+import math
+
+import cv2
+import numpy as np
+
+# ---------------------------
+# Config
+# ---------------------------
+MOTION_WIDTH = 160          # so sánh trên ảnh xám thu nhỏ còn rộng bấy nhiêu pixel
+MOTION_PIXEL_DIFF = 25      # chênh lệch mức xám để coi 1 pixel là thay đổi
+MOTION_MIN_AREA = 0.002     # tỉ lệ pixel thay đổi tối thiểu để coi là có chuyển động
+BACKGROUND_ALPHA = 0.05     # tốc độ cập nhật nền (xe đỗ lâu dần thành nền)
+MOTION_HOLD = 10            # sau khi thấy chuyển động, xử lý đủ bấy nhiêu frame nữa
+IDLE_FPS = 1.0              # cảnh tĩnh, không có track: vẫn xử lý ~1 frame/giây
+DEFAULT_FPS = 25.0
+
+
+class MotionGate:
+    """
+    Quyết định frame nào cần chạy detector / tracker:
+      - còn track (kể cả chưa confirmed): xử lý mỗi `active_stride` frame
+      - có chuyển động so với nền (ảnh xám thu nhỏ): xử lý, giữ thêm `hold` frame
+      - cảnh tĩnh: chỉ xử lý mỗi `idle_stride` frame
+    Chi phí mỗi frame chỉ là resize + absdiff trên ảnh nhỏ.
+    """
+
+    def __init__(self, idle_stride=int(DEFAULT_FPS / IDLE_FPS), active_stride=1, width=MOTION_WIDTH,
+                 pixel_diff=MOTION_PIXEL_DIFF, min_area=MOTION_MIN_AREA, alpha=BACKGROUND_ALPHA,
+                 hold=MOTION_HOLD):
+        self.idle_stride = max(1, idle_stride)
+        self.active_stride = max(1, active_stride)
+        self.width = width
+        self.pixel_diff = pixel_diff
+        self.min_area = min_area
+        self.alpha = alpha
+        self.hold = hold
+        self.background = None
+        self.hold_left = 0
+        self.since_processed = 0
+        self.processed = 0
+        self.skipped = 0
+
+    @classmethod
+    def for_fps(cls, fps, idle_fps=IDLE_FPS, **kwargs):
+        # fps của nguồn video (0 / không rõ -> DEFAULT_FPS)
+        fps = fps if fps and fps > 0 else DEFAULT_FPS
+        return cls(idle_stride=int(round(fps / idle_fps)), **kwargs)
+
+    def motion(self, frame):
+        h, w = frame.shape[:2]
+        small = cv2.resize(frame, (self.width, max(1, h * self.width // w)), interpolation=cv2.INTER_AREA)
+        gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+        if self.background is None:
+            self.background = gray.astype(np.float32)
+            return True
+        diff = cv2.absdiff(gray, cv2.convertScaleAbs(self.background))
+        cv2.accumulateWeighted(gray, self.background, self.alpha)
+        return np.count_nonzero(diff > self.pixel_diff) >= self.min_area * diff.size
+
+    def should_process(self, frame, has_tracks):
+        """
+        Gọi với mọi frame. has_tracks: tracker còn giữ track nào sau lần xử lý trước không
+        """
+        if self.motion(frame):
+            self.hold_left = self.hold
+        elif self.hold_left:
+            self.hold_left -= 1
+
+        self.since_processed += 1
+        stride = self.active_stride if has_tracks or self.hold_left else self.idle_stride
+        if self.since_processed < stride:
+            self.skipped += 1
+            return False
+        self.since_processed = 0
+        self.processed += 1
+        return True
+
+
+def scaled_max_age(max_age, active_stride):
+    """
+    Tracker đếm tuổi theo số lần update: khi chỉ xử lý 1/active_stride frame, giảm max_age tương ứng
+    để track vẫn sống được cùng một khoảng thời gian thực
+    """
+    return max(1, math.ceil(max_age / max(1, active_stride)))
@@ -0,0 +1,256 @@
+import os
+import threading
+import time
+
+from recognition.plate_recog import (
+    detect_vehicles_batch, detect_combined_batch, detect_plates_batch, detect_plates_in_tracks_multi
+)
+from recognition.pipeline import (
+    RecognitionPipeline, PLATE_MODE_FULL, PLATE_MODE_CASCADE, PLATE_MODE_SHARED, PLATE_MODE_COMBINED
+)
+from recognition.load_shedding import scaled_imgsz
+from recognition.queues import StageQueue, STOP, DROP_OLDEST, DROP_NEWEST
+from recognition.db_writer import LogWriter
+from recognition.plate_dedupe import PlateDedupe
+from recognition.metrics import NULL_METRICS, STAGE_VEHICLE, STAGE_PLATE
+from recognition.ocr_pool import InlineOcr, OCR_BATCH_SIZE
+
+# ---------------------------
+# Config
+# ---------------------------
+IDLE_SLEEP = 0.005      # detect không có frame nào từ mọi camera: nghỉ một chút
+
+
+class RoutedQueue:
+    """
+    OCR queue của 1 camera: đẩy (camera, job) vào queue OCR chung để OCR gom batch qua mọi camera
+    """
+
+    def __init__(self, shared, camera):
+        self.shared = shared
+        self.camera = camera
+        self.maxsize = shared.maxsize
+
+    def put(self, job):
+        return self.shared.put((self.camera, job))
+
+    def put_wait(self, job):
+        self.shared.put_wait((self.camera, job))
+
+    def put_stop(self):
+        # STOP của queue chung do MultiCameraPipeline gửi khi mọi camera đã xong
+        pass
+
+    def fill(self):
+        return self.shared.fill()
+
+    def qsize(self):
+        return self.shared.qsize()
+
+    @property
+    def dropped(self):
+        return self.shared.dropped
+
+
+class MultiCameraPipeline:
+    """
+    1 process, N camera, 1 bộ model trong bộ nhớ:
+      capture (1 thread / camera) --frame_queue riêng--> detect (1 thread, frame mọi camera gom thành batch)
+      detect --ocr_queue chung (DROP_NEWEST)--> OCR (1 thread, crop của mọi camera gom thành batch)
+    Mỗi camera có tracker, vote cache, crop selector, ảnh bằng chứng, track_info riêng: dùng 1
+    RecognitionPipeline làm state (chỉ chạy capture thread của nó). Kết quả trả về theo tên camera.
+    """
+
+    def __init__(self, cameras, vehicle_model, plate_model, ocr, tracker_factory,
+                 db_path="plates.db", saved_cars="saved_cars", saved_plates="saved_plates",
+                 on_entries=None, on_plate=None, capture_policy=DROP_OLDEST, frame_queue_size=1,
+                 ocr_queue_size=64, ocr_policy=DROP_NEWEST, ocr_batch_size=OCR_BATCH_SIZE,
+                 plate_mode=PLATE_MODE_CASCADE, vehicle_imgsz=None, plate_imgsz=None, jpeg_quality=None,
+                 log_writer=None, plate_dedupe=None, annotate=True, metrics=None,
+                 motion_gate_factory=None, load_shedder_factory=None, ocr_pool=None, owner_index=None,
+                 on_gate=None):
+        """
+        cameras: list (tên camera / cổng, cap). tracker_factory(): tracker mới cho mỗi camera.
+        on_entries(camera, entries); on_plate(event) / on_gate(event) có event["gate"] = tên camera.
+        motion_gate_factory(cap) / load_shedder_factory(): tạo MotionGate / LoadShedder riêng mỗi camera.
+        ocr_pool: OcrPool (OCR trên worker process), None = OCR trên thread OCR
+        owner_index: OwnerIndex dùng chung cho mọi camera (tra chủ xe theo biển số)
+        """
+        self.vehicle_model = vehicle_model
+        self.plate_model = plate_model
+        self.ocr = ocr
+        # Batch nhiều frame đã gộp được phần chuẩn bị input: "shared" chạy như "full"
+        self.plate_mode = PLATE_MODE_FULL if plate_mode == PLATE_MODE_SHARED else plate_mode
+        self.vehicle_imgsz = vehicle_imgsz
+        self.plate_imgsz = plate_imgsz
+        self.ocr_batch_size = ocr_batch_size
+        self.metrics = metrics if metrics is not None else NULL_METRICS
+        self.db_path = db_path
+        self.log_writer = log_writer
+        self.own_log_writer = log_writer is None and db_path is not None
+        # Chống trùng theo (cổng, biển số): dùng chung được cho mọi camera
+        self.plate_dedupe = plate_dedupe if plate_dedupe is not None else PlateDedupe()
+        self.ocr_queue = StageQueue(ocr_queue_size, ocr_policy)
+        self.ocr_runner = ocr_pool if ocr_pool is not None else InlineOcr(ocr, self.metrics)
+
+        self.cameras = []
+        for name, cap in cameras:
+            camera = RecognitionPipeline(
+                cap, vehicle_model, plate_model, ocr, tracker_factory(), db_path=None,
+                # Track id của mỗi tracker đều bắt đầu từ 1: ảnh mỗi camera để thư mục riêng
+                saved_cars=os.path.join(saved_cars, name), saved_plates=os.path.join(saved_plates, name),
+                on_entries=(lambda entries, name=name: on_entries(name, entries)) if on_entries else None,
+                capture_policy=capture_policy, frame_queue_size=frame_queue_size,
+                plate_mode=self.plate_mode, vehicle_imgsz=vehicle_imgsz, plate_imgsz=plate_imgsz,
+                jpeg_quality=jpeg_quality, plate_dedupe=self.plate_dedupe, gate=name, annotate=annotate,
+                on_plate=on_plate, on_gate=on_gate, metrics=self.metrics,
+                motion_gate=motion_gate_factory(cap) if motion_gate_factory else None,
+                load_shedder=load_shedder_factory() if load_shedder_factory else None,
+                ocr_pool=self.ocr_runner, owner_index=owner_index,
+            )
+            camera.name = name
+            camera.ocr_queue = RoutedQueue(self.ocr_queue, camera)
+            self.cameras.append(camera)
+
+        self.threads = []
+        self.batches = 0
+        self.batch_frames = 0
+
+    # ---------------- Control ----------------
+    def start(self):
+        if self.own_log_writer:
+            self.log_writer = LogWriter(self.db_path, metrics=self.metrics)
+        self.threads = []
+        for camera in self.cameras:
+            camera.log_writer = self.log_writer
+            camera.open_writers()
+            camera.running = True
+            self.threads.append(threading.Thread(target=camera.capture_loop, name=f"capture-{camera.name}",
+                                                 daemon=True))
+        self.threads.append(threading.Thread(target=self.detect_loop, name="multicam-detect", daemon=True))
+        self.threads.append(threading.Thread(target=self.ocr_loop, name="multicam-ocr", daemon=True))
+        for t in self.threads:
+            t.start()
+
+    def stop(self):
+        for camera in self.cameras:
+            camera.running = False
+
+    def join(self, timeout=None):
+        for t in self.threads:
+            t.join(timeout)
+
+    def is_alive(self):
+        return any(t.is_alive() for t in self.threads)
+
+    def camera(self, name):
+        return next(c for c in self.cameras if c.name == name)
+
+    def stats(self):
+        cameras = {c.name: c.stats() for c in self.cameras}
+        totals = {key: sum(s[key] for s in cameras.values())
+                  for key in ("frames_read", "frames_processed", "frames_skipped", "frame_dropped",
+                              "ocr_calls", "ocr_skipped", "images_written")}
+        return {
+            **totals,
+            "batches": self.batches,
+            "mean_batch_frames": round(self.batch_frames / max(self.batches, 1), 2),
+            **self.ocr_runner.stats(),
+            "ocr_queue": self.ocr_queue.qsize(), "ocr_dropped": self.ocr_queue.dropped,
+            "db_rows": self.log_writer.rows_written if self.log_writer else 0,
+            "cameras": cameras,
+        }
+
+    # ---------------- Stages ----------------
+    def detect_loop(self):
+        active = list(self.cameras)
+        try:
+            while active:
+                # Lấy tối đa 1 frame mỗi camera, không chờ camera chậm
+                batch = []
+                for camera in list(active):
+                    item = camera.frame_queue.get(timeout=0)
+                    if item is None: continue
+                    if item is STOP:
+                        active.remove(camera)
+                        continue
+                    batch.append((camera, item))
+                if not batch:
+                    time.sleep(IDLE_SLEEP)
+                    continue
+                self.process_batch(batch)
+        finally:
+            for camera in self.cameras:
+                camera.running = False
+                camera.flush_crops()
+            self.ocr_queue.put_stop()
+
+    def process_batch(self, batch):
+        batch = [(camera, item) for camera, item in batch if camera.gate_frame(item[1])]
+        if not batch:
+            return
+        self.batches += 1
+        self.batch_frames += len(batch)
+        levels = [camera.quality() for camera, _ in batch]
+        frames = [item[1] for _, item in batch]
+        # Cả batch chung 1 input size: theo camera đang giảm tải sâu nhất
+        scale = min(level.imgsz_scale for level in levels)
+        vehicle_imgsz = scaled_imgsz(self.vehicle_imgsz, scale)
+        plate_imgsz = scaled_imgsz(self.plate_imgsz, scale)
+
+        with self.metrics.timed(STAGE_VEHICLE):
+            if self.plate_mode == PLATE_MODE_COMBINED:
+                detected = detect_combined_batch(self.vehicle_model, frames, imgsz=vehicle_imgsz)
+            else:
+                detected = [(d, None) for d in detect_vehicles_batch(self.vehicle_model, frames,
+                                                                      imgsz=vehicle_imgsz)]
+        tracked = [camera.track(frame, detections)
+                   for (camera, _), frame, (detections, _) in zip(batch, frames, detected)]
+
+        with self.metrics.timed(STAGE_PLATE):
+            plates = [None] * len(batch)
+            cascade, full = [], []
+            for i, ((camera, _), level) in enumerate(zip(batch, levels)):
+                mode = camera.frame_plate_mode(level)
+                if level.haar and mode == PLATE_MODE_CASCADE and camera.haar_cascade():
+                    plates[i] = camera.find_plates(frames[i], tracked[i][0], None, level)
+                elif mode == PLATE_MODE_CASCADE:
+                    cascade.append(i)
+                elif detected[i][1] is None:
+                    full.append(i)
+                else:
+                    plates[i] = camera.find_plates(frames[i], tracked[i][0], detected[i][1], level)
+
+            # Crop xe của mọi camera chung 1 batch plate_model
+            scenes = [(frames[i], batch[i][0].plate_cars(tracked[i][0], levels[i])) for i in cascade]
+            for i, matches in zip(cascade, detect_plates_in_tracks_multi(self.plate_model, scenes,
+                                                                         imgsz=plate_imgsz)):
+                plates[i] = (matches, [pb for _, pb in matches])
+            # Toàn frame: mọi frame chung 1 lần gọi plate_model
+            boxes = detect_plates_batch(self.plate_model, [frames[i] for i in full],
+                                        imgsz=plate_imgsz) if full else []
+            for i, plate_bboxes in zip(full, boxes):
+                plates[i] = batch[i][0].find_plates(frames[i], tracked[i][0], plate_bboxes, levels[i])
+
+        for (camera, (frame_id, frame, t_read)), (tracked_cars, live_ids), (matches, plate_bboxes) \
+                in zip(batch, tracked, plates):
+            camera.finish_frame(frame_id, frame, t_read, tracked_cars, live_ids, plate_bboxes, matches)
+
+    def handle_ocr(self, key, text):
+        camera, job = key
+        camera.handle_ocr(job, text)
+
+    def ocr_loop(self):
+        # Crop của mọi camera gom chung batch; kết quả về đúng camera theo key (camera, job)
+        try:
+            stopped = False
+            while not stopped:
+                jobs, stopped = self.ocr_queue.get_batch(self.ocr_batch_size)
+                if jobs:
+                    self.ocr_runner.submit(jobs, [job["plate_crop"] for _, job in jobs], self.handle_ocr)
+            self.ocr_runner.drain()
+        finally:
+            for camera in self.cameras:
+                camera.finish_ocr()
+            if self.own_log_writer:
+                self.log_writer.close()
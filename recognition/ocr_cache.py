@@ -0,0 +1,130 @@
+import threading
+from collections import Counter, OrderedDict
+
+from recognition.plate_recog import normalize_plate
+
+# ---------------------------
+# Config
+# ---------------------------
+OCR_MIN_VOTES = 3          # số lần đọc tối thiểu khớp với kết quả vote
+OCR_MIN_CONFIDENCE = 0.8   # tỉ lệ đồng thuận trung bình trên từng ký tự
+OCR_MAX_READS = 15         # đọc tối đa bấy nhiêu lần rồi chốt kết quả
+LOGGED_MEMORY = 4096       # số track đã ghi log + đã xóa còn nhớ (kết quả OCR tới muộn không ghi lại)
+
+
+class TrackPlate:
+    def __init__(self):
+        self.readings = []
+        self.text = None
+        self.confidence = 0.0
+        self.votes = 0
+        self.final = False
+        self.logged = False
+
+    def add(self, text):
+        self.readings.append(text)
+        self.vote()
+
+    def vote(self):
+        # Chọn độ dài phổ biến nhất, sau đó vote từng vị trí ký tự
+        length, _ = Counter(len(r) for r in self.readings).most_common(1)[0]
+        same_len = [r for r in self.readings if len(r) == length]
+
+        chars = []
+        agreement = []
+        for i in range(length):
+            ch, n = Counter(r[i] for r in same_len).most_common(1)[0]
+            chars.append(ch)
+            agreement.append(n / len(same_len))
+
+        self.text = "".join(chars)
+        self.votes = sum(1 for r in same_len if r == self.text)
+        self.confidence = (sum(agreement) / length) * (len(same_len) / len(self.readings))
+
+
+class PlateVoteCache:
+    """
+    Cache kết quả OCR theo track_id: gom nhiều lần đọc qua các frame, vote từng ký tự,
+    ngừng gọi OCR khi track đã đủ vote / đủ độ tin cậy. Entry bị xóa khi tracker bỏ track.
+    Bit "đã ghi log" nằm cùng track (mark_logged): mỗi track chỉ được ghi log 1 lần trong suốt vòng đời.
+    """
+
+    def __init__(self, min_votes=OCR_MIN_VOTES, min_confidence=OCR_MIN_CONFIDENCE, max_reads=OCR_MAX_READS,
+                 logged_memory=LOGGED_MEMORY):
+        self.min_votes = min_votes
+        self.min_confidence = min_confidence
+        self.max_reads = max_reads
+        self.logged_memory = logged_memory
+        self.tracks = {}
+        self.logged = OrderedDict()  # track đã ghi log và đã bị xóa, cũ nhất ở đầu
+        self.lock = threading.Lock()
+        self.ocr_calls = 0
+        self.ocr_skipped = 0
+
+    def should_read(self, track_id):
+        with self.lock:
+            tp = self.tracks.get(track_id)
+            if tp is not None and tp.final:
+                self.ocr_skipped += 1
+                return False
+            return True
+
+    def add(self, track_id, text):
+        """
+        Thêm 1 lần đọc OCR. Trả về (text_vote, final)
+        """
+        text = normalize_plate(text)
+        with self.lock:
+            self.ocr_calls += 1
+            if track_id in self.logged:
+                # Kết quả tới sau khi track đã ghi log và bị xóa: bỏ qua
+                return None, False
+            tp = self.tracks.setdefault(track_id, TrackPlate())
+            if text and not tp.final:
+                tp.add(text)
+                if (tp.votes >= self.min_votes and tp.confidence >= self.min_confidence) \
+                        or len(tp.readings) >= self.max_reads:
+                    tp.final = True
+            return tp.text, tp.final
+
+    def get(self, track_id):
+        with self.lock:
+            tp = self.tracks.get(track_id)
+            return (tp.text, tp.final) if tp else (None, False)
+
+    def mark_logged(self, track_id):
+        """
+        Đánh dấu track đã ghi log. Trả về True nếu đây là lần đầu (người gọi ghi log), False nếu đã ghi rồi
+        """
+        with self.lock:
+            if track_id in self.logged:
+                return False
+            tp = self.tracks.get(track_id)
+            if tp is None:
+                # Track vừa bị expire (ghi kết quả tốt nhất lúc kết thúc)
+                self.remember_logged(track_id)
+                return True
+            if tp.logged:
+                return False
+            tp.logged = True
+            return True
+
+    def expire(self, live_ids):
+        """
+        Xóa các track không còn trong tracker. Trả về list (track_id, text, final) đã bị xóa.
+        """
+        with self.lock:
+            gone = [tid for tid in self.tracks if tid not in live_ids]
+            expired = []
+            for tid in gone:
+                tp = self.tracks.pop(tid)
+                if tp.logged:
+                    self.remember_logged(tid)
+                expired.append((tid, tp.text, tp.final))
+            return expired
+
+    def remember_logged(self, track_id):
+        # Giữ lock
+        self.logged[track_id] = True
+        while len(self.logged) > self.logged_memory:
+            self.logged.popitem(last=False)
@@ -0,0 +1,192 @@
+import multiprocessing as mp
+import queue
+import threading
+import time
+from functools import partial
+
+from recognition.plate_recog import read_plates
+from recognition.models import load_ocr, OCR_MODEL_NAME
+from recognition.registry import warmup_ocr
+from recognition.metrics import NULL_METRICS, STAGE_OCR, STAGE_OCR_ROUNDTRIP, SIZE_OCR_BATCH
+
+# ---------------------------
+# Config
+# ---------------------------
+OCR_WORKERS = 2          # số process OCR
+OCR_BATCH_SIZE = 16      # số crop tối đa trong 1 lần gọi recognizer
+OCR_MAX_INFLIGHT = 2     # số batch chờ tối đa mỗi worker; đầy thì OCR thread gom batch lớn hơn
+START_TIMEOUT = 120.0    # chờ worker load model (giây)
+POLL_TIMEOUT = 0.5
+
+
+def ocr_worker(factory, jobs, results, ready):
+    """
+    Process OCR: load recognizer 1 lần, nhận (batch_id, crops BGR), trả (batch_id, texts, giây).
+    Chuyển BGR -> RGB và gọi recognizer 1 lần cho cả batch (read_plates)
+    """
+    ocr = factory()
+    warmup_ocr(ocr)
+    ready.set()
+    while True:
+        item = jobs.get()
+        if item is None:
+            break
+        batch_id, crops = item
+        t0 = time.perf_counter()
+        texts = read_plates(ocr, crops)
+        results.put((batch_id, texts, time.perf_counter() - t0))
+
+
+class InlineOcr:
+    """
+    Cùng interface với OcrPool nhưng OCR ngay trên thread gọi submit (không có worker process)
+    """
+
+    def __init__(self, ocr, metrics=None):
+        self.ocr = ocr
+        self.metrics = metrics if metrics is not None else NULL_METRICS
+        self.batches = 0
+        self.crops = 0
+
+    def submit(self, keys, crops, callback):
+        t0 = time.perf_counter()
+        texts = read_plates(self.ocr, crops)
+        elapsed = time.perf_counter() - t0
+        self.metrics.record(STAGE_OCR, elapsed)
+        self.metrics.record(STAGE_OCR_ROUNDTRIP, elapsed)
+        self.metrics.record_size(SIZE_OCR_BATCH, len(crops))
+        self.batches += 1
+        self.crops += len(crops)
+        for key, text in zip(keys, texts):
+            callback(key, text)
+
+    def drain(self):
+        pass
+
+    def stats(self):
+        return {"ocr_batches": self.batches, "ocr_crops": self.crops,
+                "mean_ocr_batch": round(self.crops / max(self.batches, 1), 2)}
+
+
+class OcrPool:
+    """
+    Pool process OCR dùng chung cho mọi pipeline / camera trong process:
+      submit(keys, crops, callback) -> 1 batch gửi cho worker rảnh nhất (qua 1 queue chung),
+      kết quả về trên thread riêng: callback(key, text) cho từng crop, theo đúng key (vd. job của track).
+    Ghi mỗi batch: thời gian recognizer (STAGE_OCR), thời gian từ lúc gửi tới lúc nhận
+    (STAGE_OCR_ROUNDTRIP) và số crop (SIZE_OCR_BATCH).
+    """
+
+    def __init__(self, factory=None, workers=OCR_WORKERS, max_inflight=OCR_MAX_INFLIGHT, metrics=None):
+        """
+        factory: hàm (picklable) tạo recognizer trong worker, mặc định load_ocr(OCR_MODEL_NAME)
+        """
+        self.factory = factory if factory is not None else partial(load_ocr, OCR_MODEL_NAME)
+        self.workers = workers
+        self.metrics = metrics if metrics is not None else NULL_METRICS
+        self.slots = threading.BoundedSemaphore(workers * max_inflight)
+        self.pending = {}   # batch_id -> (keys, callback, t_submit)
+        self.lock = threading.Condition()
+        self.next_id = 0
+        self.processes = []
+        self.thread = None
+        self.running = False
+        self.batches = 0
+        self.crops = 0
+        self.failed = 0
+
+    def start(self, timeout=START_TIMEOUT):
+        ctx = mp.get_context("spawn")
+        self.jobs = ctx.Queue()
+        self.results = ctx.Queue()
+        events = []
+        for i in range(self.workers):
+            ready = ctx.Event()
+            p = ctx.Process(target=ocr_worker, name=f"ocr-worker-{i}", daemon=True,
+                            args=(self.factory, self.jobs, self.results, ready))
+            p.start()
+            self.processes.append(p)
+            events.append(ready)
+        # Các worker load model song song
+        deadline = time.monotonic() + timeout
+        for p, ready in zip(self.processes, events):
+            while not ready.wait(POLL_TIMEOUT):
+                if not p.is_alive() or time.monotonic() > deadline:
+                    self.close()
+                    raise RuntimeError(f"{p.name} không load được OCR model")
+        self.running = True
+        self.thread = threading.Thread(target=self.result_loop, name="ocr-results", daemon=True)
+        self.thread.start()
+        return self
+
+    def submit(self, keys, crops, callback):
+        # Chặn khi mọi worker đã đủ batch chờ: phía gọi gom được batch lớn hơn trong lúc đó
+        self.slots.acquire()
+        with self.lock:
+            batch_id = self.next_id
+            self.next_id += 1
+            self.pending[batch_id] = (list(keys), callback, time.perf_counter())
+        self.metrics.record_size(SIZE_OCR_BATCH, len(crops))
+        self.jobs.put((batch_id, list(crops)))
+
+    def result_loop(self):
+        while self.running or self.pending:
+            try:
+                batch_id, texts, elapsed = self.results.get(timeout=POLL_TIMEOUT)
+            except queue.Empty:
+                if self.pending and not any(p.is_alive() for p in self.processes):
+                    self.fail_pending()
+                continue
+            with self.lock:
+                entry = self.pending.get(batch_id)
+            if entry is None:
+                # Batch đã bị fail_pending trả None (và trả slot): bỏ kết quả tới muộn
+                continue
+            keys, callback, t_submit = entry
+            self.metrics.record(STAGE_OCR, elapsed)
+            self.metrics.record(STAGE_OCR_ROUNDTRIP, time.perf_counter() - t_submit)
+            self.batches += 1
+            self.crops += len(keys)
+            for key, text in zip(keys, texts):
+                callback(key, text)
+            # Bỏ khỏi pending sau khi callback chạy xong: drain() chờ cả phần xử lý kết quả
+            with self.lock:
+                done = self.pending.pop(batch_id, None) is not None
+                self.lock.notify_all()
+            if done:
+                self.slots.release()
+
+    def fail_pending(self):
+        # Mọi worker đã chết: trả None cho các crop đang chờ để pipeline không bị treo
+        print("OCR worker đã dừng, bỏ", len(self.pending), "batch đang chờ")
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        for keys, callback, _ in pending.values():
+            self.failed += len(keys)
+            self.slots.release()
+            for key in keys:
+                callback(key, None)
+        with self.lock:
+            self.lock.notify_all()
+
+    def drain(self):
+        # Chờ mọi batch đã gửi có kết quả (callback đã chạy xong)
+        with self.lock:
+            while self.pending:
+                self.lock.wait(POLL_TIMEOUT)
+
+    def stats(self):
+        return {"ocr_batches": self.batches, "ocr_crops": self.crops,
+                "mean_ocr_batch": round(self.crops / max(self.batches, 1), 2), "ocr_failed": self.failed}
+
+    def close(self):
+        self.drain()
+        for _ in self.processes:
+            self.jobs.put(None)
+        for p in self.processes:
+            p.join(timeout=5)
+            if p.is_alive():
+                p.terminate()
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
@@ -0,0 +1,193 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+from recognition.plate_recog import normalize_plate
+
+# ---------------------------
+# Config
+# ---------------------------
+# Số ký tự sai tối đa (sau khi gộp ký tự dễ nhầm) vẫn coi là cùng biển số. Mặc định 0: biển số chưa đăng ký
+# khác 1 số với xe đã đăng ký không bị gán nhầm chủ; > 0 thì kết quả ghi kèm distance để hiển thị
+MAX_DISTANCE = 0
+REFRESH_INTERVAL = 5.0    # giây giữa 2 lần kiểm tra file DB Xe-Nguoi-DonVi có thay đổi
+CACHE_SIZE = 4096         # số kết quả tra gần đây giữ lại (vote OCR gửi cùng 1 biển số nhiều lần)
+
+# Ký tự OCR hay đọc nhầm -> gộp về 1 dạng trước khi so (0/O, 8/B, ...)
+CONFUSABLE = str.maketrans({"O": "0", "Q": "0", "D": "0", "B": "8", "I": "1", "L": "1", "S": "5",
+                            "Z": "2", "G": "6"})
+
+OWNER_QUERY = """
+    SELECT Xe.bien_so, Nguoi.ten, DonVi.ten, Nguoi.anh_mat
+    FROM Xe
+             JOIN Nguoi ON Xe.nguoi_id = Nguoi.id
+             LEFT JOIN DonVi ON Nguoi.don_vi_id = DonVi.id
+"""
+
+# plate: biển số trong DB; distance: số ký tự khác với biển số đọc được (sau khi gộp ký tự dễ nhầm)
+Owner = namedtuple("Owner", "plate name unit face_path distance")
+
+
+def owner_text(owner):
+    # "Tên (Đơn vị)", khớp gần đúng thì ghi thêm "~distance: biển số trong DB"
+    if owner is None:
+        return None
+    text = f"{owner.name} ({owner.unit})" if owner.unit else owner.name
+    return f"{text} [~{owner.distance}: {owner.plate}]" if owner.distance else text
+
+
+def plate_key(text):
+    return normalize_plate(text).translate(CONFUSABLE)
+
+
+def edit_distance(a, b):
+    if len(a) < len(b):
+        a, b = b, a
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        prev = cur
+    return prev[-1]
+
+
+class BKTree:
+    """
+    Tìm các key cách key cần tra <= max_distance (Levenshtein) mà không phải so với mọi key
+    """
+
+    def __init__(self):
+        self.root = None  # [key, {distance: node}]
+
+    def add(self, key):
+        if self.root is None:
+            self.root = [key, {}]
+            return
+        node = self.root
+        while True:
+            d = edit_distance(key, node[0])
+            if d == 0:
+                return
+            child = node[1].get(d)
+            if child is None:
+                node[1][d] = [key, {}]
+                return
+            node = child
+
+    def search(self, key, max_distance):
+        # [(distance, key)] tăng dần theo distance
+        found = []
+        stack = [self.root] if self.root else []
+        while stack:
+            node = stack.pop()
+            d = edit_distance(key, node[0])
+            if d <= max_distance:
+                found.append((d, node[0]))
+            stack.extend(child for dist, child in node[1].items() if d - max_distance <= dist <= d + max_distance)
+        return sorted(found)
+
+
+class OwnerIndex:
+    """
+    Bảng Xe / Nguoi / DonVi nạp vào bộ nhớ, tra chủ xe theo biển số OCR (chịu được lỗi OCR kiểu 0/O, 8/B
+    và sai tối đa max_distance ký tự). Gọi được từ nhiều thread; tự nạp lại khi file DB thay đổi.
+    """
+
+    def __init__(self, db_path, max_distance=MAX_DISTANCE, refresh_interval=REFRESH_INTERVAL):
+        self.db_path = db_path
+        self.max_distance = max_distance
+        self.refresh_interval = refresh_interval
+        self.lock = threading.Lock()
+        # (owners: plate_key -> [Owner], BKTree các plate_key, cache: biển số đã normalize -> Owner / None)
+        self.index = ({}, BKTree(), {})
+        self.signature = None
+        self.checked_at = 0.0
+        self.loads = 0
+        self.load()
+
+    def file_signature(self):
+        # mtime / size của file DB và file WAL (nếu có)
+        sig = []
+        for path in (self.db_path, self.db_path + "-wal"):
+            try:
+                st = os.stat(path)
+                sig.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                sig.append(None)
+        return tuple(sig)
+
+    def load(self):
+        signature = self.file_signature()
+        conn = sqlite3.connect(self.db_path)
+        try:
+            rows = conn.execute(OWNER_QUERY).fetchall()
+        finally:
+            conn.close()
+
+        owners, tree = {}, BKTree()
+        for plate, name, unit, face_path in rows:
+            key = plate_key(plate)
+            if not key: continue
+            owners.setdefault(key, []).append(Owner(normalize_plate(plate), name, unit, face_path, 0))
+            if self.max_distance:
+                tree.add(key)
+        # Đổi cả bảng 1 lần: thread đang tra vẫn dùng bảng cũ trọn vẹn
+        self.index = (owners, tree, {})
+        self.signature = signature
+        self.loads += 1
+        return len(rows)
+
+    def refresh_if_changed(self):
+        now = time.monotonic()
+        if now - self.checked_at < self.refresh_interval:
+            return False
+        with self.lock:
+            if now - self.checked_at < self.refresh_interval:
+                return False
+            self.checked_at = now
+            if self.file_signature() == self.signature:
+                return False
+            try:
+                self.load()
+            except sqlite3.Error as e:
+                print("Không nạp lại được DB chủ xe:", e)
+                return False
+        return True
+
+    def lookup(self, plate_text):
+        """
+        Trả về Owner gần nhất, hoặc None nếu không có / có nhiều xe khác nhau cùng độ gần
+        """
+        self.refresh_if_changed()
+        text = normalize_plate(plate_text)
+        owners, tree, cache = self.index
+        if text in cache:
+            return cache[text]
+        owner = self.find(text, owners, tree)
+        if len(cache) >= CACHE_SIZE:
+            cache.clear()
+        cache[text] = owner
+        return owner
+
+    def find(self, text, owners, tree):
+        key = text.translate(CONFUSABLE)
+        if not key:
+            return None
+        exact = owners.get(key)
+        if exact:
+            # Trùng sau khi gộp ký tự dễ nhầm: ưu tiên xe trùng đúng từng ký tự
+            same = [o for o in exact if o.plate == text] or exact
+            return same[0] if len(set(o.plate for o in same)) == 1 else None
+        found = tree.search(key, self.max_distance) if self.max_distance else []
+        if not found:
+            return None
+        best = [k for d, k in found if d == found[0][0]]
+        if len(best) > 1:
+            return None
+        return owners[best[0]][0]._replace(distance=found[0][0])
+
+    def __len__(self):
+        return sum(len(v) for v in self.index[0].values())
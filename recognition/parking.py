@@ -0,0 +1,239 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from recognition.plate_recog import normalize_plate
+from recognition.owner_index import plate_key
+
+# ---------------------------
+# Config
+# ---------------------------
+OVERSTAY_S = 12 * 3600    # xe ở trong bãi quá bấy nhiêu giây -> cảnh báo quá hạn
+REPEAT_S = 30             # cùng biển số, cùng cổng trong bấy nhiêu giây: vẫn là lần qua cổng trước (track bị tách)
+TS_FORMAT = "%Y%m%d_%H%M%S"   # định dạng timestamp của event on_plate / plate_logs
+
+# Hướng của cổng: "in" chỉ vào, "out" chỉ ra, "both" (mặc định) xe chưa ở trong bãi -> vào, đang ở trong -> ra
+GATE_IN, GATE_OUT, GATE_BOTH = "in", "out", "both"
+GATE_DIRECTIONS = (GATE_IN, GATE_OUT, GATE_BOTH)
+
+STATUS_OPEN = "open"                # đang ở trong bãi
+STATUS_CLOSED = "closed"            # đã ra, có dwell_s
+STATUS_MISSED_EXIT = "missed_exit"  # vào lại mà không thấy lúc ra: đóng phiên cũ, không có dwell_s
+STATUS_NO_ENTRY = "no_entry"        # ra mà không thấy lúc vào
+
+RESTORE_SQL = """SELECT id, plate, entry_gate, entry_ts, owner FROM parking_sessions
+                 WHERE status = ? ORDER BY entry_ts"""
+
+
+def parse_ts(ts, default=None):
+    if isinstance(ts, (int, float)):
+        return float(ts)
+    try:
+        return datetime.strptime(ts, TS_FORMAT).timestamp()
+    except (TypeError, ValueError):
+        return default
+
+
+def format_ts(t):
+    return datetime.fromtimestamp(t).strftime(TS_FORMAT) if t is not None else None
+
+
+class ParkingSessions:
+    """
+    Ghép event biển số theo cổng thành phiên gửi xe (vào -> ra), theo biển số đã chuẩn hóa
+    (gộp ký tự OCR dễ nhầm như OwnerIndex để lúc vào và lúc ra khớp nhau).
+    Mỗi event O(1): inside (biển số -> phiên đang mở), deadlines (OrderedDict theo thứ tự vào = thứ tự
+    hết hạn vì overstay_s cố định, chỉ cần xét từ đầu). Phiên ghi qua LogWriter vào bảng parking_sessions:
+    INSERT lúc vào, UPDATE theo id lúc ra. Khởi động lại thì load() nạp các phiên đang mở, không quét log.
+    Dùng trực tiếp làm on_gate của pipeline (mọi track đã chốt biển số, không qua PlateDedupe của
+    plate_logs; gọi được từ nhiều thread). Cùng biển số lặp lại ở cùng cổng trong repeat_s thì bỏ qua.
+    """
+
+    def __init__(self, gates=None, overstay_s=OVERSTAY_S, log_writer=None, on_alert=None, clock=time.time,
+                 repeat_s=REPEAT_S):
+        """
+        gates: dict tên cổng -> "in" / "out" / "both" (cổng không có trong dict: "both").
+        on_alert(session): gọi (trên thread của event / check) khi 1 xe vừa quá hạn
+        """
+        self.gates = dict(gates or {})
+        self.overstay_s = overstay_s
+        self.repeat_s = repeat_s
+        self.log_writer = log_writer
+        self.on_alert = on_alert
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.inside = {}               # key -> session đang mở
+        self.deadlines = OrderedDict()  # key -> session chưa quá hạn, theo thứ tự vào
+        self.overstayed = {}           # key -> session đã quá hạn, vẫn trong bãi
+        self.last_seen = OrderedDict()  # key -> (thời điểm, cổng) của event gần nhất trong repeat_s, cũ nhất ở đầu
+        self.repeats = 0
+        self.next_id = 1
+        self.entries = 0
+        self.exits = 0             # chỉ lần ra khớp với 1 phiên vào (có dwell_s), entries - exits ~ occupancy
+        self.missed_exits = 0      # phiên bị đóng vì xe vào lại mà không thấy lúc ra
+        self.unmatched_exits = 0   # lần ra không thấy lúc vào: đếm riêng, không tính vào exits
+        self.peak = 0
+        self.dwell_count = 0
+        self.dwell_total = 0.0
+        self.dwell_max = 0.0
+
+    # ---------------- API ----------------
+    def load(self, db_path):
+        """
+        Nạp các phiên đang mở từ parking_sessions (bảng do LogWriter tạo)
+        """
+        conn = sqlite3.connect(db_path)
+        try:
+            rows = conn.execute(RESTORE_SQL, (STATUS_OPEN,)).fetchall()
+            max_id = conn.execute("SELECT MAX(id) FROM parking_sessions").fetchone()[0]
+        except sqlite3.OperationalError:
+            rows, max_id = [], None
+        finally:
+            conn.close()
+        with self.lock:
+            self.next_id = max(self.next_id, (max_id or 0) + 1)
+            for session_id, plate, gate, entry_ts, owner in rows:
+                key = plate_key(plate)
+                entry = parse_ts(entry_ts)
+                if not key or entry is None: continue
+                self.add_inside(key, {"id": session_id, "plate": plate, "gate": gate, "entry": entry,
+                                      "owner": owner})
+            self.peak = max(self.peak, len(self.inside))
+            self.check_overstay(self.clock())
+        return len(rows)
+
+    def __call__(self, event):
+        return self.record(event.get("plate"), event.get("gate", ""), event.get("timestamp"), event.get("owner"))
+
+    def record(self, plate, gate="", ts=None, owner=None):
+        """
+        Trả về "entry", "exit" hoặc None (biển số rỗng / lặp lại trong repeat_s)
+        """
+        key = plate_key(plate or "")
+        if not key:
+            return None
+        plate = normalize_plate(plate)
+        t = parse_ts(ts, default=self.clock()) if ts is not None else self.clock()
+        direction = self.gates.get(gate, GATE_BOTH)
+        with self.lock:
+            # Event tới gần đúng thứ tự thời gian: dùng thời điểm event để xét quá hạn
+            self.check_overstay(t)
+            if self.is_repeat(key, gate, t):
+                self.repeats += 1
+                return None
+            current = self.inside.get(key)
+            if direction == GATE_IN or (direction == GATE_BOTH and current is None):
+                if current is not None:
+                    self.missed_exits += 1
+                    self.close(key, current, None, None, STATUS_MISSED_EXIT)
+                self.open(key, plate, gate, t, owner)
+                return "entry"
+            if current is None:
+                self.unmatched_exits += 1
+                self.write_open((self.take_id(), plate, None, None, gate, format_ts(t), None,
+                                 STATUS_NO_ENTRY, owner))
+                return "exit"
+            self.close(key, current, gate, t, STATUS_CLOSED)
+            return "exit"
+
+    def check(self, now=None):
+        # Gọi định kỳ (GUI / vòng status) để cảnh báo cả khi không có event mới
+        with self.lock:
+            return self.check_overstay(self.clock() if now is None else now)
+
+    def occupancy(self):
+        with self.lock:
+            return len(self.inside)
+
+    def dwell(self, plate, now=None):
+        # Số giây xe đang ở trong bãi, None nếu không ở trong bãi
+        key = plate_key(plate or "")
+        with self.lock:
+            session = self.inside.get(key)
+            if session is None:
+                return None
+            return (self.clock() if now is None else now) - session["entry"]
+
+    def stats(self):
+        with self.lock:
+            return {
+                "occupancy": len(self.inside),
+                "peak_occupancy": self.peak,
+                "overstayed": len(self.overstayed),
+                "entries": self.entries,
+                "exits": self.exits,
+                "missed_exits": self.missed_exits,
+                "unmatched_exits": self.unmatched_exits,
+                "repeats": self.repeats,
+                "mean_dwell_s": round(self.dwell_total / self.dwell_count, 1) if self.dwell_count else None,
+                "max_dwell_s": round(self.dwell_max, 1) if self.dwell_count else None,
+            }
+
+    # ---------------- Helpers (giữ lock) ----------------
+    def is_repeat(self, key, gate, t):
+        # Các key theo thứ tự thời gian event -> chỉ cần bỏ từ đầu
+        while self.last_seen:
+            seen_at, _ = next(iter(self.last_seen.values()))
+            if t - seen_at < self.repeat_s:
+                break
+            self.last_seen.popitem(last=False)
+        last = self.last_seen.get(key)
+        self.last_seen[key] = (t, gate)
+        self.last_seen.move_to_end(key)
+        return last is not None and last[1] == gate
+
+    def take_id(self):
+        session_id = self.next_id
+        self.next_id += 1
+        return session_id
+
+    def add_inside(self, key, session):
+        self.inside[key] = session
+        self.deadlines[key] = session
+        self.deadlines.move_to_end(key)
+
+    def open(self, key, plate, gate, t, owner):
+        session = {"id": self.take_id(), "plate": plate, "gate": gate, "entry": t, "owner": owner}
+        self.add_inside(key, session)
+        self.entries += 1
+        self.peak = max(self.peak, len(self.inside))
+        self.write_open((session["id"], plate, gate, format_ts(t), None, None, None, STATUS_OPEN, owner))
+
+    def close(self, key, session, gate, t, status):
+        del self.inside[key]
+        self.deadlines.pop(key, None)
+        self.overstayed.pop(key, None)
+        dwell = None
+        if t is not None:
+            self.exits += 1
+            dwell = max(0.0, t - session["entry"])
+            self.dwell_count += 1
+            self.dwell_total += dwell
+            self.dwell_max = max(self.dwell_max, dwell)
+        if self.log_writer:
+            self.log_writer.log_session_close((gate, format_ts(t), None if dwell is None else int(dwell), status,
+                                               session["id"]))
+
+    def write_open(self, row):
+        if self.log_writer:
+            self.log_writer.log_session_open(row)
+
+    def check_overstay(self, now):
+        # Phiên vào sớm nhất hết hạn trước: dừng ở phiên đầu tiên chưa hết hạn
+        alerts = []
+        while self.deadlines:
+            key, session = next(iter(self.deadlines.items()))
+            if now - session["entry"] < self.overstay_s:
+                break
+            self.deadlines.popitem(last=False)
+            self.overstayed[key] = session
+            alerts.append(session)
+        for session in alerts:
+            if self.on_alert:
+                self.on_alert(session)
+            else:
+                print(f"Xe quá hạn: {session['plate']} vào lúc {format_ts(session['entry'])} "
+                      f"({(now - session['entry']) / 3600:.1f} giờ)")
+        return alerts
@@ -0,0 +1,559 @@
+import cv2
+import numpy as np
+import threading
+import time
+import unicodedata
+from datetime import datetime
+
+from recognition.plate_recog import (
+    detect_vehicles, track_cars, detect_plates, detect_plates_in_tracks, match_plates,
+    detect_combined, detect_shared, detect_plates_haar, load_haar_cascade
+)
+from recognition.ocr_cache import PlateVoteCache
+from recognition.crop_quality import plate_quality, BestCropSelector
+from recognition.queues import StageQueue, STOP, DROP_OLDEST, DROP_NEWEST
+from recognition.db_writer import LogWriter
+from recognition.plate_dedupe import PlateDedupe
+from recognition.metrics import (
+    NULL_METRICS, STAGE_DECODE, STAGE_MOTION, STAGE_VEHICLE, STAGE_TRACK, STAGE_PLATE, STAGE_FRAME
+)
+from recognition.load_shedding import QUALITY_LEVELS, scaled_imgsz
+from recognition.image_writer import EvidenceWriter, KIND_FIRST, KIND_BEST, KIND_EXIT
+from recognition.ocr_pool import InlineOcr, OCR_BATCH_SIZE
+from recognition.owner_index import owner_text
+
+# ---------------------------
+# Config
+# ---------------------------
+# Plate detection mode
+PLATE_MODE_FULL = "full"        # plate_model trên toàn frame
+PLATE_MODE_CASCADE = "cascade"  # plate_model chỉ trên crop của xe đã tracked
+PLATE_MODE_SHARED = "shared"    # như full, 2 model dùng chung 1 tensor đã preprocess
+PLATE_MODE_COMBINED = "combined"  # 1 model gộp ra cả xe và biển số (vehicle_model), 1 lần forward
+PLATE_MODES = (PLATE_MODE_CASCADE, PLATE_MODE_FULL, PLATE_MODE_SHARED, PLATE_MODE_COMBINED)
+
+EXIT_CROP_REFRESH = 10  # cứ bấy nhiêu frame cập nhật crop "exit" của mỗi xe
+
+
+# ---------------------------
+# Drawing
+# ---------------------------
+HIGHLIGHT_COLOR = (0, 0, 255)   # tô xe chưa thấy biển số
+HIGHLIGHT_ALPHA = 0.3
+
+
+def tint_box(frame, box, color=HIGHLIGHT_COLOR, alpha=HIGHLIGHT_ALPHA):
+    # Blend tại chỗ chỉ trong vùng box, không copy / blend cả frame. Gồm cả cạnh x2, y2 như cv2.rectangle
+    h, w = frame.shape[:2]
+    x1, y1, x2, y2 = max(0, box[0]), max(0, box[1]), min(w, box[2] + 1), min(h, box[3] + 1)
+    if x2 <= x1 or y2 <= y1:
+        return
+    roi = frame[y1:y2, x1:x2]
+    fill = np.empty_like(roi)
+    fill[:] = color
+    cv2.addWeighted(roi, 1 - alpha, fill, alpha, 0, dst=roi)
+
+
+def overlay_label(entry):
+    # "biển số | chủ xe (đơn vị)" (+ độ lệch nếu khớp gần đúng); font Hershey của OpenCV chỉ có ASCII
+    # nên bỏ dấu tiếng Việt
+    owner = entry.get("owner")
+    if not entry["plate_text"] or owner is None:
+        return entry["plate_text"]
+    label = f"{entry['plate_text']} | {owner_text(owner)}"
+    label = label.replace("đ", "d").replace("Đ", "D")
+    return unicodedata.normalize("NFKD", label).encode("ascii", "ignore").decode()
+
+
+def draw_detections(frame, tracked_cars, plate_bboxes, matches, plate_texts):
+    matched_car_ids = set([c for c, _ in matches])
+
+    # ---- Highlight cars without plates (xe đã chốt biển số nhưng không tìm lại biển số thì không tô) ----
+    for car_id, x1, y1, x2, y2 in tracked_cars:
+        if car_id not in matched_car_ids and not plate_texts.get(car_id):
+            tint_box(frame, (x1, y1, x2, y2))
+
+    # ---- Draw boxes and IDs ----
+    for car_id, x1, y1, x2, y2 in tracked_cars:
+        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        cv2.putText(frame, f"ID:{car_id}", (x1, max(12, y1 - 6)), cv2.FONT_HERSHEY_SIMPLEX, 0.6,
+                    (0, 255, 0), 2)
+    for px1, py1, px2, py2 in plate_bboxes:
+        cv2.rectangle(frame, (px1, py1), (px2, py2), (255, 0, 0), 2)
+        cv2.putText(frame, "Plate", (px1, max(12, py1 - 6)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 2)
+
+    for car_id, (px1, py1, px2, py2) in matches:
+        plate_text = plate_texts.get(car_id)
+        if plate_text:
+            cv2.putText(frame, str(plate_text), (px1, max(12, py1 - 20)), cv2.FONT_HERSHEY_SIMPLEX, 0.8,
+                        (0, 255, 255), 2)
+    # Xe đã chốt biển số, frame này không có box biển số (skip_read): ghi trên box xe
+    for car_id, x1, y1, x2, y2 in tracked_cars:
+        plate_text = plate_texts.get(car_id)
+        if plate_text and car_id not in matched_car_ids:
+            cv2.putText(frame, str(plate_text), (x1, max(12, y1 - 26)), cv2.FONT_HERSHEY_SIMPLEX, 0.8,
+                        (0, 255, 255), 2)
+
+
+# ---------------------------
+# Pipeline: capture -> detect+track -> OCR -> persist, display
+# ---------------------------
+class RecognitionPipeline:
+    """
+    Mỗi stage chạy trên 1 thread riêng, nối với nhau bằng StageQueue có giới hạn:
+      capture  --frame_queue (DROP_OLDEST)-->  detect+track
+      detect   --ocr_queue (DROP_NEWEST)-->    OCR
+      OCR      --LogWriter (BLOCK, batch)-->   plates.db
+      detect/OCR --EvidenceWriter (DROP_NEWEST)--> saved_cars / saved_plates
+      detect   --display_queue (DROP_OLDEST)-> GUI (lấy trên Tk main loop; frame RGB đã thu nhỏ,
+                                                tối đa display_fps frame / giây)
+    """
+
+    def __init__(self, cap, vehicle_model, plate_model, ocr, tracker,
+                 db_path="plates.db", saved_cars="saved_cars", saved_plates="saved_plates",
+                 on_entries=None, capture_policy=DROP_OLDEST, frame_queue_size=1,
+                 ocr_queue_size=32, ocr_policy=DROP_NEWEST,
+                 plate_mode=PLATE_MODE_FULL, vehicle_imgsz=None, plate_imgsz=None, plate_cache=None,
+                 crop_selector=None, image_writer=None, jpeg_quality=None, log_writer=None,
+                 plate_dedupe=None, gate="", annotate=True, on_plate=None, metrics=None, motion_gate=None,
+                 load_shedder=None, ocr_pool=None, ocr_batch_size=OCR_BATCH_SIZE, display_size=None,
+                 display_fps=None, owner_index=None, on_gate=None):
+        self.cap = cap
+        self.vehicle_model = vehicle_model
+        self.plate_model = plate_model
+        self.ocr = ocr
+        self.tracker = tracker
+        self.db_path = db_path
+        self.saved_cars = saved_cars
+        self.saved_plates = saved_plates
+        self.on_entries = on_entries
+        self.on_plate = on_plate    # callback(event dict) mỗi khi 1 biển số được ghi log
+        # callback(event dict) mỗi khi 1 track chốt biển số, không qua PlateDedupe (vd. ParkingSessions:
+        # xe vào rồi ra cùng 1 cổng trong cửa sổ dedupe vẫn phải thấy lúc ra)
+        self.on_gate = on_gate
+        self.annotate = annotate    # headless: không vẽ, không đẩy frame ra display
+        # Chỉ vẽ + thu nhỏ về display_size (w, h) khi tới lượt hiển thị: chi phí hiển thị không phụ thuộc
+        # tốc độ detect
+        self.display_size = display_size
+        self.display_interval = 1.0 / display_fps if display_fps else 0.0
+        self.next_display = 0.0
+        self.plate_mode = plate_mode
+        self.vehicle_imgsz = vehicle_imgsz
+        self.plate_imgsz = plate_imgsz
+        self.plate_cache = plate_cache if plate_cache is not None else PlateVoteCache()
+        self.crop_selector = crop_selector if crop_selector is not None else BestCropSelector()
+        self.image_writer = image_writer
+        self.jpeg_quality = jpeg_quality
+        self.exit_crops = {}  # car_id -> (frame_id, crop) mới nhất, ghi ra khi track kết thúc
+        # LogWriter do GUI truyền vào thì GUI đóng; tự tạo thì pipeline đóng khi kết thúc.
+        # db_path=None và không truyền log_writer -> không ghi SQLite
+        self.log_writer = log_writer
+        self.own_log_writer = log_writer is None and db_path is not None
+        # Không ghi lại cùng biển số ở cùng cổng trong cửa sổ thời gian của PlateDedupe
+        self.plate_dedupe = plate_dedupe if plate_dedupe is not None else PlateDedupe()
+        self.gate = gate
+        # StageMetrics để đo độ trễ từng stage (benchmark), mặc định không đo
+        self.metrics = metrics if metrics is not None else NULL_METRICS
+        # MotionGate: bỏ qua detector / tracker khi cảnh tĩnh (None = xử lý mọi frame)
+        self.motion_gate = motion_gate
+        self.has_tracks = False
+        self.last_overlay = None
+        # LoadShedder: giảm chất lượng khi quá tải (None = luôn chất lượng đầy đủ)
+        self.load_shedder = load_shedder
+        self.base_ocr_window = self.crop_selector.window
+        self.haar = None
+        # OcrPool: OCR trên worker process (có thể dùng chung cho nhiều pipeline); None = OCR trên thread OCR
+        self.ocr_runner = ocr_pool if ocr_pool is not None else InlineOcr(ocr, self.metrics)
+        self.ocr_batch_size = ocr_batch_size
+        # RingCapture (frame nằm trong shared memory): trả slot khi xử lý xong / frame bị drop
+        self.recycles = hasattr(cap, "recycle")
+        # OwnerIndex: tra chủ xe / đơn vị cho mỗi biển số OCR được (None = không tra)
+        self.owner_index = owner_index
+
+        self.frame_queue = StageQueue(frame_queue_size, capture_policy,
+                                      on_drop=(lambda item: self.cap.recycle(item[1])) if self.recycles else None)
+        self.ocr_queue = StageQueue(ocr_queue_size, ocr_policy)
+        self.display_queue = StageQueue(1, DROP_OLDEST)
+
+        # Kết quả OCR mới nhất theo car_id, do stage OCR cập nhật; bị xóa khi tracker bỏ track
+        self.track_info = {}
+        self.track_lock = threading.Lock()
+
+        self.running = False
+        self.paused = False
+        self.threads = []
+        self.frames_read = 0
+        self.frames_processed = 0
+        self.frames_skipped = 0
+
+    # ---------------- Control ----------------
+    def start(self):
+        self.open_writers()
+        self.running = True
+        stages = (("capture", self.capture_loop), ("detect", self.detect_loop), ("ocr", self.ocr_loop))
+        self.threads = [threading.Thread(target=target, name=f"pipeline-{name}", daemon=True)
+                        for name, target in stages]
+        for t in self.threads:
+            t.start()
+
+    def open_writers(self):
+        if self.image_writer is None:
+            kwargs = {"jpeg_quality": self.jpeg_quality} if self.jpeg_quality else {}
+            self.image_writer = EvidenceWriter(self.saved_cars, self.saved_plates, metrics=self.metrics, **kwargs)
+        if self.own_log_writer:
+            self.log_writer = LogWriter(self.db_path, metrics=self.metrics)
+
+    def stop(self):
+        # Capture dừng đọc, các stage sau xử lý nốt queue rồi thoát theo STOP
+        self.running = False
+
+    def join(self, timeout=None):
+        for t in self.threads:
+            t.join(timeout)
+
+    def is_alive(self):
+        return any(t.is_alive() for t in self.threads)
+
+    def stats(self):
+        return {
+            "frames_read": self.frames_read, "frames_processed": self.frames_processed,
+            "frames_skipped": self.frames_skipped,
+            "frame_queue": self.frame_queue.qsize(), "frame_dropped": self.frame_queue.dropped,
+            "ocr_queue": self.ocr_queue.qsize(), "ocr_dropped": self.ocr_queue.dropped,
+            "db_queue": self.log_writer.queue.qsize() if self.log_writer else 0,
+            "db_rows": self.log_writer.rows_written if self.log_writer else 0,
+            "plates_suppressed": self.plate_dedupe.suppressed,
+            "display_dropped": self.display_queue.dropped,
+            "ocr_calls": self.plate_cache.ocr_calls, "ocr_skipped": self.plate_cache.ocr_skipped,
+            **self.ocr_runner.stats(),
+            "images_written": self.image_writer.written if self.image_writer else 0,
+            "images_dropped": self.image_writer.queue.dropped if self.image_writer else 0,
+            "quality_level": self.load_shedder.level.name if self.load_shedder else None,
+            "quality_changes": len(self.load_shedder.history) if self.load_shedder else 0,
+            **(self.cap.stats() if self.recycles else {}),
+        }
+
+    # ---------------- Stages ----------------
+    def capture_loop(self):
+        frame_id = 0
+        try:
+            while self.running:
+                if self.paused:
+                    # Chỉ sleep một chút, giữ frame hiện tại
+                    time.sleep(0.05)
+                    continue
+                t_read = time.perf_counter()
+                ret, frame = self.cap.read()
+                if not ret: break
+                self.metrics.record(STAGE_DECODE, time.perf_counter() - t_read)
+                frame_id += 1
+                self.frames_read = frame_id
+                self.frame_queue.put((frame_id, frame, t_read))
+        finally:
+            try:
+                self.cap.release()
+            except:
+                pass
+            self.running = False
+            self.frame_queue.put_stop()
+
+    def detect_loop(self):
+        try:
+            while True:
+                item = self.frame_queue.get()
+                if item is None: continue
+                if item is STOP: break
+                frame_id, frame, t_read = item
+                if not self.gate_frame(frame): continue
+
+                level = self.quality()
+                detections, plate_bboxes = self.detect(frame, level)
+                tracked_cars, live_ids = self.track(frame, detections)
+                with self.metrics.timed(STAGE_PLATE):
+                    matches, plate_bboxes = self.find_plates(frame, tracked_cars, plate_bboxes, level)
+                self.finish_frame(frame_id, frame, t_read, tracked_cars, live_ids, plate_bboxes, matches)
+        finally:
+            self.running = False
+            self.flush_crops()
+            self.ocr_queue.put_stop()
+
+    def ocr_loop(self):
+        # Các crop đang chờ gom thành 1 batch / 1 lần gọi recognizer; kết quả về handle_ocr theo job
+        try:
+            stopped = False
+            while not stopped:
+                jobs, stopped = self.ocr_queue.get_batch(self.ocr_batch_size)
+                if jobs:
+                    self.ocr_runner.submit(jobs, [job["plate_crop"] for job in jobs], self.handle_ocr)
+            self.ocr_runner.drain()
+        finally:
+            self.finish_ocr()
+
+    # ---------------- Từng bước xử lý 1 frame (MultiCameraPipeline gọi lại các bước này) ----------------
+    def gate_frame(self, frame):
+        """
+        MotionGate: False nếu bỏ qua frame này (vẫn hiển thị với box của lần xử lý gần nhất)
+        """
+        if self.motion_gate is None:
+            return True
+        with self.metrics.timed(STAGE_MOTION):
+            process = self.motion_gate.should_process(frame, self.has_tracks)
+        if not process:
+            if self.annotate and self.display_due():
+                if self.last_overlay and self.has_tracks:
+                    draw_detections(frame, *self.last_overlay)
+                self.display_queue.put(self.display_frame(frame))
+            self.recycle(frame)
+            self.frames_skipped += 1
+            self.frames_processed += 1
+        return process
+
+    def quality(self):
+        # Mức chất lượng hiện tại của LoadShedder (không có -> luôn "full")
+        return self.load_shedder.level if self.load_shedder else QUALITY_LEVELS[0]
+
+    def frame_plate_mode(self, level):
+        # Haar chỉ thay plate_model riêng; model gộp thì vẫn có biển số trong cùng lần forward
+        if level.haar and self.plate_mode != PLATE_MODE_COMBINED:
+            return PLATE_MODE_CASCADE
+        return self.plate_mode
+
+    def detect(self, frame, level):
+        """
+        Trả về (detections, plate_bboxes). combined / shared: biển số toàn frame có luôn trong lần chạy
+        vehicle (tính vào vehicle_yolo), còn lại plate_bboxes = None
+        """
+        plate_mode = self.frame_plate_mode(level)
+        vehicle_imgsz = scaled_imgsz(self.vehicle_imgsz, level.imgsz_scale)
+        with self.metrics.timed(STAGE_VEHICLE):
+            if plate_mode == PLATE_MODE_COMBINED:
+                return detect_combined(self.vehicle_model, frame, imgsz=vehicle_imgsz)
+            if plate_mode == PLATE_MODE_SHARED:
+                return detect_shared(self.vehicle_model, self.plate_model, frame, imgsz=vehicle_imgsz)
+            return detect_vehicles(self.vehicle_model, frame, imgsz=vehicle_imgsz), None
+
+    def track(self, frame, detections):
+        with self.metrics.timed(STAGE_TRACK):
+            return track_cars(self.tracker, detections, frame)
+
+    def plate_cars(self, tracked_cars, level):
+        # Cascade: xe cần tìm biển số. Khi giảm tải bỏ qua track đã chốt biển số
+        if level.skip_read:
+            # get() không đếm ocr_skipped: xe ở đây chưa tới bước OCR
+            return [c for c in tracked_cars if not self.plate_cache.get(c[0])[1]]
+        return tracked_cars
+
+    def find_plates(self, frame, tracked_cars, plate_bboxes, level):
+        """
+        Trả về (matches [(car_id, plate_box)], plate_bboxes)
+        """
+        if self.frame_plate_mode(level) == PLATE_MODE_CASCADE:
+            cars = self.plate_cars(tracked_cars, level)
+            if level.haar and self.haar_cascade():
+                matches = detect_plates_haar(self.haar, frame, cars)
+            else:
+                matches = detect_plates_in_tracks(self.plate_model, frame, cars,
+                                                  imgsz=scaled_imgsz(self.plate_imgsz, level.imgsz_scale))
+            return matches, [pb for _, pb in matches]
+        if plate_bboxes is None:
+            plate_bboxes = detect_plates(self.plate_model, frame,
+                                         imgsz=scaled_imgsz(self.plate_imgsz, level.imgsz_scale))
+        return match_plates(plate_bboxes, tracked_cars), plate_bboxes
+
+    def finish_frame(self, frame_id, frame, t_read, tracked_cars, live_ids, plate_bboxes, matches):
+        """
+        Chọn crop gửi OCR, ảnh bằng chứng, entries cho GUI, annotation, metrics của 1 frame đã detect
+        """
+        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.update_car_images(frame_id, frame, tracked_cars, live_ids)
+        cars_by_id = {c[0]: c for c in tracked_cars}
+        for car_id, (px1, py1, px2, py2) in matches:
+            vb = cars_by_id.get(car_id)
+            if vb is None: continue
+            # Track đã chốt biển số -> không OCR nữa
+            if not self.plate_cache.should_read(car_id): continue
+            if px2 <= px1 or py2 <= py1: continue
+            plate_view = frame[py1:py2, px1:px2]
+            if plate_view.size == 0: continue
+
+            # Chấm điểm crop (mọi lần thấy đều được đếm), chỉ copy khi cần cho buffer / lượt OCR của track
+            score = plate_quality(plate_view, (px1, py1, px2, py2), frame.shape)
+            if not self.crop_selector.wants(car_id, score): continue
+            _, vx1, vy1, vx2, vy2 = vb
+            # Crop trước khi vẽ annotation lên frame
+            best = self.crop_selector.add(car_id, {
+                "car_id": car_id,
+                "car_crop": frame[max(0, vy1):vy2, max(0, vx1):vx2].copy(),
+                "plate_crop": plate_view.copy(),
+                "score": score,
+                "ts": ts,
+            })
+            if best is not None:
+                self.ocr_queue.put(best)
+
+        # Track bị tracker bỏ -> OCR crop tốt nhất còn lại, xóa khỏi cache, ghi log nếu chưa chốt
+        for best in self.crop_selector.expire(live_ids):
+            self.ocr_queue.put(best)
+        self.log_expired(self.plate_cache.expire(live_ids))
+
+        frame_entries = self.collect_entries(tracked_cars, live_ids, matches, ts)
+        plate_texts = {e["car_id"]: overlay_label(e) for e in frame_entries}
+        self.has_tracks = bool(live_ids)
+        if self.annotate:
+            self.last_overlay = (tracked_cars, plate_bboxes, matches, plate_texts)
+            if self.display_due():
+                draw_detections(frame, *self.last_overlay)
+                self.display_queue.put(self.display_frame(frame))
+        self.recycle(frame)
+
+        if self.on_entries:
+            self.on_entries(frame_entries)
+        self.frames_processed += 1
+        latency = time.perf_counter() - t_read
+        self.metrics.record(STAGE_FRAME, latency)
+        if self.load_shedder:
+            self.update_load(latency)
+
+    def flush_crops(self):
+        # Hết stream: gửi OCR crop tốt nhất còn lại của mọi track. Chờ chỗ trống thay vì DROP_NEWEST:
+        # thread OCR vẫn chạy tới khi gặp STOP nên queue sẽ vơi
+        for best in self.crop_selector.expire(set()):
+            self.ocr_queue.put_wait(best)
+
+    def handle_ocr(self, job, raw_text):
+        car_id = job["car_id"]
+        plate_text, final = self.plate_cache.add(car_id, raw_text)
+
+        # Chỉ lưu ảnh cho crop tốt nhất của track (ghi đè file "best" của track)
+        if job.get("save"):
+            self.image_writer.submit(car_id, KIND_BEST, job["car_crop"], job["plate_crop"])
+        car_path, plate_path = self.image_writer.paths(car_id)
+        owner = self.lookup_owner(plate_text)
+
+        with self.track_lock:
+            info = self.track_info.setdefault(car_id, {})
+            if plate_text:
+                info["plate_text"] = plate_text
+                info["owner"] = owner
+
+        # Chỉ ghi 1 lần mỗi track, khi kết quả vote đã chốt
+        if final and self.plate_cache.mark_logged(car_id):
+            self.emit_plate(car_id, plate_text, car_path, plate_path, job["ts"], owner)
+
+    def finish_ocr(self):
+        # Hết stream: ghi nốt các track chưa chốt, chờ ảnh và DB ghi xong
+        self.log_expired(self.plate_cache.expire(set()))
+        self.image_writer.close()
+        if self.own_log_writer:
+            self.log_writer.close()
+        elif self.log_writer:
+            self.log_writer.flush()
+
+    # ---------------- Helpers ----------------
+    def recycle(self, frame):
+        # Crop OCR / ảnh bằng chứng đã copy ra: slot của ring được ghi frame mới
+        if self.recycles:
+            self.cap.recycle(frame)
+
+    def display_due(self):
+        now = time.perf_counter()
+        if now < self.next_display:
+            return False
+        self.next_display = now + self.display_interval
+        return True
+
+    def display_frame(self, frame):
+        # Thu nhỏ + BGR -> RGB trên thread detect, GUI chỉ còn tạo ảnh Tk. Kết quả là ảnh mới
+        # nên không giữ slot của ring frame
+        if self.display_size:
+            frame = cv2.resize(frame, self.display_size, interpolation=cv2.INTER_LINEAR)
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+    def update_load(self, latency):
+        # Queue kích thước 1 (giữ frame mới nhất) luôn "đầy" khi camera nhanh hơn detect: chỉ xét queue lớn hơn
+        fill = max([q.fill() for q in (self.frame_queue, self.ocr_queue) if q.maxsize > 1] or [0.0])
+        level = self.load_shedder.update(latency, fill)
+        if level is not None:
+            self.crop_selector.window = self.base_ocr_window * level.ocr_window_scale
+
+    def haar_cascade(self):
+        # None: chưa load; False: không dùng được -> bậc "haar" vẫn dùng plate_model
+        if self.haar is None:
+            try:
+                self.haar = load_haar_cascade()
+            except (RuntimeError, FileNotFoundError) as e:
+                print("Không dùng được Haar cascade, giữ plate_model:", e)
+                self.haar = False
+        return self.haar
+
+    def update_car_images(self, frame_id, frame, tracked_cars, live_ids):
+        # Ảnh "first" khi thấy xe lần đầu, crop "exit" làm mới định kỳ, ghi ra khi tracker bỏ track
+        for car_id, x1, y1, x2, y2 in tracked_cars:
+            first = not self.image_writer.has(car_id, KIND_FIRST)
+            last = self.exit_crops.get(car_id)
+            if not first and last is not None and frame_id - last[0] < EXIT_CROP_REFRESH:
+                continue
+            crop = frame[max(0, y1):y2, max(0, x1):x2]
+            if crop.size == 0: continue
+            crop = crop.copy()
+            if first:
+                self.image_writer.submit(car_id, KIND_FIRST, crop)
+            self.exit_crops[car_id] = (frame_id, crop)
+
+        for car_id in [c for c in self.exit_crops if c not in live_ids]:
+            _, crop = self.exit_crops.pop(car_id)
+            self.image_writer.submit(car_id, KIND_EXIT, crop)
+
+    def log_expired(self, expired):
+        # Track kết thúc mà chưa chốt vote: ghi kết quả tốt nhất hiện có (track đã chốt được ghi lúc chốt)
+        for car_id, plate_text, final in expired:
+            if final or not plate_text: continue
+            if not self.plate_cache.mark_logged(car_id): continue
+            car_path, plate_path = self.image_writer.paths(car_id)
+            self.emit_plate(car_id, plate_text, car_path, plate_path, datetime.now().strftime("%Y%m%d_%H%M%S"),
+                            self.lookup_owner(plate_text))
+
+    def lookup_owner(self, plate_text):
+        return self.owner_index.lookup(plate_text) if plate_text and self.owner_index is not None else None
+
+    def emit_plate(self, car_id, plate_text, car_path, plate_path, ts, owner=None):
+        # Gọi 1 lần mỗi track đã có biển số: on_gate luôn nhận, plate_logs / on_plate qua PlateDedupe
+        event = {"car_id": car_id, "plate": plate_text, "car_path": car_path,
+                 "plate_path": plate_path, "gate": self.gate, "timestamp": ts,
+                 "owner": owner.name if owner else None, "unit": owner.unit if owner else None,
+                 "owner_plate": owner.plate if owner else None,
+                 "owner_distance": owner.distance if owner else None}
+        if self.on_gate:
+            self.on_gate(event)
+        if not self.plate_dedupe.should_log(plate_text, self.gate):
+            return
+        if self.log_writer:
+            self.log_writer.log_plate((car_id, plate_text, car_path, plate_path, None, ts, owner_text(owner)))
+        if self.on_plate:
+            self.on_plate(event)
+
+    def collect_entries(self, tracked_cars, live_ids, matches, ts):
+        # Xe có box biển số trong frame + xe đã chốt biển số (skip_read không tìm lại biển số của chúng)
+        car_ids = list(dict.fromkeys(car_id for car_id, _ in matches))
+        matched = set(car_ids)
+        car_ids += [c[0] for c in tracked_cars if c[0] not in matched and self.plate_cache.get(c[0])[1]]
+        frame_entries = []
+        with self.track_lock:
+            for car_id in car_ids:
+                info = self.track_info.setdefault(car_id, {})
+                car_path, plate_path = self.image_writer.paths(car_id)
+                owner = info.get("owner")
+                frame_entries.append({
+                    "car_id": car_id,
+                    "plate_text": info.get("plate_text"),
+                    "car_path": car_path,
+                    "plate_path": plate_path,
+                    "face_path": None,
+                    "owner": owner,
+                    "ts": ts
+                })
+            # Tracker đã bỏ track -> bỏ thông tin của xe (kết quả OCR tới muộn cũng bị xóa ở frame sau)
+            stale = [cid for cid in self.track_info if cid not in live_ids]
+            for cid in stale:
+                del self.track_info[cid]
+        return frame_entries
@@ -0,0 +1,55 @@
+import threading
+import time
+from collections import OrderedDict
+
+from recognition.plate_recog import normalize_plate
+
+# ---------------------------
+# Config
+# ---------------------------
+DEDUPE_WINDOW_S = 300     # không ghi lại cùng biển số ở cùng cổng trong 5 phút
+DEDUPE_MAX_SIZE = 10000   # số biển số tối đa giữ trong bộ nhớ
+
+
+class PlateDedupe:
+    """
+    Cache TTL + LRU các biển số (đã chuẩn hóa) vừa được ghi log theo từng cổng.
+    Trong cửa sổ `window_s` kể từ lần ghi gần nhất thì bỏ qua, ngoài cửa sổ thì cho ghi event mới.
+    """
+
+    def __init__(self, window_s=DEDUPE_WINDOW_S, max_size=DEDUPE_MAX_SIZE, clock=time.monotonic):
+        self.window_s = window_s
+        self.max_size = max_size
+        self.clock = clock
+        self.seen = OrderedDict()   # (gate, plate) -> thời điểm ghi gần nhất, cũ nhất ở đầu
+        self.lock = threading.Lock()
+        self.suppressed = 0
+
+    def should_log(self, plate, gate=""):
+        plate = normalize_plate(plate)
+        if not plate:
+            return False
+        key = (gate, plate)
+        now = self.clock()
+        with self.lock:
+            self.evict(now)
+            last = self.seen.get(key)
+            if last is not None and now - last < self.window_s:
+                self.suppressed += 1
+                return False
+            self.seen[key] = now
+            self.seen.move_to_end(key)
+            if len(self.seen) > self.max_size:
+                self.seen.popitem(last=False)
+            return True
+
+    def evict(self, now):
+        # Các key theo thứ tự thời gian ghi -> chỉ cần bỏ từ đầu
+        while self.seen:
+            key, last = next(iter(self.seen.items()))
+            if now - last < self.window_s:
+                break
+            self.seen.popitem(last=False)
+
+    def __len__(self):
+        return len(self.seen)
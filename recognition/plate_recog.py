@@ -0,0 +1,274 @@
+import re
+import cv2
+import numpy as np
+
+from recognition.backends import run_shared
+
+# ---------------------------
+# Config
+# ---------------------------
+CONF_THRESHOLD = 0.25
+
+# Cascade: mở rộng crop xe để không cắt mất biển số sát mép box
+CASCADE_PAD = 0.05
+CASCADE_MIN_SIZE = 24
+CASCADE_MAX_BATCH = 16
+
+# Haar cascade biển số đi kèm repo, dùng khi giảm tải (LoadShedder) thay cho plate_model
+HAAR_CASCADE_PATH = "haarcascade_russian_plate_number.xml"
+HAAR_SCALE_FACTOR = 1.1
+HAAR_MIN_NEIGHBORS = 4
+HAAR_MIN_SIZE = (24, 8)
+
+# Model gộp xe + biển số (1 lần forward): class id của từng loại
+COMBINED_VEHICLE_CLASSES = (0,)
+COMBINED_PLATE_CLASSES = (1,)
+
+# ---------------------------
+# Utils
+# ---------------------------
+def bbox_to_ints(xy):
+    try:
+        coords = xy[0] if hasattr(xy[0], "__getitem__") else xy
+        a = coords.cpu().numpy() if hasattr(coords, "cpu") else np.array(coords)
+        x1, y1, x2, y2 = map(int, a.tolist())
+        return x1, y1, x2, y2
+    except Exception:
+        a = np.array(xy)
+        if a.size >= 4:
+            x1, y1, x2, y2 = map(int, a.flatten()[:4])
+            return x1, y1, x2, y2
+        raise
+
+def centroid(box):
+    x1, y1, x2, y2 = box
+    return ((x1+x2)/2, (y1+y2)/2)
+
+def normalize_plate(text):
+    # Bỏ ký tự đệm / dấu gạch / dấu chấm, viết hoa: "51f-123.45" -> "51F12345"
+    if not text:
+        return ""
+    return re.sub(r"[^0-9A-Z]", "", str(text).upper())
+
+def box_conf(box):
+    return float(box.conf[0]) if hasattr(box.conf, "__getitem__") else float(box.conf)
+
+def to_numpy(x):
+    return x.cpu().numpy() if hasattr(x, "cpu") else np.asarray(x)
+
+def result_arrays(results, conf_threshold=CONF_THRESHOLD, with_classes=False):
+    """
+    Lấy box của 1 kết quả model ra 1 lần dưới dạng mảng: (xyxy int32 Nx4, conf float32 N),
+    lọc confidence bằng 1 mask. with_classes=True: trả thêm cls int32 N
+    """
+    boxes = results.boxes
+    try:
+        xyxy = to_numpy(boxes.xyxy).reshape(-1, 4)
+        conf = to_numpy(boxes.conf).reshape(-1)
+        cls = to_numpy(boxes.cls).reshape(-1) if with_classes else None
+    except AttributeError:
+        # Kết quả không có xyxy/conf dạng mảng: lấy từng box
+        items = list(boxes)
+        xyxy = np.array([bbox_to_ints(b.xyxy) for b in items], dtype=np.float32).reshape(-1, 4)
+        conf = np.array([box_conf(b) for b in items], dtype=np.float32)
+        cls = np.array([int(to_numpy(b.cls).reshape(-1)[0]) for b in items]) if with_classes else None
+    keep = conf >= conf_threshold
+    if with_classes:
+        return xyxy[keep].astype(np.int32), conf[keep].astype(np.float32), cls[keep].astype(np.int32)
+    return xyxy[keep].astype(np.int32), conf[keep].astype(np.float32)
+
+def box_iou(a, b):
+    """
+    IoU từng cặp giữa a (Mx4) và b (Nx4) -> ma trận MxN
+    """
+    a = np.asarray(a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float32).reshape(-1, 4)
+    ix1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    iy1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    ix2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    iy2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+# ---------------------------
+# Detection / tracking
+# ---------------------------
+def run_model(model, source, imgsz=None):
+    # imgsz=None -> giữ input size mặc định của model
+    if imgsz:
+        return model(source, imgsz=imgsz, verbose=False)
+    return model(source, verbose=False)
+
+def detect_vehicles(vehicle_model, frame, conf_threshold=CONF_THRESHOLD, imgsz=None):
+    """
+    Trả về list detections theo format của DeepSort: ([x, y, w, h], conf, class)
+    """
+    return detect_vehicles_batch(vehicle_model, [frame], conf_threshold, imgsz)[0]
+
+def detect_vehicles_batch(vehicle_model, frames, conf_threshold=CONF_THRESHOLD, imgsz=None):
+    # Nhiều frame (vd. nhiều camera) trong 1 lần gọi model -> 1 list detections cho mỗi frame
+    return [to_detections(*result_arrays(r, conf_threshold)) for r in run_model(vehicle_model, frames, imgsz)]
+
+def to_detections(xyxy, conf):
+    xywh = xyxy.copy()
+    xywh[:, 2:] -= xyxy[:, :2]
+    return [(b, c, None) for b, c in zip(xywh.tolist(), conf.tolist())]
+
+def detect_combined(model, frame, conf_threshold=CONF_THRESHOLD, imgsz=None,
+                    vehicle_classes=COMBINED_VEHICLE_CLASSES, plate_classes=COMBINED_PLATE_CLASSES):
+    """
+    Model gộp: 1 lần forward ra cả xe và biển số, tách theo class.
+    Trả về (detections theo format DeepSort, plate_bboxes) như detect_vehicles + detect_plates
+    """
+    return detect_combined_batch(model, [frame], conf_threshold, imgsz, vehicle_classes, plate_classes)[0]
+
+def detect_combined_batch(model, frames, conf_threshold=CONF_THRESHOLD, imgsz=None,
+                          vehicle_classes=COMBINED_VEHICLE_CLASSES, plate_classes=COMBINED_PLATE_CLASSES):
+    out = []
+    for r in run_model(model, frames, imgsz):
+        xyxy, conf, cls = result_arrays(r, conf_threshold, with_classes=True)
+        vehicle = np.isin(cls, vehicle_classes)
+        plate = np.isin(cls, plate_classes)
+        out.append((to_detections(xyxy[vehicle], conf[vehicle]), [tuple(b) for b in xyxy[plate].tolist()]))
+    return out
+
+def detect_shared(vehicle_model, plate_model, frame, conf_threshold=CONF_THRESHOLD, imgsz=None):
+    """
+    2 model riêng trên toàn frame nhưng dùng chung 1 tensor đã preprocess.
+    Trả về (detections, plate_bboxes) như detect_combined
+    """
+    vehicle_results, plate_results = run_shared([vehicle_model, plate_model], frame, imgsz)
+    xyxy, conf = result_arrays(vehicle_results, conf_threshold)
+    return to_detections(xyxy, conf), plate_boxes_from_result(plate_results, conf_threshold)
+
+def track_cars(tracker, detections, frame):
+    """
+    Trả về (tracked_cars, live_ids):
+      tracked_cars: list (track_id, x1, y1, x2, y2) của các track đã confirmed
+      live_ids: set track_id tracker còn giữ (kể cả chưa confirmed), dùng để expire cache
+    """
+    tracks = tracker.update_tracks(detections, frame=frame)
+    tracked_cars = [(t.track_id, *map(int, t.to_ltrb())) for t in tracks if t.is_confirmed()]
+    return tracked_cars, set(t.track_id for t in tracks)
+
+def plate_boxes_from_result(plate_results, conf_threshold=CONF_THRESHOLD, offset=(0, 0)):
+    xyxy, _ = result_arrays(plate_results, conf_threshold)
+    if offset != (0, 0):
+        xyxy += np.array([offset[0], offset[1], offset[0], offset[1]], dtype=np.int32)
+    return [tuple(b) for b in xyxy.tolist()]
+
+def detect_plates(plate_model, frame, conf_threshold=CONF_THRESHOLD, imgsz=None):
+    return detect_plates_batch(plate_model, [frame], conf_threshold, imgsz)[0]
+
+def detect_plates_batch(plate_model, frames, conf_threshold=CONF_THRESHOLD, imgsz=None):
+    return [plate_boxes_from_result(r, conf_threshold) for r in run_model(plate_model, frames, imgsz)]
+
+def pad_box(box, frame_shape, pad=CASCADE_PAD):
+    h, w = frame_shape[:2]
+    x1, y1, x2, y2 = box
+    dx, dy = int((x2 - x1) * pad), int((y2 - y1) * pad)
+    return max(0, x1 - dx), max(0, y1 - dy), min(w, x2 + dx), min(h, y2 + dy)
+
+def detect_plates_in_tracks(plate_model, frame, tracked_cars, conf_threshold=CONF_THRESHOLD, imgsz=None,
+                            pad=CASCADE_PAD, min_size=CASCADE_MIN_SIZE, max_batch=CASCADE_MAX_BATCH):
+    """
+    Cascade: chỉ chạy plate_model trên crop của các xe đã tracked (batch), map tọa độ về frame.
+    Trả về list (car_id, plate_box) - biển số đã gắn sẵn với xe chứa nó.
+    """
+    return detect_plates_in_tracks_multi(plate_model, [(frame, tracked_cars)], conf_threshold, imgsz,
+                                         pad, min_size, max_batch)[0]
+
+def detect_plates_in_tracks_multi(plate_model, scenes, conf_threshold=CONF_THRESHOLD, imgsz=None,
+                                  pad=CASCADE_PAD, min_size=CASCADE_MIN_SIZE, max_batch=CASCADE_MAX_BATCH):
+    """
+    Như detect_plates_in_tracks cho nhiều (frame, tracked_cars) cùng lúc (vd. nhiều camera): crop xe
+    của mọi frame gom chung batch. Trả về 1 list matches cho mỗi scene
+    """
+    rois = []
+    for i, (frame, tracked_cars) in enumerate(scenes):
+        for car_id, x1, y1, x2, y2 in tracked_cars:
+            cx1, cy1, cx2, cy2 = pad_box((x1, y1, x2, y2), frame.shape, pad)
+            if cx2 - cx1 < min_size or cy2 - cy1 < min_size: continue
+            rois.append((i, car_id, cx1, cy1, frame[cy1:cy2, cx1:cx2]))
+
+    matches = [[] for _ in scenes]
+    for start in range(0, len(rois), max_batch):
+        chunk = rois[start:start + max_batch]
+        results = run_model(plate_model, [roi[-1] for roi in chunk], imgsz)
+        for (i, car_id, ox, oy, _), plate_results in zip(chunk, results):
+            for pb in plate_boxes_from_result(plate_results, conf_threshold, offset=(ox, oy)):
+                matches[i].append((car_id, pb))
+    return matches
+
+def load_haar_cascade(path=HAAR_CASCADE_PATH):
+    if not hasattr(cv2, "CascadeClassifier"):
+        # OpenCV 5 tách Haar cascade sang opencv-contrib
+        raise RuntimeError("Bản OpenCV này không có CascadeClassifier")
+    cascade = cv2.CascadeClassifier(path)
+    if cascade.empty():
+        raise FileNotFoundError(f"Không load được Haar cascade: {path}")
+    return cascade
+
+def detect_plates_haar(cascade, frame, tracked_cars, pad=CASCADE_PAD, min_size=CASCADE_MIN_SIZE):
+    """
+    Như detect_plates_in_tracks nhưng dùng Haar cascade trên ảnh xám của crop xe (rẻ hơn YOLO nhiều,
+    kém chính xác hơn). Mỗi xe lấy vùng lớn nhất. Trả về list (car_id, plate_box)
+    """
+    matches = []
+    for car_id, x1, y1, x2, y2 in tracked_cars:
+        cx1, cy1, cx2, cy2 = pad_box((x1, y1, x2, y2), frame.shape, pad)
+        if cx2 - cx1 < min_size or cy2 - cy1 < min_size: continue
+        gray = cv2.cvtColor(frame[cy1:cy2, cx1:cx2], cv2.COLOR_BGR2GRAY)
+        found = cascade.detectMultiScale(gray, scaleFactor=HAAR_SCALE_FACTOR, minNeighbors=HAAR_MIN_NEIGHBORS,
+                                         minSize=HAAR_MIN_SIZE)
+        if len(found):
+            x, y, w, h = (int(v) for v in max(found, key=lambda r: r[2] * r[3]))
+            matches.append((car_id, (cx1 + x, cy1 + y, cx1 + x + w, cy1 + y + h)))
+    return matches
+
+def match_plates(plate_bboxes, tracked_cars):
+    """
+    Gán biển số cho xe nếu tâm biển số nằm trong box xe (broadcast MxN). Tâm nằm trong nhiều xe
+    chồng nhau thì chọn xe có IoU lớn nhất với biển số. Trả về list (car_id, plate_box)
+    """
+    if not plate_bboxes or not tracked_cars:
+        return []
+    plates = np.asarray(plate_bboxes, dtype=np.float32).reshape(-1, 4)
+    cars = np.asarray([c[1:] for c in tracked_cars], dtype=np.float32).reshape(-1, 4)
+
+    pcx = (plates[:, 0] + plates[:, 2]) / 2
+    pcy = (plates[:, 1] + plates[:, 3]) / 2
+    inside = ((cars[None, :, 0] <= pcx[:, None]) & (pcx[:, None] <= cars[None, :, 2])
+              & (cars[None, :, 1] <= pcy[:, None]) & (pcy[:, None] <= cars[None, :, 3]))
+
+    score = np.where(inside, box_iou(plates, cars), -1.0)
+    best = score.argmax(axis=1)
+    return [(tracked_cars[best[i]][0], plate_bboxes[i]) for i in np.flatnonzero(inside.any(axis=1))]
+
+# ---------------------------
+# OCR
+# ---------------------------
+def read_plate(ocr, plate_crop):
+    try:
+        plate_text_raw = ocr.run(cv2.cvtColor(plate_crop, cv2.COLOR_BGR2RGB))
+        return "".join(plate_text_raw) if isinstance(plate_text_raw, list) else plate_text_raw
+    except:
+        return None
+
+def read_plates(ocr, plate_crops):
+    """
+    OCR nhiều crop trong 1 lần gọi recognizer (ocr.run nhận list ảnh -> list text).
+    Lỗi hoặc kết quả không khớp số crop thì đọc lại từng crop
+    """
+    if not plate_crops:
+        return []
+    try:
+        texts = ocr.run([cv2.cvtColor(c, cv2.COLOR_BGR2RGB) for c in plate_crops])
+        if isinstance(texts, (list, tuple)) and len(texts) == len(plate_crops):
+            return ["".join(t) if isinstance(t, (list, tuple)) else t for t in texts]
+    except Exception:
+        pass
+    return [read_plate(ocr, c) for c in plate_crops]
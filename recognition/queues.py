@@ -0,0 +1,94 @@
+import queue
+
+# ---------------------------
+# Bounded queue + drop policy
+# ---------------------------
+DROP_OLDEST = "drop_oldest"   # đầy thì bỏ item cũ nhất, giữ frame mới nhất (capture, display)
+DROP_NEWEST = "drop_newest"   # đầy thì bỏ item mới đến (OCR burst không được chặn detect)
+BLOCK = "block"               # đầy thì chờ, không mất dữ liệu (ghi đĩa / DB)
+
+STOP = object()  # sentinel báo stage phía sau kết thúc
+
+
+class StageQueue:
+    def __init__(self, maxsize, policy=BLOCK, on_drop=None):
+        self.q = queue.Queue(maxsize=maxsize)
+        self.maxsize = maxsize
+        self.policy = policy
+        self.on_drop = on_drop  # callback(item) cho item bị bỏ (vd. trả slot của frame ring)
+        self.dropped = 0
+
+    def put(self, item):
+        if self.policy == BLOCK:
+            self.q.put(item)
+            return True
+        if self.policy == DROP_NEWEST:
+            try:
+                self.q.put_nowait(item)
+                return True
+            except queue.Full:
+                self.dropped += 1
+                if self.on_drop:
+                    self.on_drop(item)
+                return False
+        # DROP_OLDEST
+        while True:
+            try:
+                self.q.put_nowait(item)
+                return True
+            except queue.Full:
+                try:
+                    old = self.q.get_nowait()
+                    self.dropped += 1
+                    if self.on_drop and old is not STOP:
+                        self.on_drop(old)
+                except queue.Empty:
+                    pass
+
+    def put_wait(self, item):
+        # Chờ tới khi có chỗ, không theo policy: item cuối không được mất (vd. crop còn lại lúc hết stream)
+        self.q.put(item)
+
+    def put_stop(self):
+        # Sentinel không bao giờ bị drop
+        if self.policy == DROP_OLDEST:
+            self.put(STOP)
+        else:
+            self.q.put(STOP)
+
+    def fill(self):
+        # Độ đầy 0..1 (queue không giới hạn luôn 0)
+        return self.q.qsize() / self.q.maxsize if self.q.maxsize > 0 else 0.0
+
+    def get(self, timeout=0.1):
+        try:
+            return self.q.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def get_batch(self, max_items, timeout=0.1):
+        """
+        Chờ item đầu tiên rồi lấy thêm các item đang có sẵn (không chờ), tối đa max_items.
+        Trả về (items, stopped): stopped=True nếu gặp STOP (STOP không nằm trong items)
+        """
+        items = []
+        item = self.get(timeout)
+        while item is not None:
+            if item is STOP:
+                return items, True
+            items.append(item)
+            if len(items) >= max_items:
+                break
+            item = self.get(timeout=0)
+        return items, False
+
+    def get_latest(self):
+        item = None
+        while True:
+            try:
+                item = self.q.get_nowait()
+            except queue.Empty:
+                return item
+
+    def qsize(self):
+        return self.q.qsize()
@@ -0,0 +1,140 @@
+import threading
+import time
+
+import numpy as np
+
+from recognition.backends import DEFAULT_IMGSZ
+from recognition.models import (load_vehicle_model, load_plate_model, load_combined_model, load_ocr,
+                                create_tracker,
+                                TRACKER_KIND, DETECTOR_BACKEND, DETECTOR_INT8, DETECTOR_THREADS)
+from recognition.plate_recog import run_model, read_plate
+
+# ---------------------------
+# Config
+# ---------------------------
+VEHICLE = "vehicle"
+PLATE = "plate"
+OCR = "ocr"
+TRACKER = "tracker"
+OCR_WARMUP_SHAPE = (64, 128, 3)
+
+
+class ModelEntry:
+    def __init__(self, loader, warmup=None):
+        self.loader = loader
+        self.warmup = warmup
+        self.lock = threading.Lock()
+        self.value = None
+        self.loaded = False
+        self.load_s = None
+        self.warmup_s = None
+
+
+class ModelRegistry:
+    """
+    Model chỉ được tạo khi get() lần đầu (hoặc load_async() ở thread nền), kèm 1 lần suy luận
+    warm-up trên ảnh rỗng. Ghi lại thời gian load / warm-up của từng model.
+    """
+
+    def __init__(self, warmup=True):
+        self.entries = {}
+        self.do_warmup = warmup
+        self.thread = None
+        self.error = None
+
+    def register(self, name, loader, warmup=None):
+        self.entries[name] = ModelEntry(loader, warmup)
+
+    def get(self, name):
+        entry = self.entries[name]
+        if entry.loaded:
+            return entry.value
+        with entry.lock:
+            # Thread khác có thể đã load xong trong lúc chờ lock
+            if not entry.loaded:
+                t0 = time.perf_counter()
+                value = entry.loader()
+                entry.load_s = time.perf_counter() - t0
+                if self.do_warmup and entry.warmup:
+                    t0 = time.perf_counter()
+                    entry.warmup(value)
+                    entry.warmup_s = time.perf_counter() - t0
+                entry.value = value
+                entry.loaded = True
+        return entry.value
+
+    def is_loaded(self, name):
+        return self.entries[name].loaded
+
+    def ready(self):
+        return all(e.loaded for e in self.entries.values())
+
+    def load_all(self, names=None):
+        for name in names or self.entries:
+            self.get(name)
+
+    def load_async(self):
+        """
+        Load toàn bộ model ở thread nền. Lỗi (nếu có) lưu ở self.error
+        """
+        def run():
+            try:
+                self.load_all()
+            except Exception as e:
+                self.error = e
+
+        if self.thread is None:
+            self.thread = threading.Thread(target=run, name="model-loader", daemon=True)
+            self.thread.start()
+        return self.thread
+
+    def loading(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def timings(self):
+        """
+        {name: {load_s, warmup_s}} của các model đã load
+        """
+        return {name: {"load_s": round(e.load_s, 3),
+                       "warmup_s": round(e.warmup_s, 3) if e.warmup_s is not None else None}
+                for name, e in self.entries.items() if e.loaded}
+
+    def startup_s(self):
+        return round(sum(e.load_s + (e.warmup_s or 0) for e in self.entries.values() if e.loaded), 3)
+
+
+def warmup_detector(imgsz):
+    def warmup(model):
+        run_model(model, np.zeros((imgsz, imgsz, 3), dtype=np.uint8), imgsz)
+    return warmup
+
+
+def warmup_ocr(ocr):
+    read_plate(ocr, np.zeros(OCR_WARMUP_SHAPE, dtype=np.uint8))
+
+
+def create_registry(backend=DETECTOR_BACKEND, int8=DETECTOR_INT8, threads=DETECTOR_THREADS,
+                    vehicle_imgsz=DEFAULT_IMGSZ, plate_imgsz=DEFAULT_IMGSZ, tracker=TRACKER_KIND,
+                    combined=False, tracker_stride=1, warmup=True):
+    """
+    Registry cho vehicle / plate / ocr / tracker, cùng cấu hình với load_models().
+    combined=True: dùng model gộp xe + biển số (plate_mode "combined").
+    tracker_stride: active_stride của MotionGate (tracker chỉ update 1 trong bấy nhiêu frame)
+    """
+    registry = ModelRegistry(warmup)
+    if combined:
+        # Model gộp xe + biển số: VEHICLE và PLATE là cùng 1 model, chỉ load / warm-up 1 lần
+        registry.register(VEHICLE, lambda: load_combined_model(backend=backend, int8=int8, threads=threads,
+                                                               imgsz=vehicle_imgsz),
+                          warmup_detector(vehicle_imgsz))
+        registry.register(PLATE, lambda: registry.get(VEHICLE))
+    else:
+        registry.register(VEHICLE, lambda: load_vehicle_model(backend=backend, int8=int8, threads=threads,
+                                                              imgsz=vehicle_imgsz),
+                          warmup_detector(vehicle_imgsz))
+        registry.register(PLATE, lambda: load_plate_model(backend=backend, int8=int8, threads=threads,
+                                                          imgsz=plate_imgsz),
+                          warmup_detector(plate_imgsz))
+    registry.register(OCR, load_ocr, warmup_ocr)
+    registry.register(TRACKER, lambda: create_tracker(tracker, frame_stride=tracker_stride))
+    return registry
@@ -0,0 +1,249 @@
+import random
+import time
+
+import numpy as np
+
+# ---------------------------
+# Config
+# ---------------------------
+# Khung hình giả lập: nền xám, thân xe có R thấp, biển số có R=255 và mã số xe nằm trong kênh B, G
+# (ảnh BGR). Frame index được mã hóa vào pixel (0, 0) để detector giả biết frame nào đang xử lý.
+BACKGROUND = (30, 30, 30)
+CAR_COLOR = (90, 60, 40)
+PLATE_R = 255
+
+STUB_CONF = 0.9
+PLATE_CHARS = "ABCDEFGHKLMNPSTUVXYZ"
+# Các lỗi OCR hay gặp, dùng để tạo nhiễu cho phần vote
+OCR_CONFUSIONS = {"0": "O", "O": "0", "8": "B", "B": "8", "1": "I", "5": "S", "S": "5", "2": "Z"}
+
+
+def random_plate(rng):
+    # Dạng biển số VN: 51F12345
+    return f"{rng.randint(10, 99)}{rng.choice(PLATE_CHARS)}{rng.randint(10000, 99999)}"
+
+
+class SyntheticScene:
+    """
+    Cảnh giả lập có tính tất định theo seed: các xe lần lượt chạy ngang qua khung hình theo làn
+    """
+
+    def __init__(self, width=1280, height=720, n_cars=50, lanes=3, speed=12, spacing=25, seed=0):
+        rng = random.Random(seed)
+        self.width = width
+        self.height = height
+        self.car_w = max(40, width // 8)
+        self.car_h = max(24, height // 8)
+        self.plate_w = max(16, self.car_w // 4)
+        self.plate_h = max(6, self.car_h // 6)
+        lane_h = (height - 20) // lanes
+
+        self.cars = []
+        for i in range(n_cars):
+            self.cars.append({
+                "plate": random_plate(rng),
+                "start": i * spacing + rng.randint(0, spacing // 2),
+                "y": 10 + (i % lanes) * lane_h + rng.randint(0, max(0, lane_h - self.car_h - 1)),
+                "speed": speed + rng.randint(-speed // 3, speed // 3),
+            })
+        self.plates = [c["plate"] for c in self.cars]
+        self.length = max(c["start"] + (width + self.car_w) // c["speed"] + 1 for c in self.cars)
+
+    def boxes_at(self, index):
+        """
+        Trả về list (car_idx, car_box, plate_box) của các xe trong khung ở frame `index`
+        """
+        result = []
+        for i, car in enumerate(self.cars):
+            t = index - car["start"]
+            if t < 0: continue
+            x1 = -self.car_w + t * car["speed"]
+            if x1 >= self.width: continue
+            x2, y1 = x1 + self.car_w, car["y"]
+            y2 = y1 + self.car_h
+            cx1, cx2 = max(1, x1), min(self.width, x2)
+            if cx2 - cx1 < self.car_w // 3: continue
+            px1 = x1 + (self.car_w - self.plate_w) // 2
+            py1 = y2 - self.plate_h - 3
+            plate = (px1, py1, px1 + self.plate_w, py1 + self.plate_h)
+            if plate[0] < 1 or plate[2] > self.width:
+                plate = None
+            result.append((i, (cx1, y1, cx2, y2), plate))
+        return result
+
+    def render(self, index):
+        frame = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        frame[:] = BACKGROUND
+        for car_idx, (x1, y1, x2, y2), plate in self.boxes_at(index):
+            frame[y1:y2, x1:x2] = CAR_COLOR
+            if plate:
+                px1, py1, px2, py2 = plate
+                frame[py1:py2, px1:px2] = (car_idx & 0xFF, (car_idx >> 8) & 0xFF, PLATE_R)
+        frame[0, 0] = (index & 0xFF, (index >> 8) & 0xFF, (index >> 16) & 0xFF)
+        return frame
+
+
+def frame_index(frame):
+    b, g, r = (int(v) for v in frame[0, 0])
+    return b | (g << 8) | (r << 16)
+
+
+class SyntheticCapture:
+    """
+    Thay cho cv2.VideoCapture: read() / isOpened() / release()
+    """
+
+    def __init__(self, scene, frames=None, fps=0):
+        self.scene = scene
+        self.frames = frames or scene.length
+        self.interval = 1.0 / fps if fps else 0
+        self.index = 0
+        self.next_at = time.perf_counter()
+
+    def isOpened(self):
+        return True
+
+    def read(self):
+        if self.index >= self.frames:
+            return False, None
+        if self.interval:
+            # Giả lập camera thật: không trả frame nhanh hơn fps
+            delay = self.next_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            self.next_at = max(self.next_at, time.perf_counter()) + self.interval
+        self.index += 1
+        return True, self.scene.render(self.index)
+
+    def release(self):
+        pass
+
+
+# ---------------------------
+# Kết quả giả theo interface ultralytics: results[i].boxes -> box.xyxy, box.conf
+# ---------------------------
+class StubBox:
+    def __init__(self, box, conf=STUB_CONF, cls=0):
+        self.xyxy = np.array([box], dtype=np.float32)
+        self.conf = np.array([conf], dtype=np.float32)
+        self.cls = np.array([cls], dtype=np.float32)
+
+
+class StubBoxes:
+    # Như ultralytics Boxes: có xyxy (Nx4) / conf (N) / cls (N) dạng mảng, duyệt được từng box
+    def __init__(self, boxes, conf=STUB_CONF, cls=None):
+        self.xyxy = np.array(boxes, dtype=np.float32).reshape(-1, 4)
+        self.conf = np.full(len(self.xyxy), conf, dtype=np.float32)
+        self.cls = np.zeros(len(self.xyxy), dtype=np.float32) if cls is None else np.asarray(cls, np.float32)
+
+    def __len__(self):
+        return len(self.xyxy)
+
+    def __iter__(self):
+        return (StubBox(b, c, k) for b, c, k in zip(self.xyxy.tolist(), self.conf.tolist(), self.cls.tolist()))
+
+
+class StubResult:
+    def __init__(self, boxes, cls=None):
+        self.boxes = StubBoxes(boxes, cls=cls)
+
+
+def plate_boxes_in(img):
+    """
+    Tìm các vùng biển số (R=255) trong ảnh, tách theo mã xe
+    """
+    mask = img[:, :, 2] == PLATE_R
+    if not mask.any():
+        return []
+    ids = img[:, :, 0].astype(np.int32) | (img[:, :, 1].astype(np.int32) << 8)
+    boxes = []
+    for car_idx in np.unique(ids[mask]):
+        ys, xs = np.nonzero(mask & (ids == car_idx))
+        boxes.append((int(xs.min()), int(ys.min()), int(xs.max()) + 1, int(ys.max()) + 1))
+    return boxes
+
+
+class StubDetector:
+    """
+    Thay cho YOLO: kind="vehicle" trả box xe, kind="plate" trả box biển số, kind="combined" trả cả hai
+    (class 0: xe, class 1: biển số, như model gộp). Độ trễ cố định
+    `latency_ms` cho mỗi lần gọi cộng `per_image_ms` cho mỗi ảnh trong batch.
+    """
+
+    def __init__(self, scene, kind="vehicle", latency_ms=0.0, per_image_ms=0.0):
+        self.scene = scene
+        self.kind = kind
+        self.latency_ms = latency_ms
+        self.per_image_ms = per_image_ms
+        self.calls = 0
+
+    def __call__(self, source, imgsz=None, verbose=False):
+        images = source if isinstance(source, (list, tuple)) else [source]
+        self.calls += 1
+        delay = self.latency_ms + self.per_image_ms * len(images)
+        if delay:
+            time.sleep(delay / 1000.0)
+        return [self.detect(img) for img in images]
+
+    def detect(self, img):
+        full_frame = img.shape[0] == self.scene.height and img.shape[1] == self.scene.width
+        if self.kind == "vehicle":
+            return StubResult([car for _, car, _ in self.scene.boxes_at(frame_index(img))])
+        if self.kind == "combined":
+            gt = self.scene.boxes_at(frame_index(img))
+            plates = [p for _, _, p in gt if p]
+            return StubResult([car for _, car, _ in gt] + plates, cls=[0] * len(gt) + [1] * len(plates))
+        if full_frame:
+            return StubResult([p for _, _, p in self.scene.boxes_at(frame_index(img)) if p])
+        # Cascade: crop xe -> tìm biển số theo màu
+        return StubResult(plate_boxes_in(img))
+
+
+class StubOCR:
+    """
+    Thay cho LicensePlateRecognizer.run: đọc mã xe trong crop (RGB) và trả về biển số của xe đó,
+    đôi khi đọc nhầm 1 ký tự (xác suất `error_rate`, tất định theo seed) để thử phần vote.
+    """
+
+    def __init__(self, scene, latency_ms=0.0, error_rate=0.1, seed=0):
+        self.scene = scene
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.calls = 0
+
+    def run(self, image):
+        self.calls += 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000.0)
+        images = image if isinstance(image, (list, tuple)) else [image]
+        texts = [self.read(img) for img in images]
+        return texts if isinstance(image, (list, tuple)) else texts[0]
+
+    def read(self, rgb):
+        mask = rgb[:, :, 0] == PLATE_R
+        if not mask.any():
+            return ""
+        car_idx = int(np.median(rgb[:, :, 2][mask])) | (int(np.median(rgb[:, :, 1][mask])) << 8)
+        if car_idx >= len(self.scene.plates):
+            return ""
+        text = self.scene.plates[car_idx]
+        if self.rng.random() < self.error_rate:
+            pos = self.rng.randrange(len(text))
+            ch = OCR_CONFUSIONS.get(text[pos], self.rng.choice(PLATE_CHARS))
+            text = text[:pos] + ch + text[pos + 1:]
+        return text
+
+
+def create_stub_models(scene, vehicle_ms=0.0, plate_ms=0.0, plate_per_image_ms=0.0, ocr_ms=0.0,
+                       ocr_error_rate=0.1, seed=0, combined=False):
+    """
+    Trả về (vehicle_model, plate_model, ocr) giả, cùng interface với load_models().
+    combined=True: vehicle_model và plate_model là cùng 1 model gộp
+    """
+    if combined:
+        model = StubDetector(scene, "combined", vehicle_ms)
+        return model, model, StubOCR(scene, ocr_ms, ocr_error_rate, seed)
+    return (StubDetector(scene, "vehicle", vehicle_ms),
+            StubDetector(scene, "plate", plate_ms, plate_per_image_ms),
+            StubOCR(scene, ocr_ms, ocr_error_rate, seed))
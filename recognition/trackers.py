@@ -0,0 +1,173 @@
+import numpy as np
+
+from recognition.plate_recog import box_iou
+
+# ---------------------------
+# Config
+# ---------------------------
+TRACKER_DEEPSORT = "deepsort"   # Kalman + appearance embedding (deep_sort_realtime)
+TRACKER_IOU = "iou"             # Kalman + IoU, thuần NumPy, không cần embedding
+TRACKERS = (TRACKER_DEEPSORT, TRACKER_IOU)
+
+IOU_MATCH_THRESHOLD = 0.3   # IoU tối thiểu để ghép detection với track
+HIGH_CONF = 0.5             # detection conf >= HIGH_CONF ghép trước và được tạo track mới (kiểu ByteTrack)
+
+# Nhiễu Kalman theo tỉ lệ chiều cao box (giống DeepSort)
+STD_POSITION = 1.0 / 20
+STD_VELOCITY = 1.0 / 160
+
+# Mô hình vận tốc không đổi trên (cx, cy, w, h, vcx, vcy, vw, vh)
+F = np.eye(8, dtype=np.float64)
+F[:4, 4:] = np.eye(4)
+H = np.eye(4, 8, dtype=np.float64)
+
+
+def linear_assignment(cost, max_cost):
+    """
+    Ghép hàng-cột có cost nhỏ nhất, bỏ cặp có cost > max_cost. Dùng Hungarian của scipy nếu có,
+    không thì ghép tham lam theo cost tăng dần
+    """
+    if not cost.size:
+        return []
+    try:
+        from scipy.optimize import linear_sum_assignment
+        rows, cols = linear_sum_assignment(cost)
+        return [(r, c) for r, c in zip(rows.tolist(), cols.tolist()) if cost[r, c] <= max_cost]
+    except ImportError:
+        pass
+    pairs = []
+    used_r, used_c = set(), set()
+    for flat in np.argsort(cost, axis=None).tolist():
+        r, c = divmod(flat, cost.shape[1])
+        if cost[r, c] > max_cost:
+            break
+        if r in used_r or c in used_c:
+            continue
+        used_r.add(r)
+        used_c.add(c)
+        pairs.append((r, c))
+    return pairs
+
+
+class IouTrack:
+    """
+    Cùng interface với track của deep_sort_realtime mà pipeline dùng: track_id, to_ltrb(), is_confirmed()
+    """
+
+    def __init__(self, track_id, box, conf, n_init):
+        self.track_id = track_id
+        self.hits = 1
+        self.age = 1
+        self.time_since_update = 0
+        self.det_conf = conf
+        self.n_init = n_init
+        cx, cy, w, h = (box[0] + box[2]) / 2, (box[1] + box[3]) / 2, box[2] - box[0], box[3] - box[1]
+        self.mean = np.array([cx, cy, w, h, 0, 0, 0, 0], dtype=np.float64)
+        std = np.array([2 * STD_POSITION * h] * 4 + [10 * STD_VELOCITY * h] * 4)
+        self.covariance = np.diag(np.square(std))
+
+    def is_confirmed(self):
+        return self.hits >= self.n_init
+
+    def is_tentative(self):
+        return self.hits < self.n_init
+
+    def to_ltrb(self):
+        cx, cy, w, h = self.mean[:4]
+        return np.array([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2])
+
+    def to_ltwh(self):
+        cx, cy, w, h = self.mean[:4]
+        return np.array([cx - w / 2, cy - h / 2, w, h])
+
+    def predict(self):
+        h = self.mean[3]
+        std = np.array([STD_POSITION * h] * 4 + [STD_VELOCITY * h] * 4)
+        self.mean = F @ self.mean
+        self.covariance = F @ self.covariance @ F.T + np.diag(np.square(std))
+        self.age += 1
+        self.time_since_update += 1
+
+    def update(self, box, conf):
+        z = np.array([(box[0] + box[2]) / 2, (box[1] + box[3]) / 2, box[2] - box[0], box[3] - box[1]])
+        r = np.diag(np.square([STD_POSITION * self.mean[3]] * 4))
+        s = H @ self.covariance @ H.T + r
+        k = np.linalg.solve(s, H @ self.covariance).T
+        self.mean = self.mean + k @ (z - H @ self.mean)
+        self.covariance = self.covariance - k @ s @ k.T
+        self.hits += 1
+        self.time_since_update = 0
+        self.det_conf = conf
+
+
+class IouTracker:
+    """
+    Tracker chỉ dùng chuyển động: Kalman vận tốc không đổi + ghép theo IoU 2 bước kiểu ByteTrack
+    (detection conf cao trước, conf thấp ghép tiếp với các track còn lại). Không tính embedding
+    nên rẻ hơn DeepSort nhiều trên CPU; hợp với camera cổng cố định.
+    update_tracks() nhận và trả cùng format với DeepSort.update_tracks().
+    """
+
+    def __init__(self, max_age=30, n_init=3, iou_threshold=IOU_MATCH_THRESHOLD, high_conf=HIGH_CONF):
+        self.max_age = max_age
+        self.n_init = n_init
+        self.iou_threshold = iou_threshold
+        self.high_conf = high_conf
+        self.tracks = []
+        self.next_id = 1
+
+    def update_tracks(self, raw_detections, frame=None):
+        """
+        raw_detections: list ([left, top, w, h], conf, class). frame không dùng (giữ cho cùng interface)
+        """
+        for t in self.tracks:
+            t.predict()
+
+        if raw_detections:
+            boxes = np.array([d[0] for d in raw_detections], dtype=np.float64).reshape(-1, 4)
+            boxes[:, 2:] += boxes[:, :2]
+            confs = np.array([d[1] if d[1] is not None else 1.0 for d in raw_detections], dtype=np.float64)
+        else:
+            boxes = np.zeros((0, 4))
+            confs = np.zeros(0)
+
+        high = np.flatnonzero(confs >= self.high_conf)
+        low = np.flatnonzero(confs < self.high_conf)
+
+        # Bước 1: track đã confirmed ghép trước rồi tới track mới, với detection conf cao
+        order = sorted(range(len(self.tracks)), key=lambda i: (not self.tracks[i].is_confirmed(),
+                                                                self.tracks[i].time_since_update))
+        remaining, matched = self.associate(order, high, boxes, confs)
+        # Bước 2: track confirmed chưa ghép với detection conf thấp (xe bị che / mờ)
+        self.associate([i for i in remaining if self.tracks[i].is_confirmed()], low, boxes, confs)
+        unmatched_high = [d for d in high.tolist() if d not in matched]
+
+        # Track tentative bị lỡ 1 frame thì bỏ; track cũ quá max_age thì bỏ
+        self.tracks = [t for t in self.tracks
+                       if not (t.is_tentative() and t.time_since_update > 0)
+                       and t.time_since_update <= self.max_age]
+        for d in unmatched_high:
+            self.tracks.append(IouTrack(str(self.next_id), boxes[d], confs[d], self.n_init))
+            self.next_id += 1
+        return list(self.tracks)
+
+    def associate(self, track_idx, det_idx, boxes, confs):
+        """
+        Ghép các track (theo chỉ số) với detection (theo chỉ số) và cập nhật Kalman.
+        Trả về (chỉ số track chưa ghép, set chỉ số detection đã ghép)
+        """
+        if not len(track_idx) or not len(det_idx):
+            return list(track_idx), set()
+        track_boxes = np.array([self.tracks[i].to_ltrb() for i in track_idx])
+        cost = 1.0 - box_iou(track_boxes, boxes[det_idx])
+        pairs = linear_assignment(cost, 1.0 - self.iou_threshold)
+        matched_tracks, matched_dets = set(), set()
+        for r, c in pairs:
+            d = int(det_idx[c])
+            self.tracks[track_idx[r]].update(boxes[d], confs[d])
+            matched_tracks.add(r)
+            matched_dets.add(d)
+        return [t for r, t in enumerate(track_idx) if r not in matched_tracks], matched_dets
+
+    def delete_all_tracks(self):
+        self.tracks = []
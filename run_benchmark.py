@@ -0,0 +1,367 @@
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from functools import partial
+
+import cv2
+
+from recognition.backends import BACKENDS, BACKEND_TORCH
+from recognition.trackers import TRACKERS, TRACKER_DEEPSORT
+from recognition.load_shedding import LoadShedder
+from recognition.models import create_tracker, stride, motion_gate
+from recognition.pipeline import RecognitionPipeline, PLATE_MODES, PLATE_MODE_CASCADE, PLATE_MODE_COMBINED
+from recognition.multicam import MultiCameraPipeline
+from recognition.ocr_pool import OcrPool, OCR_BATCH_SIZE
+from recognition.frame_ring import RingCapture, RING_SLOTS
+from recognition.queues import BLOCK, DROP_NEWEST
+from recognition.metrics import StageMetrics, STAGE_TRACK, peak_rss_mb
+from recognition.plate_recog import box_iou, track_cars
+from recognition.registry import create_registry, VEHICLE, PLATE, OCR
+from recognition.stubs import SyntheticScene, SyntheticCapture, StubOCR, create_stub_models
+
+BENCH_QUEUE_SIZE = 8
+
+
+class LimitedCapture:
+    # Giới hạn số frame đọc từ VideoCapture
+    def __init__(self, cap, max_frames):
+        self.cap = cap
+        self.max_frames = max_frames
+        self.count = 0
+
+    def read(self):
+        if self.max_frames and self.count >= self.max_frames:
+            return False, None
+        self.count += 1
+        return self.cap.read()
+
+    def release(self):
+        self.cap.release()
+
+    def __getattr__(self, name):
+        # get() / recycle() ... của capture gốc (vd. RingCapture)
+        return getattr(self.cap, name)
+
+
+def seed_everything(seed):
+    random.seed(seed)
+    cv2.setRNGSeed(seed)
+    try:
+        import numpy as np
+        np.random.seed(seed)
+    except ImportError:
+        pass
+    try:
+        import torch
+        torch.manual_seed(seed)
+        torch.use_deterministic_algorithms(True, warn_only=True)
+    except ImportError:
+        pass
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def open_capture(source, args):
+    # --ring: decode trên process riêng, frame qua shared memory; file benchmark không bỏ frame
+    if args.ring:
+        return RingCapture(source, slots=RING_SLOTS + BENCH_QUEUE_SIZE, drop=False)
+    return cv2.VideoCapture(source) if isinstance(source, str) else source()
+
+
+def bench_video(path, models, args):
+    cap = open_capture(path, args)
+    if not cap.isOpened():
+        return {"video": path, "error": "không mở được video"}
+    return bench_capture(os.path.basename(path), cap, models, args)
+
+
+def bench_stub(args):
+    # Không cần file model: cảnh giả lập + detector / OCR giả với độ trễ cấu hình được
+    width, height = (int(v) for v in args.stub_size.lower().split("x"))
+    scene = SyntheticScene(width, height, n_cars=args.stub_cars, seed=args.seed or 0)
+    models = create_stub_models(scene, vehicle_ms=args.vehicle_ms, plate_ms=args.plate_ms,
+                                plate_per_image_ms=args.plate_per_image_ms, ocr_ms=args.ocr_ms,
+                                ocr_error_rate=args.ocr_error_rate, seed=args.seed or 0,
+                                combined=args.plate_mode == PLATE_MODE_COMBINED)
+    name = f"synthetic_{width}x{height}_{args.stub_cars}cars"
+    # --ocr-workers: mỗi worker process tạo StubOCR riêng (models[2].calls khi đó luôn 0)
+    ocr_factory = partial(StubOCR, scene, args.ocr_ms, args.ocr_error_rate, args.seed or 0)
+    if args.stub_cameras > 1:
+        caps = [open_capture(partial(SyntheticCapture, scene, args.max_frames or None, args.stub_fps), args)
+                for _ in range(args.stub_cameras)]
+        result = bench_multicam(f"{name}_{args.stub_cameras}cams", caps, models, args, ocr_factory)
+    else:
+        cap = open_capture(partial(SyntheticCapture, scene, args.max_frames or None, args.stub_fps), args)
+        result = bench_capture(name, cap, models, args, ocr_factory)
+    result["stub_calls"] = {"vehicle": models[0].calls, "plate": models[1].calls, "ocr": models[2].calls}
+    return result
+
+
+def bench_trackers(args):
+    """
+    So các tracker trên cảnh giả lập có ground truth: thời gian update_tracks mỗi frame và số lần
+    đổi ID (1 xe thật được gán track_id khác với frame trước). Detection được làm nhiễu tất định
+    theo seed: lệch box `--det-jitter` px, bỏ sót với xác suất `--det-miss`.
+    """
+    width, height = (int(v) for v in args.stub_size.lower().split("x"))
+    scene = SyntheticScene(width, height, n_cars=args.stub_cars, seed=args.seed or 0)
+    frames = min(args.max_frames or scene.length, scene.length)
+
+    results = {}
+    for kind in TRACKERS:
+        rng = random.Random(args.seed or 0)
+        tracker = create_tracker(kind)
+        metrics = StageMetrics()
+        assigned = {}        # car_idx -> track_id lần gần nhất
+        id_switches = 0
+        track_ids = set()
+        for index in range(1, frames + 1):
+            frame = scene.render(index)
+            gt = scene.boxes_at(index)
+            detections, det_cars = [], []
+            for car_idx, (x1, y1, x2, y2), _ in gt:
+                if rng.random() < args.det_miss:
+                    continue
+                j = [rng.uniform(-args.det_jitter, args.det_jitter) for _ in range(4)]
+                detections.append(([x1 + j[0], y1 + j[1], x2 - x1 + j[2], y2 - y1 + j[3]],
+                                   rng.uniform(0.3, 0.95), None))
+                det_cars.append((car_idx, (x1, y1, x2, y2)))
+
+            with metrics.timed(STAGE_TRACK):
+                tracked, _ = track_cars(tracker, detections, frame)
+            if not tracked or not det_cars:
+                continue
+            # Gán track cho xe thật theo IoU lớn nhất (>= 0.5)
+            iou = box_iou([b for _, b in det_cars], [t[1:] for t in tracked])
+            for row, (car_idx, _) in enumerate(det_cars):
+                col = int(iou[row].argmax())
+                if iou[row, col] < 0.5:
+                    continue
+                tid = tracked[col][0]
+                track_ids.add(tid)
+                if car_idx in assigned and assigned[car_idx] != tid:
+                    id_switches += 1
+                assigned[car_idx] = tid
+
+        track = metrics.summary().get(STAGE_TRACK, {})
+        results[kind] = {
+            "frames": frames,
+            "gt_cars": len(assigned),
+            "track_ids": len(track_ids),
+            "id_switches": id_switches,
+            "id_switch_rate": round(id_switches / max(len(assigned), 1), 4),
+            "track_ms": {k: track.get(k) for k in ("mean_ms", "p50_ms", "p90_ms", "p99_ms")},
+        }
+    return results
+
+
+def start_ocr_pool(args, metrics, factory=None):
+    # Worker load model trước khi bắt đầu đo
+    return OcrPool(factory, workers=args.ocr_workers, metrics=metrics).start() if args.ocr_workers else None
+
+
+def bench_capture(name, cap, models, args, ocr_factory=None):
+    vehicle_model, plate_model, ocr = models
+    if args.seed is not None:
+        seed_everything(args.seed)
+
+    metrics = StageMetrics()
+    ocr_pool = start_ocr_pool(args, metrics, ocr_factory)
+    # Thư mục / DB tạm cho mỗi video để lần chạy sau không bị ảnh hưởng bởi dữ liệu cũ
+    with tempfile.TemporaryDirectory(prefix="bench_") as tmp:
+        pipeline = RecognitionPipeline(
+            LimitedCapture(cap, args.max_frames), vehicle_model, plate_model, ocr,
+            create_tracker(args.tracker, frame_stride=stride(args)),
+            db_path=os.path.join(tmp, "plates.db"),
+            saved_cars=os.path.join(tmp, "saved_cars"), saved_plates=os.path.join(tmp, "saved_plates"),
+            # Không bỏ frame; chế độ seed cũng không bỏ job OCR -> mọi lần chạy xử lý cùng một tập dữ liệu
+            capture_policy=BLOCK, frame_queue_size=BENCH_QUEUE_SIZE,
+            ocr_policy=BLOCK if args.seed is not None else DROP_NEWEST,
+            plate_mode=args.plate_mode, vehicle_imgsz=args.vehicle_imgsz, plate_imgsz=args.plate_imgsz,
+            annotate=args.annotate, metrics=metrics, motion_gate=motion_gate(args, cap),
+            load_shedder=LoadShedder(verbose=False) if args.load_shedding else None,
+            ocr_pool=ocr_pool, ocr_batch_size=args.ocr_batch,
+            display_size=display_size(args), display_fps=args.display_fps,
+        )
+        t0 = time.perf_counter()
+        pipeline.start()
+        pipeline.join()
+        elapsed = time.perf_counter() - t0
+        stats = pipeline.stats()
+        if ocr_pool:
+            ocr_pool.close()
+
+    return {
+        "video": name,
+        "frames": stats["frames_processed"],
+        "elapsed_s": round(elapsed, 3),
+        "fps": round(stats["frames_processed"] / max(elapsed, 1e-9), 2),
+        "stages": metrics.summary(),
+        "sizes": metrics.size_summary(),
+        "counters": stats,
+        "quality_history": pipeline.load_shedder.history if pipeline.load_shedder else [],
+    }
+
+
+def bench_multicam(name, caps, models, args, ocr_factory=None):
+    # N camera trong 1 process: frame và crop OCR của mọi camera gom batch chung
+    vehicle_model, plate_model, ocr = models
+    if args.seed is not None:
+        seed_everything(args.seed)
+
+    metrics = StageMetrics()
+    ocr_pool = start_ocr_pool(args, metrics, ocr_factory)
+    with tempfile.TemporaryDirectory(prefix="bench_") as tmp:
+        pipeline = MultiCameraPipeline(
+            [(f"cam-{i}", LimitedCapture(cap, args.max_frames)) for i, cap in enumerate(caps, 1)],
+            vehicle_model, plate_model, ocr, lambda: create_tracker(args.tracker, frame_stride=stride(args)),
+            db_path=os.path.join(tmp, "plates.db"),
+            saved_cars=os.path.join(tmp, "saved_cars"), saved_plates=os.path.join(tmp, "saved_plates"),
+            capture_policy=BLOCK, frame_queue_size=BENCH_QUEUE_SIZE,
+            ocr_policy=BLOCK if args.seed is not None else DROP_NEWEST, ocr_batch_size=args.ocr_batch,
+            ocr_pool=ocr_pool,
+            plate_mode=args.plate_mode, vehicle_imgsz=args.vehicle_imgsz, plate_imgsz=args.plate_imgsz,
+            annotate=args.annotate, metrics=metrics, motion_gate_factory=lambda cap: motion_gate(args, cap),
+            load_shedder_factory=(lambda: LoadShedder(verbose=False)) if args.load_shedding else None,
+        )
+        t0 = time.perf_counter()
+        pipeline.start()
+        pipeline.join()
+        elapsed = time.perf_counter() - t0
+        stats = pipeline.stats()
+        if ocr_pool:
+            ocr_pool.close()
+
+    return {
+        "video": name,
+        "frames": stats["frames_processed"],
+        "elapsed_s": round(elapsed, 3),
+        "fps": round(stats["frames_processed"] / max(elapsed, 1e-9), 2),
+        "stages": metrics.summary(),
+        "sizes": metrics.size_summary(),
+        "counters": stats,
+        "quality_history": {c.name: c.load_shedder.history for c in pipeline.cameras if c.load_shedder},
+    }
+
+
+def display_size(args):
+    return tuple(int(v) for v in args.display_size.lower().split("x")) if args.display_size else None
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Benchmark pipeline nhận diện trên các video ghi sẵn")
+    p.add_argument("videos", nargs="*", help="các file video")
+    p.add_argument("--out", help="ghi kết quả JSON ra file (mặc định in ra màn hình)")
+    p.add_argument("--seed", type=int, help="chế độ cố định seed, không drop frame / OCR để so sánh giữa các lần chạy")
+    p.add_argument("--max-frames", type=int, default=0, help="số frame tối đa mỗi video (0 = hết video)")
+    p.add_argument("--plate-mode", choices=PLATE_MODES, default=PLATE_MODE_CASCADE,
+                   help="cascade: plate model trên crop xe; full: toàn frame; shared: toàn frame, 2 model "
+                        "chung 1 tensor đã preprocess; combined: 1 model gộp xe + biển số")
+    p.add_argument("--vehicle-imgsz", type=int, default=480)
+    p.add_argument("--plate-imgsz", type=int, default=320)
+    p.add_argument("--backend", choices=BACKENDS, default=BACKEND_TORCH,
+                   help="runtime cho model YOLO (onnx / openvino: CPU, tự export .onnx nếu chưa có)")
+    p.add_argument("--int8", action="store_true", help="dùng model ONNX đã quantize INT8")
+    p.add_argument("--threads", type=int, default=0, help="số thread inference (0 = runtime tự chọn)")
+    p.add_argument("--tracker", choices=TRACKERS, default=TRACKER_DEEPSORT,
+                   help="deepsort (appearance embedding) hoặc iou (Kalman + IoU, nhẹ hơn)")
+    p.add_argument("--motion-gate", action="store_true", help="bỏ qua detector / tracker khi cảnh tĩnh")
+    p.add_argument("--idle-fps", type=float, default=1.0, help="tốc độ xử lý khi cảnh tĩnh (với --motion-gate)")
+    p.add_argument("--active-stride", type=int, default=1,
+                   help="khi có xe: xử lý 1 trong bấy nhiêu frame (với --motion-gate)")
+    p.add_argument("--load-shedding", action="store_true",
+                   help="tự giảm chất lượng (input size, OCR, Haar cascade) khi độ trễ frame tăng cao")
+    p.add_argument("--annotate", action="store_true", help="tính cả chi phí vẽ annotation")
+    p.add_argument("--display-size", help="với --annotate: resize frame hiển thị như GUI, vd. 800x450")
+    p.add_argument("--display-fps", type=float, default=0,
+                   help="với --annotate: số frame hiển thị tối đa / giây như GUI (0 = mọi frame)")
+    p.add_argument("--ring", action="store_true",
+                   help="decode trên process riêng cho mỗi nguồn, frame qua shared memory ring")
+    p.add_argument("--ocr-batch", type=int, default=OCR_BATCH_SIZE, help="số crop tối đa mỗi lần gọi OCR")
+    p.add_argument("--ocr-workers", type=int, default=0, help="số process OCR (0 = OCR trên thread của pipeline)")
+
+    stub = p.add_argument_group("stub", "chạy không cần model: đo chi phí phần Python của pipeline")
+    stub.add_argument("--stub", action="store_true", help="dùng cảnh giả lập và model giả")
+    stub.add_argument("--stub-size", default="1280x720")
+    stub.add_argument("--stub-cars", type=int, default=50)
+    stub.add_argument("--stub-cameras", type=int, default=1,
+                      help="số camera giả lập chạy chung 1 process (> 1: batch frame / OCR qua các camera)")
+    stub.add_argument("--stub-fps", type=float, default=0, help="giới hạn tốc độ đọc frame (0 = nhanh nhất)")
+    stub.add_argument("--vehicle-ms", type=float, default=0.0, help="độ trễ giả của vehicle model / lần gọi")
+    stub.add_argument("--plate-ms", type=float, default=0.0, help="độ trễ giả của plate model / lần gọi")
+    stub.add_argument("--plate-per-image-ms", type=float, default=0.0, help="độ trễ thêm / ảnh trong batch")
+    stub.add_argument("--ocr-ms", type=float, default=0.0, help="độ trễ giả của OCR / lần gọi")
+    stub.add_argument("--ocr-error-rate", type=float, default=0.1, help="tỉ lệ OCR giả đọc sai 1 ký tự")
+    stub.add_argument("--compare-trackers", action="store_true",
+                      help="so tốc độ / số lần đổi ID của các tracker trên cảnh giả lập")
+    stub.add_argument("--det-jitter", type=float, default=4.0, help="độ lệch box giả (px) khi so tracker")
+    stub.add_argument("--det-miss", type=float, default=0.05, help="tỉ lệ bỏ sót detection khi so tracker")
+
+    args = p.parse_args()
+    if not args.videos and not args.stub and not args.compare_trackers:
+        p.error("cần ít nhất 1 video, --stub hoặc --compare-trackers")
+    return args
+
+
+def main():
+    args = parse_args()
+    if args.seed is not None:
+        seed_everything(args.seed)
+
+    results = []
+    registry = None
+    if args.videos:
+        # Load + warm-up từng model trước khi đo để lần suy luận đầu không làm lệch số liệu
+        registry = create_registry(backend=args.backend, int8=args.int8, threads=args.threads,
+                                   vehicle_imgsz=args.vehicle_imgsz, plate_imgsz=args.plate_imgsz,
+                                   tracker=args.tracker, combined=args.plate_mode == PLATE_MODE_COMBINED,
+                                   tracker_stride=stride(args))
+        models = (registry.get(VEHICLE), registry.get(PLATE), None if args.ocr_workers else registry.get(OCR))
+        results += [bench_video(path, models, args) for path in args.videos]
+    if args.stub:
+        results.append(bench_stub(args))
+    trackers = bench_trackers(args) if args.compare_trackers else None
+
+    report = {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "opencv": cv2.__version__,
+            "args": vars(args),
+        },
+        "model_load_s": registry.startup_s() if registry else None,
+        "model_load": registry.timings() if registry else None,
+        "videos": results,
+        "total_frames": sum(r.get("frames", 0) for r in results),
+        "total_fps": round(sum(r.get("frames", 0) for r in results)
+                           / max(sum(r.get("elapsed_s", 0) for r in results), 1e-9), 2),
+        "trackers": trackers,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+    text = json.dumps(report, indent=2, sort_keys=True, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import argparse
+import json
+
+import cv2
+
+from recognition.backends import (BACKEND_ONNX, BACKEND_OPENVINO, DEFAULT_IMGSZ, YoloOnnxDetector,
+                                  export_onnx, onnx_path_for, parity_check)
+from recognition.models import VEHICLE_MODEL_PATH, PLATE_MODEL_PATH
+
+
+def sample_frames(video, count, step):
+    """
+    Lấy `count` frame cách nhau `step` frame từ video, dùng cho calibration INT8 và kiểm tra parity
+    """
+    cap = cv2.VideoCapture(video)
+    frames, index = [], 0
+    while len(frames) < count:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        if index % step == 0:
+            frames.append(frame)
+        index += 1
+    cap.release()
+    return frames
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Export model YOLO sang ONNX (FP32 / INT8) và so kết quả với PyTorch")
+    p.add_argument("--model", choices=["vehicle", "plate", "all"], default="all")
+    p.add_argument("--vehicle-imgsz", type=int, default=480)
+    p.add_argument("--plate-imgsz", type=int, default=320)
+    p.add_argument("--int8", action="store_true", help="quantize thêm bản INT8")
+    p.add_argument("--video", help="video mẫu: frame calibration cho INT8 và frame kiểm tra parity")
+    p.add_argument("--frames", type=int, default=50, help="số frame mẫu lấy từ video")
+    p.add_argument("--step", type=int, default=10, help="lấy 1 frame mỗi `step` frame")
+    p.add_argument("--parity", action="store_true", help="so box của ONNX với PyTorch trên frame mẫu")
+    p.add_argument("--backend", choices=[BACKEND_ONNX, BACKEND_OPENVINO], default=BACKEND_ONNX,
+                   help="runtime dùng khi kiểm tra parity")
+    p.add_argument("--threads", type=int, default=0)
+    args = p.parse_args()
+    if args.parity and not args.video:
+        p.error("--parity cần --video")
+    return args
+
+
+def main():
+    args = parse_args()
+    frames = sample_frames(args.video, args.frames, args.step) if args.video else []
+
+    models = []
+    if args.model in ("vehicle", "all"):
+        models.append(("vehicle", VEHICLE_MODEL_PATH, args.vehicle_imgsz))
+    if args.model in ("plate", "all"):
+        models.append(("plate", PLATE_MODEL_PATH, args.plate_imgsz))
+
+    report = {}
+    for name, pt_path, imgsz in models:
+        path = export_onnx(pt_path, imgsz=imgsz or DEFAULT_IMGSZ, int8=args.int8, calibration_frames=frames)
+        entry = {"onnx": onnx_path_for(pt_path), "path": path}
+        if args.parity:
+            from ultralytics import YOLO
+
+            reference = YOLO(pt_path)
+            candidate = YoloOnnxDetector(path, args.backend, imgsz, args.threads)
+            entry["parity"] = parity_check(reference, candidate, frames, imgsz)
+        report[name] = entry
+        print(f"{name}: {path}", flush=True)
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
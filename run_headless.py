@@ -0,0 +1,243 @@
+import argparse
+import json
+import threading
+import time
+
+import cv2
+
+from recognition.backends import BACKENDS, BACKEND_TORCH
+from recognition.trackers import TRACKERS, TRACKER_DEEPSORT
+from recognition.load_shedding import LoadShedder
+from recognition.pipeline import RecognitionPipeline, PLATE_MODES, PLATE_MODE_CASCADE, PLATE_MODE_COMBINED
+from recognition.multicam import MultiCameraPipeline
+from recognition.ocr_pool import OcrPool, OCR_BATCH_SIZE
+from recognition.models import create_tracker, stride, motion_gate
+from recognition.frame_ring import RingCapture, RING_SLOTS
+from recognition.queues import DROP_OLDEST, BLOCK
+from recognition.registry import create_registry, VEHICLE, PLATE, OCR, TRACKER
+from recognition.owner_index import OwnerIndex
+from recognition.parking import ParkingSessions, GATE_DIRECTIONS, GATE_BOTH
+from recognition.db_writer import LogWriter
+
+
+class JsonlSink:
+    """
+    Ghi mỗi biển số được log thành 1 dòng JSON (gọi từ nhiều thread của pipeline)
+    """
+
+    def __init__(self, path):
+        self.f = open(path, "a", encoding="utf-8")
+        self.lock = threading.Lock()
+        self.count = 0
+
+    def __call__(self, event):
+        line = json.dumps(event, ensure_ascii=False)
+        with self.lock:
+            self.f.write(line + "\n")
+            self.f.flush()
+            self.count += 1
+
+    def close(self):
+        self.f.close()
+
+
+def is_live(source):
+    return source.isdigit() or source.lower().startswith(("rtsp://", "rtmp://", "http://", "https://"))
+
+
+def open_source(source, ring=False, queue_size=1, drop_frames=False):
+    """
+    Camera index ("0"), RTSP/HTTP URL hoặc file video. Trả về (cap, live).
+    ring: decode trên process riêng vào ring frame shared memory (RingCapture)
+    """
+    live = is_live(source)
+    if ring:
+        # Đủ slot cho frame_queue + frame đang detect + frame đang decode
+        return RingCapture(source, slots=RING_SLOTS + queue_size, drop=live or drop_frames), live
+    if source.isdigit():
+        return cv2.VideoCapture(int(source)), True
+    return cv2.VideoCapture(source), live
+
+
+def gate_names(args):
+    # Nhiều nguồn: "--gate a,b" cho từng nguồn, hoặc 1 tên -> "<tên>-1", "<tên>-2", ...
+    names = args.gate.split(",")
+    if len(names) == len(args.source):
+        return names
+    if len(names) == 1:
+        return [f"{names[0]}-{i}" for i in range(1, len(args.source) + 1)]
+    raise SystemExit(f"--gate có {len(names)} tên nhưng có {len(args.source)} nguồn video")
+
+
+def gate_directions(args):
+    # "--gate-dirs in,out" cho từng cổng theo thứ tự --gate, hoặc 1 hướng cho mọi cổng
+    gates = gate_names(args) if len(args.source) > 1 else [args.gate]
+    dirs = args.gate_dirs.split(",")
+    if len(dirs) == 1:
+        dirs = dirs * len(gates)
+    if len(dirs) != len(gates) or any(d not in GATE_DIRECTIONS for d in dirs):
+        raise SystemExit(f"--gate-dirs phải là {len(gates)} giá trị trong {', '.join(GATE_DIRECTIONS)}")
+    return dict(zip(gates, dirs))
+
+
+def queue_size(args):
+    return 1 if args.drop_frames or any(is_live(s) for s in args.source) else 8
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Nhận diện biển số không cần GUI (video file / RTSP / camera)")
+    p.add_argument("source", nargs="+",
+                   help="đường dẫn video, URL RTSP hoặc số thứ tự camera; nhiều nguồn -> 1 process, "
+                        "frame / crop OCR của mọi camera gom batch chung")
+    p.add_argument("--db", default="plates.db", help="SQLite plates.db (mặc định: plates.db)")
+    p.add_argument("--no-db", action="store_true", help="không ghi SQLite")
+    p.add_argument("--jsonl", help="ghi các biển số nhận diện được ra file JSONL")
+    p.add_argument("--owner-db", help="DB Xe-Nguoi-DonVi (vd. baigiuxe.db): ghi kèm chủ xe / đơn vị mỗi biển số")
+    p.add_argument("--parking", action="store_true",
+                   help="ghép biển số thành phiên gửi xe vào / ra (bảng parking_sessions), đếm xe trong bãi")
+    p.add_argument("--gate-dirs", default=GATE_BOTH,
+                   help="hướng của từng cổng theo thứ tự --gate: in / out / both (mặc định both)")
+    p.add_argument("--overstay-h", type=float, default=12.0, help="cảnh báo xe ở trong bãi quá bấy nhiêu giờ")
+    p.add_argument("--gate", default="gate-1", help="tên cổng (nhiều nguồn: các tên cách nhau dấu phẩy)")
+    p.add_argument("--ocr-batch", type=int, default=OCR_BATCH_SIZE, help="số crop tối đa mỗi lần gọi OCR")
+    p.add_argument("--ocr-workers", type=int, default=0,
+                   help="số process OCR (0 = OCR trên thread của pipeline); dùng chung cho mọi nguồn")
+    p.add_argument("--plate-mode", choices=PLATE_MODES, default=PLATE_MODE_CASCADE,
+                   help="cascade: plate model trên crop xe; full: toàn frame; shared: toàn frame, 2 model "
+                        "chung 1 tensor đã preprocess; combined: 1 model gộp xe + biển số")
+    p.add_argument("--vehicle-imgsz", type=int, default=480)
+    p.add_argument("--plate-imgsz", type=int, default=320)
+    p.add_argument("--backend", choices=BACKENDS, default=BACKEND_TORCH,
+                   help="runtime cho model YOLO (onnx / openvino: CPU, tự export .onnx nếu chưa có)")
+    p.add_argument("--int8", action="store_true", help="dùng model ONNX đã quantize INT8")
+    p.add_argument("--threads", type=int, default=0, help="số thread inference (0 = runtime tự chọn)")
+    p.add_argument("--tracker", choices=TRACKERS, default=TRACKER_DEEPSORT,
+                   help="deepsort (appearance embedding) hoặc iou (Kalman + IoU, nhẹ hơn)")
+    p.add_argument("--motion-gate", action="store_true", help="bỏ qua detector / tracker khi cảnh tĩnh")
+    p.add_argument("--idle-fps", type=float, default=1.0, help="tốc độ xử lý khi cảnh tĩnh (với --motion-gate)")
+    p.add_argument("--active-stride", type=int, default=1,
+                   help="khi có xe: xử lý 1 trong bấy nhiêu frame (với --motion-gate)")
+    p.add_argument("--load-shedding", action="store_true",
+                   help="tự giảm chất lượng (input size, OCR, Haar cascade) khi độ trễ frame tăng cao")
+    p.add_argument("--saved-cars", default="saved_cars")
+    p.add_argument("--saved-plates", default="saved_plates")
+    p.add_argument("--jpeg-quality", type=int, default=90)
+    p.add_argument("--ring", action="store_true",
+                   help="decode mỗi nguồn trên 1 process riêng, frame truyền qua shared memory (không pickle)")
+    p.add_argument("--drop-frames", action="store_true",
+                   help="bỏ frame khi xử lý không kịp (mặc định bật với camera / RTSP, tắt với file)")
+    return p.parse_args()
+
+
+def create_pipeline(args, sources, models, sink, ocr_pool, owner_index=None, log_writer=None, on_gate=None):
+    # File lưu trữ: xử lý đủ mọi frame, nhanh nhất có thể. Live: chỉ giữ frame mới nhất
+    drop = any(live for _, live in sources) or args.drop_frames
+    common = dict(
+        db_path=None if args.no_db else args.db,
+        saved_cars=args.saved_cars, saved_plates=args.saved_plates,
+        capture_policy=DROP_OLDEST if drop else BLOCK, frame_queue_size=queue_size(args),
+        plate_mode=args.plate_mode, vehicle_imgsz=args.vehicle_imgsz, plate_imgsz=args.plate_imgsz,
+        jpeg_quality=args.jpeg_quality, annotate=False, on_plate=sink, on_gate=on_gate,
+        ocr_pool=ocr_pool, ocr_batch_size=args.ocr_batch, owner_index=owner_index, log_writer=log_writer,
+    )
+    if len(sources) == 1:
+        cap = sources[0][0]
+        return RecognitionPipeline(
+            cap, models.get(VEHICLE), models.get(PLATE), ocr(models, ocr_pool), models.get(TRACKER),
+            gate=args.gate, motion_gate=motion_gate(args, cap),
+            load_shedder=LoadShedder() if args.load_shedding else None, **common,
+        )
+    # Nhiều camera: 1 bộ model, mỗi camera 1 tracker riêng
+    return MultiCameraPipeline(
+        list(zip(gate_names(args), [cap for cap, _ in sources])),
+        models.get(VEHICLE), models.get(PLATE), ocr(models, ocr_pool),
+        lambda: create_tracker(args.tracker, frame_stride=stride(args)),
+        motion_gate_factory=lambda cap: motion_gate(args, cap),
+        load_shedder_factory=LoadShedder if args.load_shedding else None, **common,
+    )
+
+
+def ocr(models, ocr_pool):
+    # Có OcrPool thì model OCR chỉ load trong các worker process
+    return None if ocr_pool else models.get(OCR)
+
+
+def quality_history(pipeline):
+    if isinstance(pipeline, MultiCameraPipeline):
+        return {c.name: c.load_shedder.history for c in pipeline.cameras if c.load_shedder}
+    return pipeline.load_shedder.history if pipeline.load_shedder else []
+
+
+def main():
+    args = parse_args()
+
+    sources = []
+    for source in args.source:
+        cap, live = open_source(source, args.ring, queue_size(args), args.drop_frames)
+        if not cap.isOpened():
+            raise SystemExit(f"Không mở được nguồn video: {source}")
+        sources.append((cap, live))
+
+    models = create_registry(backend=args.backend, int8=args.int8, threads=args.threads,
+                             vehicle_imgsz=args.vehicle_imgsz, plate_imgsz=args.plate_imgsz,
+                             tracker=args.tracker, combined=args.plate_mode == PLATE_MODE_COMBINED,
+                             tracker_stride=stride(args))
+    models.load_all([VEHICLE, PLATE, TRACKER] if args.ocr_workers else None)
+    print(f"Startup: {models.startup_s():.2f}s {json.dumps(models.timings())}", flush=True)
+    ocr_pool = None
+    if args.ocr_workers:
+        t0 = time.perf_counter()
+        ocr_pool = OcrPool(workers=args.ocr_workers).start()
+        print(f"OCR workers: {args.ocr_workers} ({time.perf_counter() - t0:.2f}s)", flush=True)
+    owner_index = None
+    if args.owner_db:
+        owner_index = OwnerIndex(args.owner_db)
+        print(f"Owner DB: {len(owner_index)} xe", flush=True)
+    sink = JsonlSink(args.jsonl) if args.jsonl else None
+    parking, log_writer = None, None
+    if args.parking:
+        # Phiên gửi xe ghi chung LogWriter với plate_logs; mở lại các phiên chưa ra từ lần chạy trước
+        log_writer = None if args.no_db else LogWriter(args.db)
+        parking = ParkingSessions(gate_directions(args), args.overstay_h * 3600, log_writer=log_writer)
+        if log_writer:
+            print(f"Parking: {parking.load(args.db)} xe đang trong bãi", flush=True)
+    # Phiên gửi xe nhận mọi track đã chốt biển số, không qua chống trùng của plate_logs
+    pipeline = create_pipeline(args, sources, models, sink, ocr_pool, owner_index, log_writer, parking)
+
+    t0 = time.perf_counter()
+    pipeline.start()
+    try:
+        while pipeline.is_alive():
+            pipeline.join(timeout=5)
+            stats = pipeline.stats()
+            elapsed = time.perf_counter() - t0
+            print(f"[{elapsed:7.1f}s] frames={stats['frames_processed']} "
+                  f"fps={stats['frames_processed'] / max(elapsed, 1e-6):.1f} "
+                  f"skipped={stats['frames_skipped']} ocr={stats['ocr_calls']} db_rows={stats['db_rows']}"
+                  + (f" inside={parking.occupancy()}" if parking else ""), flush=True)
+            if parking:
+                parking.check()
+    except KeyboardInterrupt:
+        print("Đang dừng...")
+        pipeline.stop()
+        pipeline.join()
+    finally:
+        if sink:
+            sink.close()
+        if ocr_pool:
+            ocr_pool.close()
+        if log_writer:
+            log_writer.close()
+
+    elapsed = time.perf_counter() - t0
+    stats = pipeline.stats()
+    print(json.dumps({"elapsed_s": round(elapsed, 2),
+                      "fps": round(stats["frames_processed"] / max(elapsed, 1e-6), 2),
+                      **stats,
+                      "quality_history": quality_history(pipeline),
+                      **({"parking": parking.stats()} if parking else {})},
+                     indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
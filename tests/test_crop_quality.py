@@ -0,0 +1,36 @@
+from recognition.crop_quality import BestCropSelector
+from recognition.ocr_cache import PlateVoteCache, OCR_MIN_VOTES
+
+
+def sight(selector, track_id, score):
+    # Như RecognitionPipeline.finish_frame: wants() mỗi lần thấy, add() khi wants() trả về True
+    if not selector.wants(track_id, score):
+        return None
+    return selector.add(track_id, {"car_id": track_id, "score": score})
+
+
+def test_constant_quality_keeps_sending_ocr():
+    selector = BestCropSelector(buffer_size=5, window=5)
+    jobs = [job for job in (sight(selector, 1, 0.5) for _ in range(200)) if job is not None]
+    assert len(jobs) == min(200 // 5, selector.max_ocr)
+
+
+def test_waiting_car_gets_final_plate():
+    # Xe đứng chờ barrier, chất lượng crop không đổi: đủ OCR_MIN_VOTES lần đọc khớp thì chốt biển số
+    selector = BestCropSelector(buffer_size=5, window=5)
+    cache = PlateVoteCache()
+    final = False
+    for _ in range(5 * OCR_MIN_VOTES):
+        if sight(selector, 1, 0.5) is not None:
+            _, final = cache.add(1, "51F12345")
+    assert final
+
+
+def test_window_counts_rejected_sightings():
+    selector = BestCropSelector(buffer_size=2, window=4)
+    for score in (0.9, 0.8):
+        assert sight(selector, 1, score) is None
+    # 2 crop kém hơn không vào buffer nhưng vẫn được đếm: lần thứ 4 gửi crop tốt nhất
+    assert sight(selector, 1, 0.1) is None
+    job = sight(selector, 1, 0.1)
+    assert job is not None and job["score"] == 0.9
@@ -0,0 +1,69 @@
+import sqlite3
+
+from recognition.db_writer import LogWriter, INSERT_SQL, PLATE_LOGS
+
+ROW = (1, "51F12345", None, None, None, "20261001_060000", None)
+
+
+class FlakyConn:
+    """
+    Connection thật, nhưng `fails` lần đầu commit lỗi `error` (như khi process khác đang giữ khóa ghi)
+    """
+
+    def __init__(self, path, fails, error="database is locked"):
+        self.conn = sqlite3.connect(path)
+        self.fails = fails
+        self.error = error
+
+    def __enter__(self):
+        return self.conn.__enter__()
+
+    def __exit__(self, *exc):
+        if exc[0] is None and self.fails:
+            self.fails -= 1
+            self.conn.rollback()
+            raise sqlite3.OperationalError(self.error)
+        return self.conn.__exit__(*exc)
+
+    def executemany(self, sql, rows):
+        return self.conn.executemany(sql, rows)
+
+
+def pending_rows():
+    pending = {table: [] for table in INSERT_SQL}
+    pending[PLATE_LOGS].append(ROW)
+    return pending
+
+
+def count_rows(path):
+    return sqlite3.connect(path).execute("SELECT COUNT(*) FROM plate_logs").fetchone()[0]
+
+
+def test_locked_db_is_retried(tmp_path):
+    path = str(tmp_path / "plates.db")
+    writer = LogWriter(path, retries=3, retry_ms=1)
+    assert writer.write_batch(FlakyConn(path, fails=2), pending_rows(), 1) == 0
+    writer.close()
+    assert count_rows(path) == 1 and writer.rows_dropped == 0
+
+
+def test_rows_kept_while_db_stays_locked(tmp_path):
+    path = str(tmp_path / "plates.db")
+    writer = LogWriter(path, retries=1, retry_ms=1)
+    pending = pending_rows()
+    conn = FlakyConn(path, fails=3)
+    # Hết lượt thử: giữ dòng cho lần flush sau, lần sau ghi được
+    assert writer.write_batch(conn, pending, 1) == 1
+    assert pending[PLATE_LOGS] == [ROW]
+    assert writer.write_batch(conn, pending, 1) == 0
+    writer.close()
+    assert count_rows(path) == 1
+
+
+def test_other_errors_drop_the_batch(tmp_path):
+    path = str(tmp_path / "plates.db")
+    writer = LogWriter(path, retry_ms=1)
+    pending = pending_rows()
+    assert writer.write_batch(FlakyConn(path, fails=1, error="no such table: plate_logs"), pending, 1) == 0
+    writer.close()
+    assert pending[PLATE_LOGS] == [] and writer.rows_dropped == 1 and count_rows(path) == 0
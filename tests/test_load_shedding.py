@@ -0,0 +1,50 @@
+from recognition.load_shedding import LoadShedder, QUALITY_LEVELS, available_levels, scaled_imgsz
+
+
+def no_cascade():
+    raise RuntimeError("Bản OpenCV này không có CascadeClassifier")
+
+
+def test_haar_level_dropped_without_cascade():
+    levels = available_levels(load_cascade=no_cascade)
+    assert levels and not any(level.haar for level in levels)
+    assert available_levels(load_cascade=lambda: object()) == QUALITY_LEVELS
+
+
+def test_sheds_one_level_per_cooldown():
+    shedder = LoadShedder(levels=QUALITY_LEVELS, cooldown=5, verbose=False)
+    changes = [shedder.update(1.0) for _ in range(12)]
+    # Quá tải liên tục: giảm 1 bậc, chờ cooldown frame rồi mới giảm tiếp
+    assert [i for i, level in enumerate(changes) if level is not None] == [4, 9]
+    assert shedder.index == 2
+    assert [(e["from"], e["to"]) for e in shedder.history] == [
+        (QUALITY_LEVELS[0].name, QUALITY_LEVELS[1].name), (QUALITY_LEVELS[1].name, QUALITY_LEVELS[2].name)]
+
+
+def test_queue_fill_counts_as_overload():
+    shedder = LoadShedder(levels=QUALITY_LEVELS, cooldown=1, verbose=False)
+    assert shedder.update(0.01, queue_fill=0.9) == QUALITY_LEVELS[1]
+
+
+def test_recovers_after_calm_frames():
+    shedder = LoadShedder(levels=QUALITY_LEVELS, cooldown=1, recover=10, alpha=1.0, verbose=False)
+    shedder.update(1.0)
+    assert shedder.index == 1
+    for _ in range(9):
+        assert shedder.update(0.01) is None
+    assert shedder.update(0.01) == QUALITY_LEVELS[0]
+
+
+def test_stays_on_last_level():
+    levels = QUALITY_LEVELS[:2]
+    shedder = LoadShedder(levels=levels, cooldown=1, verbose=False)
+    for _ in range(10):
+        shedder.update(1.0)
+    assert shedder.level == levels[-1] and len(shedder.history) == 1
+
+
+def test_scaled_imgsz_keeps_stride():
+    assert scaled_imgsz(640, 1.0) == 640
+    assert scaled_imgsz(640, 0.75) == 480
+    assert scaled_imgsz(None, 0.5) == 320
+    assert scaled_imgsz(100, 0.1) == 32
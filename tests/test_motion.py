@@ -0,0 +1,53 @@
+import numpy as np
+
+from recognition.motion import MotionGate, scaled_max_age, DEFAULT_FPS
+
+
+def still_frame():
+    return np.full((120, 160, 3), 30, dtype=np.uint8)
+
+
+def moving_frame(i):
+    frame = still_frame()
+    x = (i * 8) % 140
+    frame[40:80, x:x + 20] = 200
+    return frame
+
+
+def processed(gate, frames, has_tracks=False):
+    return [i for i, frame in enumerate(frames) if gate.should_process(frame, has_tracks)]
+
+
+def test_still_scene_uses_idle_stride():
+    gate = MotionGate(idle_stride=5, hold=0)
+    assert processed(gate, [still_frame()] * 21) == [4, 9, 14, 19]
+    assert gate.skipped == 17
+
+
+def test_motion_processes_every_active_stride():
+    gate = MotionGate(idle_stride=25, active_stride=2, hold=1)
+    assert processed(gate, [moving_frame(i) for i in range(10)]) == [1, 3, 5, 7, 9]
+
+
+def test_tracks_keep_active_stride_in_still_scene():
+    gate = MotionGate(idle_stride=25, active_stride=1, hold=0)
+    assert processed(gate, [still_frame()] * 5, has_tracks=True) == [0, 1, 2, 3, 4]
+
+
+def test_hold_after_motion():
+    gate = MotionGate(idle_stride=25, hold=3)
+    # Frame đầu khởi tạo nền (coi như có chuyển động). Chuyển động ở frame 5: xử lý `hold` frame kể từ đó
+    # rồi về idle_stride
+    frames = [still_frame()] * 5 + [moving_frame(1)] + [still_frame()] * 6
+    assert processed(gate, frames) == [0, 1, 2, 5, 6, 7]
+
+
+def test_for_fps():
+    assert MotionGate.for_fps(30, idle_fps=2).idle_stride == 15
+    assert MotionGate.for_fps(0).idle_stride == int(DEFAULT_FPS)
+
+
+def test_scaled_max_age():
+    assert scaled_max_age(30, 1) == 30
+    assert scaled_max_age(30, 4) == 8
+    assert scaled_max_age(1, 4) == 1
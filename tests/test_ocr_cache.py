@@ -0,0 +1,59 @@
+from recognition.ocr_cache import PlateVoteCache
+
+
+def test_votes_until_final():
+    cache = PlateVoteCache(min_votes=3)
+    assert cache.add(1, "51F12345") == ("51F12345", False)
+    # 1 lần đọc sai 1 ký tự: vote từng ký tự vẫn ra biển số đúng
+    cache.add(1, "51F12845")
+    assert cache.add(1, "51F12345") == ("51F12345", False)
+    text, final = cache.add(1, "51F12345")
+    assert text == "51F12345" and final
+    assert not cache.should_read(1) and cache.ocr_skipped == 1
+    # get() không đếm ocr_skipped
+    assert cache.get(1) == ("51F12345", True) and cache.ocr_skipped == 1
+
+
+def test_max_reads_finalizes():
+    cache = PlateVoteCache(min_votes=3, max_reads=4)
+    for text in ("30A11111", "30A22222", "30A33333"):
+        assert not cache.add(1, text)[1]
+    assert cache.add(1, "30A44444")[1]
+
+
+def test_expire_returns_removed_tracks():
+    cache = PlateVoteCache(min_votes=1)
+    cache.add(1, "51F12345")
+    cache.add(2, "30A12345")
+    assert cache.expire({2}) == [(1, "51F12345", True)]
+    assert cache.get(1) == (None, False) and cache.get(2) == ("30A12345", True)
+
+
+def test_mark_logged_once_per_track():
+    cache = PlateVoteCache(min_votes=1)
+    cache.add(1, "51F12345")
+    assert cache.mark_logged(1)
+    assert not cache.mark_logged(1)
+    # Bit đã ghi log còn sau khi track bị xóa: kết quả OCR tới muộn không tạo lại track
+    cache.expire(set())
+    assert not cache.mark_logged(1)
+    assert cache.add(1, "51F12345") == (None, False)
+    assert cache.get(1) == (None, False)
+
+
+def test_mark_logged_after_expire():
+    # log_expired: track bị xóa trước khi ghi log vẫn chỉ ghi được 1 lần
+    cache = PlateVoteCache()
+    cache.add(1, "51F12345")
+    cache.expire(set())
+    assert cache.mark_logged(1)
+    assert not cache.mark_logged(1)
+
+
+def test_logged_memory_is_bounded():
+    cache = PlateVoteCache(min_votes=1, logged_memory=2)
+    for tid in (1, 2, 3):
+        cache.add(tid, "51F12345")
+        cache.mark_logged(tid)
+    cache.expire(set())
+    assert list(cache.logged) == [2, 3]
@@ -0,0 +1,36 @@
+import queue
+import threading
+import time
+
+from recognition.ocr_pool import OcrPool
+
+
+class DeadProcess:
+    name = "ocr-worker-0"
+
+    def is_alive(self):
+        return False
+
+
+def test_late_result_after_fail_pending_is_skipped():
+    pool = OcrPool(workers=1)
+    pool.jobs, pool.results = queue.Queue(), queue.Queue()
+    pool.processes = [DeadProcess()]
+    got = []
+    pool.submit(["a"], [None], lambda key, text: got.append((key, text)))
+    pool.fail_pending()
+    assert got == [("a", None)]
+
+    # Kết quả của batch đã bỏ tới muộn, sau đó 1 batch mới: thread kết quả vẫn chạy tiếp
+    pool.submit(["b"], [None], lambda key, text: got.append((key, text)))
+    pool.results.put((0, ["late"], 0.0))
+    pool.results.put((1, ["51F12345"], 0.0))
+    pool.running = True
+    thread = threading.Thread(target=pool.result_loop, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 5
+    while len(got) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    pool.running = False
+    thread.join(timeout=5)
+    assert got == [("a", None), ("b", "51F12345")]
@@ -0,0 +1,46 @@
+import sqlite3
+
+from recognition.db_writer import LogWriter
+from recognition.owner_index import OwnerIndex, owner_text
+from recognition.pipeline import RecognitionPipeline
+
+
+def make_registry(path):
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE DonVi (id INTEGER PRIMARY KEY, ten TEXT, cap TEXT, parent_id INTEGER);
+        CREATE TABLE Nguoi (id INTEGER PRIMARY KEY, ten TEXT, anh_mat TEXT, don_vi_id INTEGER);
+        CREATE TABLE Xe (id INTEGER PRIMARY KEY, bien_so TEXT, nguoi_id INTEGER);
+        INSERT INTO DonVi VALUES (1, 'K1', '', NULL);
+        INSERT INTO Nguoi VALUES (1, 'A', 'registry_face.jpg', 1);
+        INSERT INTO Xe VALUES (1, '30A-123.45', 1);
+    """)
+    conn.commit()
+    conn.close()
+
+
+def test_confusable_characters_match_exactly(tmp_path):
+    make_registry(tmp_path / "xe.db")
+    index = OwnerIndex(str(tmp_path / "xe.db"))
+    owner = index.lookup("3OA12345")
+    assert owner.name == "A" and owner.distance == 0
+
+
+def test_unregistered_plate_one_digit_away_has_no_owner(tmp_path):
+    make_registry(tmp_path / "xe.db")
+    assert OwnerIndex(str(tmp_path / "xe.db")).lookup("30A12346") is None
+    # Bật khớp gần đúng: kết quả mang distance, hiển thị kèm biển số trong DB
+    owner = OwnerIndex(str(tmp_path / "xe.db"), max_distance=1).lookup("30A12346")
+    assert owner.distance == 1
+    assert owner_text(owner) == "A (K1) [~1: 30A12345]"
+
+
+def test_owner_is_not_logged_as_face_evidence(tmp_path):
+    make_registry(tmp_path / "xe.db")
+    writer = LogWriter(str(tmp_path / "plates.db"))
+    pipeline = RecognitionPipeline(None, None, None, None, None, db_path=None, log_writer=writer,
+                                   owner_index=OwnerIndex(str(tmp_path / "xe.db")))
+    pipeline.emit_plate(1, "30A12345", None, None, "20261001_060000", pipeline.lookup_owner("30A12345"))
+    writer.close()
+    row = sqlite3.connect(tmp_path / "plates.db").execute("SELECT face_path, owner FROM plate_logs").fetchone()
+    assert row == (None, "A (K1)")
@@ -0,0 +1,45 @@
+from recognition.parking import ParkingSessions, GATE_BOTH, format_ts
+from recognition.pipeline import RecognitionPipeline
+from recognition.plate_dedupe import PlateDedupe
+
+T0 = 1790834400.0   # 2026-10-01 06:00 (giờ địa phương không quan trọng: chỉ so chênh lệch)
+
+
+def test_short_visit_through_bidirectional_gate():
+    parking = ParkingSessions({"gate-1": GATE_BOTH}, clock=lambda: T0)
+    assert parking.record("51F12345", "gate-1", format_ts(T0)) == "entry"
+    assert parking.record("51F12345", "gate-1", format_ts(T0 + 120)) == "exit"
+    assert parking.occupancy() == 0
+    assert parking.stats()["max_dwell_s"] == 120
+    # Hôm sau vào lại: phiên mới, không phải lần ra của phiên cũ
+    assert parking.record("51F12345", "gate-1", format_ts(T0 + 86400)) == "entry"
+
+
+def test_repeat_at_same_gate_is_not_an_exit():
+    # Track bị tách khi xe dừng ở barrier: cùng biển số, cùng cổng sau vài giây
+    parking = ParkingSessions(clock=lambda: T0)
+    assert parking.record("51F12345", "gate-1", format_ts(T0)) == "entry"
+    assert parking.record("51F12345", "gate-1", format_ts(T0 + 5)) is None
+    assert parking.occupancy() == 1
+
+
+def test_gate_events_bypass_plate_log_dedupe():
+    events, logged = [], []
+    pipeline = RecognitionPipeline(None, None, None, None, None, db_path=None, gate="gate-1",
+                                   plate_dedupe=PlateDedupe(window_s=300), on_plate=logged.append,
+                                   on_gate=events.append)
+    pipeline.emit_plate(1, "51F12345", None, None, format_ts(T0))
+    pipeline.emit_plate(2, "51F12345", None, None, format_ts(T0 + 120))
+    assert len(logged) == 1
+    parking = ParkingSessions(clock=lambda: T0)
+    for event in events:
+        parking(event)
+    assert parking.occupancy() == 0 and parking.exits == 1
+
+
+def test_exit_without_entry_is_counted_separately():
+    parking = ParkingSessions({"out": "out"}, clock=lambda: T0)
+    assert parking.record("51F12345", "out", format_ts(T0)) == "exit"
+    stats = parking.stats()
+    assert (stats["exits"], stats["unmatched_exits"], stats["occupancy"]) == (0, 1, 0)
+    assert parking.dwell("51F12345") is None
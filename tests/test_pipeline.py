@@ -0,0 +1,52 @@
+from collections import Counter
+
+import pytest
+
+from recognition.load_shedding import LoadShedder, QUALITY_LEVELS
+from recognition.models import create_tracker
+from recognition.pipeline import RecognitionPipeline, PLATE_MODE_CASCADE, PLATE_MODE_FULL
+from recognition.queues import BLOCK
+from recognition.stubs import SyntheticScene, SyntheticCapture, create_stub_models
+from recognition.trackers import TRACKER_IOU
+
+
+def run_pipeline(tmp_path, level, plate_mode=PLATE_MODE_CASCADE, speed=8):
+    scene = SyntheticScene(width=320, height=240, n_cars=6, lanes=2, speed=speed, spacing=12, seed=1)
+    vehicle_model, plate_model, ocr = create_stub_models(scene)
+    gates, plates, frames = [], [], []
+    pipeline = RecognitionPipeline(
+        SyntheticCapture(scene), vehicle_model, plate_model, ocr, create_tracker(TRACKER_IOU),
+        db_path=None, saved_cars=str(tmp_path / "cars"), saved_plates=str(tmp_path / "plates"),
+        capture_policy=BLOCK, frame_queue_size=8, ocr_policy=BLOCK, plate_mode=plate_mode,
+        annotate=False, on_gate=gates.append, on_plate=plates.append, on_entries=frames.append,
+        # LoadShedder chỉ có 1 bậc: giữ cố định mức chất lượng cần thử
+        load_shedder=LoadShedder(levels=(level,), verbose=False),
+    )
+    pipeline.start()
+    pipeline.join()
+    return scene, gates, plates, frames
+
+
+@pytest.mark.parametrize("level", QUALITY_LEVELS, ids=[level.name for level in QUALITY_LEVELS])
+@pytest.mark.parametrize("plate_mode", (PLATE_MODE_CASCADE, PLATE_MODE_FULL))
+def test_one_gate_event_per_track(tmp_path, level, plate_mode):
+    scene, gates, plates, _ = run_pipeline(tmp_path, level, plate_mode)
+    per_track = Counter(event["car_id"] for event in gates)
+    assert per_track and max(per_track.values()) == 1
+    assert max(Counter(event["car_id"] for event in plates).values()) == 1
+    assert len(set(event["plate"] for event in gates) & set(scene.plates)) >= len(scene.plates) // 2
+
+
+def test_finalized_tracks_stay_in_entries(tmp_path):
+    # skip_read không tìm lại biển số của track đã chốt: xe vẫn phải có trong entries tới khi ra khỏi khung
+    # (xe chạy chậm, track sống lâu)
+    level = next(level for level in QUALITY_LEVELS if level.skip_read)
+    _, gates, _, frames = run_pipeline(tmp_path, level, speed=3)
+    finalized = {event["car_id"] for event in gates}
+    seen = {}
+    for i, entries in enumerate(frames):
+        for entry in entries:
+            seen.setdefault(entry["car_id"], []).append(i)
+    for car_id in finalized:
+        shown = seen[car_id]
+        assert shown == list(range(shown[0], shown[-1] + 1)), car_id
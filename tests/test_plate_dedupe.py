@@ -0,0 +1,58 @@
+from recognition.plate_dedupe import PlateDedupe
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_same_plate_suppressed_within_window():
+    clock = Clock()
+    dedupe = PlateDedupe(window_s=60, clock=clock)
+    assert dedupe.should_log("51F-123.45", "A")
+    clock.now = 59
+    # So trên biển số đã chuẩn hóa
+    assert not dedupe.should_log("51F12345", "A")
+    assert dedupe.suppressed == 1
+    clock.now = 120
+    assert dedupe.should_log("51F12345", "A")
+
+
+def test_window_counts_from_last_log():
+    clock = Clock()
+    dedupe = PlateDedupe(window_s=60, clock=clock)
+    dedupe.should_log("51F12345")
+    clock.now = 30
+    dedupe.should_log("51F12345")
+    # Lần bị bỏ qua không gia hạn cửa sổ
+    clock.now = 61
+    assert dedupe.should_log("51F12345")
+
+
+def test_gates_are_independent():
+    dedupe = PlateDedupe(window_s=60, clock=Clock())
+    assert dedupe.should_log("51F12345", "A")
+    assert dedupe.should_log("51F12345", "B")
+    assert not dedupe.should_log("51F12345", "B")
+
+
+def test_empty_plate_never_logged():
+    dedupe = PlateDedupe(clock=Clock())
+    assert not dedupe.should_log("")
+    assert not dedupe.should_log("-.")
+    assert len(dedupe) == 0
+
+
+def test_expired_and_oldest_entries_evicted():
+    clock = Clock()
+    dedupe = PlateDedupe(window_s=60, max_size=2, clock=clock)
+    for plate in ("30A11111", "30A22222", "30A33333"):
+        dedupe.should_log(plate)
+    assert len(dedupe) == 2
+    assert dedupe.should_log("30A11111")
+    clock.now = 60
+    dedupe.should_log("30A44444")
+    assert len(dedupe) == 1
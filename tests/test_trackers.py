@@ -0,0 +1,65 @@
+from recognition.models import create_tracker
+from recognition.trackers import IouTracker, TRACKER_IOU, linear_assignment
+
+import numpy as np
+
+
+def detection(x, y, w=60, h=40, conf=0.9):
+    return ([x, y, w, h], conf, 0)
+
+
+def confirmed_ids(tracks):
+    return [t.track_id for t in tracks if t.is_confirmed()]
+
+
+def test_track_confirmed_after_n_init_and_keeps_id():
+    tracker = IouTracker(n_init=3)
+    for i in range(2):
+        assert confirmed_ids(tracker.update_tracks([detection(10 + 5 * i, 20)])) == []
+    ids = [confirmed_ids(tracker.update_tracks([detection(20 + 5 * i, 20)])) for i in range(10)]
+    assert all(i == ["1"] for i in ids)
+
+
+def test_two_cars_keep_separate_ids():
+    tracker = IouTracker(n_init=1)
+    for i in range(10):
+        tracks = tracker.update_tracks([detection(10 + 4 * i, 10), detection(200 - 4 * i, 100)])
+    by_id = {t.track_id: t.to_ltrb() for t in tracks}
+    assert set(by_id) == {"1", "2"}
+    assert by_id["1"][0] < by_id["2"][0]
+
+
+def test_track_survives_missed_frames_until_max_age():
+    tracker = IouTracker(max_age=3, n_init=1)
+    tracker.update_tracks([detection(10, 10)])
+    for _ in range(3):
+        assert confirmed_ids(tracker.update_tracks([])) == ["1"]
+    assert tracker.update_tracks([]) == []
+    # Xe xuất hiện lại sau khi track bị bỏ: id mới
+    assert confirmed_ids(tracker.update_tracks([detection(10, 10)])) == ["2"]
+
+
+def test_low_confidence_only_extends_confirmed_tracks():
+    tracker = IouTracker(n_init=1, high_conf=0.5)
+    # Detection conf thấp không tạo track mới
+    assert tracker.update_tracks([detection(10, 10, conf=0.3)]) == []
+    tracker.update_tracks([detection(10, 10)])
+    tracks = tracker.update_tracks([detection(12, 10, conf=0.3)])
+    assert confirmed_ids(tracks) == ["1"] and tracks[0].time_since_update == 0
+
+
+def test_tentative_track_dropped_on_miss():
+    tracker = IouTracker(n_init=3)
+    tracker.update_tracks([detection(10, 10)])
+    assert tracker.update_tracks([]) == []
+
+
+def test_linear_assignment_respects_max_cost():
+    cost = np.array([[0.1, 0.9], [0.8, 0.95]])
+    assert linear_assignment(cost, 0.85) == [(0, 0)]
+    assert linear_assignment(np.zeros((0, 2)), 0.5) == []
+
+
+def test_create_tracker_scales_max_age_with_stride():
+    tracker = create_tracker(TRACKER_IOU, max_age=30, frame_stride=3)
+    assert isinstance(tracker, IouTracker) and tracker.max_age == 10